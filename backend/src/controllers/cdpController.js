@@ -58,6 +58,17 @@ router.delete('/discoveries/:id', async (req, res) => {
   }
 });
 
+// Query part of a discovery graph: /graph/khop?node=X&k=2, /graph/path?from=X&to=Y,
+// /graph/nodes?q=...; paginated with offset/limit
+router.get('/discoveries/:id/graph/:kind', async (req, res) => {
+  try {
+    const result = await cdpService.queryDiscoveryGraph(req.params.id, req.params.kind, req.query);
+    res.json(result);
+  } catch (error) {
+    res.status(error.status || 400).json({ error: error.message || 'Graph query failed' });
+  }
+});
+
 // Update stored graph layout (positions etc.)
 router.put('/discoveries/:id/graph', async (req, res) => {
   try {
@@ -69,10 +80,57 @@ router.put('/discoveries/:id/graph', async (req, res) => {
   }
 });
 
+// Neighbor/link events for a discovery graph: text/plain syslog lines, JSON
+// { lines?, events?, confirm?, username?, password? } or a Telegraf JSON metric batch;
+// ?confirm=false applies them without re-dialing the devices
+router.post('/discoveries/:id/events', express.text({ type: 'text/plain', limit: '10mb' }), async (req, res) => {
+  try {
+    const body = req.body || {};
+    let spec;
+    if (typeof body === 'string') {
+      spec = { lines: body.split(/\r?\n/).filter((l) => l.trim()) };
+    } else if (Array.isArray(body.lines) || Array.isArray(body.events)) {
+      const { lines = [], events = [], ...rest } = body;
+      spec = { ...rest, lines, items: events };
+    } else {
+      spec = { items: [body] };
+    }
+    if (req.query.confirm === 'false') spec.confirm = false;
+    const result = await cdpService.applyDiscoveryEvents(req.params.id, spec);
+    res.json(result);
+  } catch (error) {
+    res.status(400).json({ error: error.message || 'Failed to apply events' });
+  }
+});
+
+// ?lod=auto|0..4&maxNodes=200&sitePattern=... clusters large topologies
+function lodFromQuery({ lod, maxNodes, sitePattern }) {
+  if (lod === undefined) return undefined;
+  return {
+    level: lod === 'auto' ? 'auto' : Number(lod),
+    ...(maxNodes ? { maxNodes: Number(maxNodes) } : {}),
+    ...(sitePattern ? { sitePattern } : {}),
+  };
+}
+
+// Export several discoveries into one multi-page Draw.io file
+// body: { ids: [...], lod?: {...}, split?: 'component' }
+router.post('/export/drawio', async (req, res) => {
+  try {
+    const { ids, lod, split } = req.body || {};
+    const xml = await cdpService.exportManyToDrawio(ids, { lod, split });
+    res.set('Content-Type', 'application/xml');
+    res.set('Content-Disposition', 'attachment; filename="topologies.drawio"');
+    res.send(xml);
+  } catch (error) {
+    res.status(400).json({ error: error.message || 'Failed to export to Draw.io' });
+  }
+});
+
 // Export discovery graph to Draw.io XML format
 router.get('/discoveries/:id/export/drawio', async (req, res) => {
   try {
-    const xml = await cdpService.exportToDrawio(req.params.id);
+    const xml = await cdpService.exportToDrawio(req.params.id, lodFromQuery(req.query));
     res.set('Content-Type', 'application/xml');
     res.set('Content-Disposition', `attachment; filename="topology-${req.params.id}.drawio"`);
     res.send(xml);
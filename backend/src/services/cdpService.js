@@ -1,9 +1,151 @@
 import { PrismaClient } from '@prisma/client';
 import { spawn } from 'child_process';
+import fs from 'fs/promises';
+import http from 'http';
+import os from 'os';
 import path from 'path';
+import zlib from 'zlib';
 
 const prisma = new PrismaClient();
 
+// Discovery options forwarded verbatim to the python worker payload
+const WORKER_OPTION_KEYS = ['shards', 'shardPrefixLen', 'shardMaxRounds', 'arp', 'arpIndex', 'capabilityCache', 'fastFacts', 'resolveAliases', 'nxos', 'snmp', 'crawl', 'auth', 'archive', 'profile', 'output', 'deadline', 'scope', 'channels'];
+
+function buildWorkerOptions(options = {}) {
+  const out = {};
+  for (const key of WORKER_OPTION_KEYS) {
+    if (options?.[key] !== undefined) out[key] = options[key];
+  }
+  return out;
+}
+
+// Seconds a worker run may take unless options.deadline (Unix seconds) is given;
+// past it the worker stops and returns a partial graph flagged `truncated`
+const WORKER_TIMEOUT_SECONDS = Number(process.env.CDP_WORKER_TIMEOUT_SECONDS || 300);
+
+// Results at least this large come back as a temp file path instead of via stdout
+const RESULT_FILE_THRESHOLD = Number(process.env.CDP_RESULT_FILE_THRESHOLD || 16 * 1024 * 1024);
+// Framed (non-JSON) worker results start with this marker, see result_codec.py
+const RESULT_MAGIC = Buffer.from('CDPR1 ');
+
+let resultDecoders;
+
+// Decoders for the worker result formats; optional packages are used when installed
+async function loadResultDecoders() {
+  if (resultDecoders) return resultDecoders;
+  const decoders = {};
+  try {
+    const { decode } = await import('@msgpack/msgpack');
+    decoders.msgpack = (buf) => decode(buf);
+  } catch { /* not installed */ }
+  try {
+    const { decode } = await import('cbor-x');
+    decoders.cbor = (buf) => decode(buf);
+  } catch { /* not installed */ }
+  decoders.json = (buf) => JSON.parse(buf.toString('utf8'));
+  resultDecoders = decoders;
+  return decoders;
+}
+
+// `output` block offered to the worker: formats we can decode, best first
+function buildOutputOptions(decoders, requested) {
+  if (requested) return requested;
+  return {
+    formats: Object.keys(decoders),
+    compress: typeof zlib.zstdDecompressSync === 'function' ? ['zstd'] : [],
+    fileThreshold: RESULT_FILE_THRESHOLD,
+  };
+}
+
+async function decodeWorkerResult(buf, decoders) {
+  let meta;
+  let body;
+  if (buf.subarray(0, RESULT_MAGIC.length).equals(RESULT_MAGIC)) {
+    const eol = buf.indexOf(0x0a, RESULT_MAGIC.length);
+    meta = JSON.parse(buf.subarray(RESULT_MAGIC.length, eol).toString('utf8'));
+    body = buf.subarray(eol + 1);
+    if (body.length !== meta.length) throw new Error(`Truncated worker result: ${body.length} of ${meta.length} bytes`);
+  } else {
+    const parsed = JSON.parse(buf.toString('utf8'));
+    if (!parsed || !parsed.resultPath || parsed.nodes) return parsed;
+    meta = parsed;
+    try {
+      body = await fs.readFile(parsed.resultPath);
+    } finally {
+      await fs.rm(parsed.resultPath, { force: true });
+    }
+  }
+  if (meta.compression === 'zstd') body = zlib.zstdDecompressSync(body);
+  else if (meta.compression) throw new Error(`Unsupported worker result compression ${meta.compression}`);
+  const decode = decoders[meta.format];
+  if (!decode) throw new Error(`Unsupported worker result format ${meta.format}`);
+  return decode(body);
+}
+
+// Local k-hop/path/filter query service (graph_query.py), started on first use
+const QUERY_SOCKET = process.env.CDP_QUERY_SOCKET || path.join(os.tmpdir(), 'cdp-graph-query.sock');
+const QUERY_CACHE_GRAPHS = Number(process.env.CDP_QUERY_CACHE_GRAPHS || 8);
+const QUERY_KINDS = ['khop', 'path', 'nodes'];
+
+let queryProc = null;
+
+process.on('exit', () => { if (queryProc) queryProc.kill(); });
+
+function startQueryService() {
+  if (queryProc) return;
+  const workerPath = path.join(process.cwd(), 'src', 'workers', 'cdp', 'graph_query.py');
+  const pythonCmd = process.platform === 'win32' ? 'python' : 'python3';
+  queryProc = spawn(pythonCmd, [workerPath, '--socket', QUERY_SOCKET, '--cache', String(QUERY_CACHE_GRAPHS)], {
+    env: { ...process.env },
+    stdio: ['ignore', 'ignore', 'pipe']
+  });
+  queryProc.stderr.on('data', (d) => { console.error('[QUERY][PY STDERR]', d.toString()); });
+  queryProc.on('error', (e) => { console.error('[QUERY] Failed to start query service:', e.message); queryProc = null; });
+  queryProc.on('exit', (code) => { console.error('[QUERY] Query service exited', code); queryProc = null; });
+}
+
+function queryRequest(method, urlPath, body) {
+  return new Promise((resolve, reject) => {
+    const req = http.request({ socketPath: QUERY_SOCKET, path: urlPath, method, headers: body ? { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(body) } : {} }, (res) => {
+      const chunks = [];
+      res.on('data', (d) => chunks.push(d));
+      res.on('end', () => {
+        try {
+          resolve({ status: res.statusCode, body: JSON.parse(Buffer.concat(chunks).toString('utf8')) });
+        } catch (e) {
+          reject(e);
+        }
+      });
+    });
+    req.on('error', reject);
+    if (body) req.write(body);
+    req.end();
+  });
+}
+
+// Send a request to the query service, starting it and waiting for its socket if needed
+async function callQueryService(method, urlPath, body) {
+  startQueryService();
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await queryRequest(method, urlPath, body);
+    } catch (e) {
+      if (attempt >= 50 || !['ENOENT', 'ECONNREFUSED'].includes(e.code)) throw e;
+      await new Promise((r) => setTimeout(r, 100));
+    }
+  }
+}
+
+// Drop a discovery from the query service cache after its graph changed
+async function forgetQueryGraph(id) {
+  if (!queryProc) return;
+  try {
+    await queryRequest('DELETE', `/graphs/${encodeURIComponent(id)}`);
+  } catch (e) {
+    console.error('[QUERY] Failed to drop cached graph:', e.message || e);
+  }
+}
+
 function generateMockGraphFromSeeds(seedIps = []) {
   const nodes = seedIps.map((ip, index) => ({
     id: `n${index + 1}`,
@@ -46,17 +188,44 @@ const cdpService = {
           const seeds = Array.isArray(group?.seedIps) ? group.seedIps : [];
           if (seeds.length === 0) continue;
           const postAuthSteps = Array.isArray(group?.postAuthSteps) ? group.postAuthSteps : [];
-          console.log('[CDP] Running python worker for seeds', seeds, 'with protocol', protocol, 'postAuthSteps', postAuthSteps.length);
-          const pythonGraph = await runPythonDiscovery(seeds, group.username || '', group.password || '', protocol, postAuthSteps);
+          // a credential group may override the protocol, e.g. 'snmp' with its own community
+          const groupProtocol = group?.protocol || protocol;
+          const workerOptions = buildWorkerOptions(options);
+          if (group?.snmp) workerOptions.snmp = { ...(workerOptions.snmp || {}), ...group.snmp };
+          // auth.groups limits are keyed by credential group name
+          if (workerOptions.auth) workerOptions.auth = { ...workerOptions.auth, group: group.name || `group-${credentialGroups.indexOf(group)}` };
+          console.log('[CDP] Running python worker for seeds', seeds, 'with protocol', groupProtocol, 'postAuthSteps', postAuthSteps.length);
+          const pythonGraph = await runPythonDiscovery(seeds, group.username || '', group.password || '', groupProtocol, postAuthSteps, workerOptions);
           aggregated.nodes.push(...pythonGraph.nodes);
           aggregated.links.push(...pythonGraph.links);
+          // crawl budget ran out in this group: keep the partial graph, remember why
+          if (pythonGraph.truncated) aggregated.stopReason = aggregated.stopReason || pythonGraph.stopReason;
+          // arp.mode "separate": per-device tables travel beside the nodes
+          if (pythonGraph.arpTables) aggregated.arpTables = { ...(aggregated.arpTables || {}), ...pythonGraph.arpTables };
+          // MAC/IP index: locations per IP append, IP sets per MAC union across groups
+          if (pythonGraph.arpIndex) {
+            const index = aggregated.arpIndex || (aggregated.arpIndex = { byIp: {}, byMac: {} });
+            for (const [ip, locs] of Object.entries(pythonGraph.arpIndex.byIp || {})) {
+              index.byIp[ip] = [...(index.byIp[ip] || []), ...locs];
+            }
+            for (const [mac, ips] of Object.entries(pythonGraph.arpIndex.byMac || {})) {
+              index.byMac[mac] = [...new Set([...(index.byMac[mac] || []), ...ips])].sort();
+            }
+          }
         }
-        // de-duplicate nodes/links by id
+        // de-duplicate nodes/links by id (crawled nodes win over placeholders)
         const nodeMap = new Map();
-        aggregated.nodes.forEach((n) => { nodeMap.set(n.id, n); });
+        aggregated.nodes.forEach((n) => {
+          const cur = nodeMap.get(n.id);
+          if (!cur || !(cur.placeholder === false && n.placeholder)) nodeMap.set(n.id, n);
+        });
         const linkMap = new Map();
         aggregated.links.forEach((l) => { linkMap.set(l.id, l); });
+        const { stopReason, arpTables, arpIndex } = aggregated;
         aggregated = { nodes: Array.from(nodeMap.values()), links: Array.from(linkMap.values()) };
+        if (stopReason) Object.assign(aggregated, { truncated: true, stopReason });
+        if (arpTables) aggregated.arpTables = arpTables;
+        if (arpIndex) aggregated.arpIndex = arpIndex;
       } else {
         aggregated = generateMockGraphFromSeeds(allSeeds);
       }
@@ -65,6 +234,15 @@ const cdpService = {
       aggregated = generateMockGraphFromSeeds(allSeeds);
     }
 
+    // Analytics run once over the merged graph of all credential groups
+    if (options?.analytics) {
+      try {
+        aggregated.analytics = await runPythonAnalytics(aggregated, options.analytics);
+      } catch (e) {
+        console.error('[CDP] Graph analytics failed:', e.message || e);
+      }
+    }
+
     const discovery = await prisma.cdpDiscovery.create({
       data: {
         name: discoveryName,
@@ -81,6 +259,9 @@ const cdpService = {
     // Persist nodes and links to tables for future querying
     const nodeIdMap = new Map();
     for (const node of aggregated.nodes) {
+      // ARP rows already live in discovery.graph; the row keeps only their count
+      const { arp, ...raw } = node;
+      if (arp && raw.arpCount === undefined) raw.arpCount = Array.isArray(arp) ? arp.length : (arp.ip || []).length;
       const created = await prisma.cdpNode.create({
         data: {
           discoveryId: discovery.id,
@@ -89,7 +270,7 @@ const cdpService = {
           vendor: node.vendor || null,
           platform: node.platform || null,
           model: node.model || null,
-          raw: node,
+          raw,
         },
       });
       nodeIdMap.set(node.id, created.id);
@@ -160,6 +341,7 @@ const cdpService = {
   async deleteDiscovery(id) {
     // Cascade is set in schema; deleting parent will delete children
     await prisma.cdpDiscovery.delete({ where: { id } });
+    await forgetQueryGraph(id);
     return { success: true };
   },
 
@@ -173,20 +355,81 @@ const cdpService = {
       throw new Error('Invalid graph payload');
     }
     await prisma.cdpDiscovery.update({ where: { id }, data: { graph } });
+    await forgetQueryGraph(id);
     return { success: true };
   },
 
-  async exportToDrawio(id) {
+  // k-hop neighborhood / shortest path / filtered node list of a discovery graph,
+  // answered from the query service; the graph is loaded into it on first use
+  async queryDiscoveryGraph(id, kind, params = {}) {
+    if (!QUERY_KINDS.includes(kind)) throw Object.assign(new Error(`Unknown graph query ${kind}`), { status: 404 });
+    const qs = new URLSearchParams(Object.entries(params).filter(([, v]) => typeof v === 'string'));
+    const urlPath = `/graphs/${encodeURIComponent(id)}/${kind}?${qs}`;
+    let res = await callQueryService('GET', urlPath);
+    if (res.status === 404 && res.body?.error === 'unknown graph') {
+      const graph = await this.getDiscoveryGraph(id);
+      const loaded = await callQueryService('PUT', `/graphs/${encodeURIComponent(id)}`, JSON.stringify({ nodes: graph.nodes, links: graph.links }));
+      if (loaded.status !== 200) throw Object.assign(new Error(loaded.body?.error || 'Failed to load graph'), { status: loaded.status });
+      res = await callQueryService('GET', urlPath);
+    }
+    if (res.status !== 200) throw Object.assign(new Error(res.body?.error || 'Graph query failed'), { status: res.status });
+    return res.body;
+  },
+
+  // Apply LLDP/CDP neighbor and link up/down events (syslog `lines`, telemetry JSON `items`,
+  // see topology_events.py) to the stored graph; the crawled devices they touch are re-dialed
+  // to confirm unless `confirm` is false. Credentials default to CDP_USERNAME/CDP_PASSWORD.
+  async applyDiscoveryEvents(id, { lines = [], items = [], confirm = true, username, password, protocol } = {}) {
+    const discovery = await prisma.cdpDiscovery.findUnique({ where: { id } });
+    if (!discovery) throw new Error('Discovery not found');
+    if (lines.length === 0 && items.length === 0) throw new Error('No events given');
+    const user = username || process.env.CDP_USERNAME;
+    const pass = password || process.env.CDP_PASSWORD;
+    if (confirm && (!user || !pass)) {
+      throw new Error('Confirming events needs username/password (or CDP_USERNAME/CDP_PASSWORD)');
+    }
+    const graph = await this.getDiscoveryGraph(id);
+    const options = discovery.options || {};
+    // the original run's deadline is long past; this batch gets the default timeout
+    const workerOptions = buildWorkerOptions(options);
+    delete workerOptions.deadline;
+    workerOptions.events = { graph, lines, items, confirm };
+    const updated = await runPythonDiscovery([], user || '', pass || '', protocol || options.protocol || 'cdp', [], workerOptions);
+    await prisma.cdpDiscovery.update({ where: { id }, data: { graph: updated } });
+    await forgetQueryGraph(id);
+    console.log('[CDP] events applied', { id, ...updated.lastUpdate });
+    return updated.lastUpdate;
+  },
+
+  // `lod` ({level, maxNodes, ...}, see graph_lod.py) collapses large graphs into clusters
+  async exportToDrawio(id, lod) {
     const graph = await this.getDiscoveryGraph(id);
     if (!graph || !graph.nodes || !graph.links) {
       throw new Error('No graph data available for this discovery');
     }
-    return runPythonDrawioExport(graph.nodes, graph.links);
+    return runPythonDrawioExport({ nodes: graph.nodes, links: graph.links, ...(lod ? { lod } : {}) });
+  },
+
+  // One multi-page Draw.io file for several discoveries, laid out by a single worker run;
+  // `split: 'component'` gives every connected topology its own page
+  async exportManyToDrawio(ids, { lod, split } = {}) {
+    if (!Array.isArray(ids) || ids.length === 0) throw new Error('No discoveries selected');
+    const discoveries = await prisma.cdpDiscovery.findMany({ where: { id: { in: ids } }, select: { id: true, name: true } });
+    const names = new Map(discoveries.map((d) => [d.id, d.name]));
+    const pages = [];
+    for (const id of ids) {
+      const graph = await this.getDiscoveryGraph(id);
+      if (!graph.nodes.length) continue;
+      pages.push({ name: names.get(id) || id, nodes: graph.nodes, links: graph.links });
+    }
+    if (pages.length === 0) throw new Error('No graph data available for these discoveries');
+    return runPythonDrawioExport({ pages, ...(lod ? { lod } : {}), ...(split ? { split } : {}) });
   },
 };
 
-async function runPythonDiscovery(seedIps, username, password, protocol = 'cdp', postAuthSteps = []) {
+async function runPythonDiscovery(seedIps, username, password, protocol = 'cdp', postAuthSteps = [], workerOptions = {}) {
   const workerPath = path.join(process.cwd(), 'src', 'workers', 'cdp', 'run_discovery.py');
+  const decoders = await loadResultDecoders();
   return new Promise((resolve, reject) => {
     const pythonCmd = process.platform === 'win32' ? 'python' : 'python3';
     const proc = spawn(pythonCmd, [workerPath], {
@@ -194,30 +437,62 @@ async function runPythonDiscovery(seedIps, username, password, protocol = 'cdp',
       stdio: ['pipe', 'pipe', 'pipe']
     });
 
-    const payload = JSON.stringify({ seedIps, username, password, protocol, postAuthSteps });
+    const output = buildOutputOptions(decoders, workerOptions.output);
+    const deadline = workerOptions.deadline ?? Date.now() / 1000 + WORKER_TIMEOUT_SECONDS;
+    const payload = JSON.stringify({ ...workerOptions, output, deadline, seedIps, username, password, protocol, postAuthSteps });
     proc.stdin.write(payload);
     proc.stdin.end();
 
-    let stdout = '';
+    // stdout may be binary (msgpack/cbor/zstd): keep raw chunks, decode once at the end
+    const chunks = [];
     let stderr = '';
-    proc.stdout.on('data', (d) => { stdout += d.toString(); console.error('[CDP][PY STDOUT]', d.toString()); });
+    proc.stdout.on('data', (d) => { chunks.push(d); console.error('[CDP][PY STDOUT]', `${d.length} bytes`); });
     proc.stderr.on('data', (d) => { stderr += d.toString(); console.error('[CDP][PY STDERR]', d.toString()); });
     proc.on('error', reject);
+    proc.on('close', async (code) => {
+      if (code !== 0) return reject(new Error(stderr || `Python exited ${code}`));
+      const stdout = Buffer.concat(chunks);
+      if (stdout.length === 0) return reject(new Error('Python returned empty output'));
+      try {
+        resolve(await decodeWorkerResult(stdout, decoders));
+      } catch (e) {
+        console.error('[CDP] Failed decoding python stdout:', stdout.subarray(0, 2000).toString('utf8'));
+        reject(e);
+      }
+    });
+  });
+}
+
+async function runPythonAnalytics(graph, analyticsOptions) {
+  const workerPath = path.join(process.cwd(), 'src', 'workers', 'cdp', 'graph_analytics.py');
+  const top = Number(analyticsOptions?.top) || 10;
+  return new Promise((resolve, reject) => {
+    const pythonCmd = process.platform === 'win32' ? 'python' : 'python3';
+    const proc = spawn(pythonCmd, [workerPath, '-', '--top', String(top)], {
+      env: { ...process.env },
+      stdio: ['pipe', 'pipe', 'pipe']
+    });
+
+    proc.stdin.write(JSON.stringify({ nodes: graph.nodes, links: graph.links }));
+    proc.stdin.end();
+
+    const chunks = [];
+    let stderr = '';
+    proc.stdout.on('data', (d) => { chunks.push(d); });
+    proc.stderr.on('data', (d) => { stderr += d.toString(); console.error('[ANALYTICS][PY STDERR]', d.toString()); });
+    proc.on('error', reject);
     proc.on('close', (code) => {
       if (code !== 0) return reject(new Error(stderr || `Python exited ${code}`));
       try {
-        const out = (stdout || '').trim();
-        if (!out) return reject(new Error('Python returned empty output'));
-        resolve(JSON.parse(out));
+        resolve(JSON.parse(Buffer.concat(chunks).toString('utf8')));
       } catch (e) {
-        console.error('[CDP] Failed parsing python stdout:', stdout);
         reject(e);
       }
     });
   });
 }
 
-async function runPythonDrawioExport(nodes, links) {
+async function runPythonDrawioExport(job) {
   const workerPath = path.join(process.cwd(), 'src', 'workers', 'cdp', 'export_drawio.py');
   return new Promise((resolve, reject) => {
     const pythonCmd = process.platform === 'win32' ? 'python' : 'python3';
@@ -226,7 +501,7 @@ async function runPythonDrawioExport(nodes, links) {
       stdio: ['pipe', 'pipe', 'pipe']
     });
 
-    const payload = JSON.stringify({ nodes, links, useNetplot: false });
+    const payload = JSON.stringify({ ...job, useNetplot: false });
     proc.stdin.write(payload);
     proc.stdin.end();
 
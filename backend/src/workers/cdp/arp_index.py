@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+MAC/IP cross-device index
+
+Inverted index over the ARP tables collected during a crawl:
+
+    byIp:  ip  -> [[device, iface, phys_iface, mac], ...]
+    byMac: mac -> [ip, ...]
+
+so "which device and port is 10.1.2.3 behind" is a dict lookup instead of a
+scan over every node's `arp` array. Built incrementally by
+NetworkTopologyDiscovery when the job payload has `"arpIndex": true` and
+emitted as `arpIndex` in the worker result.
+
+Usage (query a saved graph):
+    python arp_index.py graph.json 10.1.2.3 000c.29b8.afe0
+"""
+
+import json
+import sys
+
+from arp_table import ArpTable, pack_mac, unpack_mac
+
+
+def normalize_mac(mac):
+    return unpack_mac(pack_mac(mac))
+
+
+class ArpIndex:
+    def __init__(self):
+        self.by_ip = {}
+        self.by_mac = {}
+
+    def add(self, device, entries):
+        """Index one device's ARP rows (legacy list, ArpTable or column dict)."""
+        if isinstance(entries, dict):
+            entries = ArpTable.from_json(entries)
+        rows = entries.rows() if isinstance(entries, ArpTable) else entries
+        for row in rows:
+            ip = row.get("ip")
+            if not ip:
+                continue
+            mac = normalize_mac(row.get("mac"))
+            self.by_ip.setdefault(ip, []).append((device, row.get("iface"), row.get("phys_iface"), mac))
+            if mac:
+                self.by_mac.setdefault(mac, set()).add(ip)
+
+    def lookup_ip(self, ip):
+        return self.by_ip.get(ip, [])
+
+    def lookup_mac(self, mac):
+        return sorted(self.by_mac.get(normalize_mac(mac), ()))
+
+    def lookup(self, query):
+        """IP or MAC, whichever `query` looks like."""
+        if query in self.by_ip:
+            return {"ip": query, "locations": [list(loc) for loc in self.lookup_ip(query)]}
+        mac = normalize_mac(query)
+        if mac:
+            ips = self.lookup_mac(mac)
+            return {"mac": mac, "ips": ips,
+                    "locations": [list(loc) for ip in ips for loc in self.lookup_ip(ip) if loc[3] == mac]}
+        return {"query": query, "locations": []}
+
+    def to_json(self):
+        return {
+            "byIp": {ip: [list(loc) for loc in locs] for ip, locs in self.by_ip.items()},
+            "byMac": {mac: sorted(ips) for mac, ips in self.by_mac.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        index = cls()
+        for ip, locs in (data.get("byIp") or {}).items():
+            index.by_ip[ip] = [tuple(loc) for loc in locs]
+        for mac, ips in (data.get("byMac") or {}).items():
+            index.by_mac[mac] = set(ips)
+        return index
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Use the saved index if present, otherwise rebuild from node ARP data."""
+        if graph.get("arpIndex"):
+            return cls.from_json(graph["arpIndex"])
+        index = cls()
+        for node in graph.get("nodes", []):
+            if node.get("arp"):
+                index.add(node["id"], node["arp"])
+        for device, table in (graph.get("arpTables") or {}).items():
+            index.add(device, table)
+        return index
+
+
+def main():
+    if len(sys.argv) < 3:
+        sys.stderr.write("Usage: arp_index.py <graph.json> <ip|mac> [...]\n")
+        sys.exit(2)
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        index = ArpIndex.from_graph(json.load(f))
+    print(json.dumps([index.lookup(q) for q in sys.argv[2:]], indent=2))
+
+
+if __name__ == "__main__":
+    main()
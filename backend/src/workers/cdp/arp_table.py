@@ -0,0 +1,179 @@
+"""
+Bounded-memory ARP collection
+
+ArpTable keeps ARP rows as parallel `array` columns (IPv4 and MAC packed as
+integers, interface names interned) instead of one dict per row, and stops
+growing at a per-device row cap. ArpOptions carries the `arp` block of the
+job payload:
+
+    "arp": {
+        "mode": "inline" | "columnar" | "separate" | "file" | "off",
+        "vlans": [10, 20],            # keep only rows learned on these SVIs
+        "interfaces": ["Gi0/1"],      # keep only rows on these interfaces
+        "excludeIncomplete": true,
+        "maxRows": 5000,              # per device
+        "path": "/tmp/arp.jsonl"      # mode=file
+    }
+
+inline    -> node.arp is the legacy list of {ip, mac, iface, phys_iface}
+columnar  -> node.arp is the column dict from ArpTable.to_json()
+separate  -> node.arp is empty, tables go to result.arpTables[ip]
+file      -> each device's table is appended to `path` as soon as it is
+             collected and dropped from memory; node.arpCount keeps the size
+off       -> ARP is not collected at all
+"""
+
+import ipaddress
+import json
+import re
+from array import array
+
+MODES = ("inline", "columnar", "separate", "file", "off")
+
+
+def pack_mac(mac):
+    """'000c.29b8.afe0' / '00:0c:29:b8:af:e0' -> int, None/invalid -> 0."""
+    if not mac:
+        return 0
+    digits = re.sub(r"[^0-9a-fA-F]", "", mac)
+    if len(digits) != 12:
+        return 0
+    return int(digits, 16)
+
+
+def unpack_mac(value):
+    """int -> Cisco dotted MAC ('000c.29b8.afe0'); 0 -> None."""
+    if not value:
+        return None
+    h = f"{value:012x}"
+    return f"{h[0:4]}.{h[4:8]}.{h[8:12]}"
+
+
+class ArpTable:
+    """Columnar ARP rows for one device."""
+
+    def __init__(self, max_rows=None):
+        self.max_rows = max_rows
+        self.ips = array("I")
+        self.macs = array("Q")
+        self.ifaces = array("I")
+        self.phys = array("I")
+        self.names = []
+        self._name_idx = {}
+        self.dropped = 0
+
+    def _intern(self, name):
+        idx = self._name_idx.get(name)
+        if idx is None:
+            idx = self._name_idx[name] = len(self.names)
+            self.names.append(name)
+        return idx
+
+    def append(self, ip, mac, iface, phys_iface) -> bool:
+        """Add a row; returns False (and counts it) once the cap is reached."""
+        if self.max_rows is not None and len(self.ips) >= self.max_rows:
+            self.dropped += 1
+            return False
+        self.ips.append(int(ipaddress.IPv4Address(ip)))
+        self.macs.append(pack_mac(mac))
+        self.ifaces.append(self._intern(iface))
+        self.phys.append(self._intern(phys_iface))
+        return True
+
+    def __len__(self):
+        return len(self.ips)
+
+    def rows(self):
+        """Yield legacy {ip, mac, iface, phys_iface} dicts."""
+        for i in range(len(self.ips)):
+            yield {
+                "ip": str(ipaddress.IPv4Address(self.ips[i])),
+                "mac": unpack_mac(self.macs[i]),
+                "iface": self.names[self.ifaces[i]],
+                "phys_iface": self.names[self.phys[i]],
+            }
+
+    def to_json(self):
+        return {
+            "ip": self.ips.tolist(),
+            "mac": self.macs.tolist(),
+            "iface": self.ifaces.tolist(),
+            "physIface": self.phys.tolist(),
+            "ifaceNames": list(self.names),
+            "dropped": self.dropped,
+        }
+
+    @classmethod
+    def from_json(cls, data, max_rows=None):
+        table = cls(max_rows)
+        table.ips.extend(data.get("ip", []))
+        table.macs.extend(data.get("mac", []))
+        table.ifaces.extend(data.get("iface", []))
+        table.phys.extend(data.get("physIface", []))
+        for name in data.get("ifaceNames", []):
+            table._intern(name)
+        table.dropped = data.get("dropped", 0)
+        return table
+
+
+class ArpOptions:
+    def __init__(self, mode="inline", vlans=None, interfaces=None, exclude_incomplete=False,
+                 max_rows=None, path=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown ARP mode '{mode}', expected one of {MODES}")
+        if mode == "file" and not path:
+            raise ValueError("ARP mode 'file' requires a path")
+        self.mode = mode
+        # device-side regex is case sensitive, the parse-time check is not
+        self.filter_names = list(interfaces or []) + [f"Vlan{v}" for v in (vlans or [])]
+        self.interfaces = {i.lower() for i in self.filter_names}
+        self.exclude_incomplete = exclude_incomplete
+        self.max_rows = int(max_rows) if max_rows else None
+        self.path = path
+        self._sink = None
+
+    @classmethod
+    def from_payload(cls, data):
+        if not data:
+            return None
+        return cls(
+            mode=data.get("mode", "inline"),
+            vlans=data.get("vlans"),
+            interfaces=data.get("interfaces"),
+            exclude_incomplete=bool(data.get("excludeIncomplete")),
+            max_rows=data.get("maxRows"),
+            path=data.get("path"),
+        )
+
+    def command_filter(self) -> str:
+        """Output modifier so the device drops unwanted rows before sending them.
+
+        IOS accepts a single pipe, so an interface/VLAN include wins and the
+        incomplete-entry exclusion is then applied while parsing. `_` is the
+        Cisco regex delimiter, so `Vlan10_` does not match Vlan100.
+        """
+        if self.filter_names:
+            return " | include " + "|".join(f"{re.escape(i)}_" for i in self.filter_names)
+        if self.exclude_incomplete:
+            return " | exclude ncomplete|NCOMPLETE"
+        return ""
+
+    def accepts(self, iface, phys_iface, mac) -> bool:
+        if self.exclude_incomplete and not mac:
+            return False
+        if self.interfaces and (iface or "").lower() not in self.interfaces \
+                and (phys_iface or "").lower() not in self.interfaces:
+            return False
+        return True
+
+    def write(self, ip, table):
+        """mode=file: append one device's table to the ARP file."""
+        if self._sink is None:
+            self._sink = open(self.path, "a", encoding="utf-8")
+        self._sink.write(json.dumps({"device": ip, **table.to_json()}) + "\n")
+        self._sink.flush()
+
+    def close(self):
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
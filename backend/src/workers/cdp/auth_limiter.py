@@ -0,0 +1,168 @@
+"""
+SSH authentication rate limiting
+
+Every ssh_connect is a password authentication against the AAA servers
+(TACACS+/RADIUS). AuthLimiter paces them:
+
+    token buckets   one global, one for the job's credential group; a login
+                    waits until both have a token
+    backoff         an auth or banner timeout is taken as "AAA is busy":
+                    new logins pause for an exponentially growing, jittered
+                    delay; any successful login resets it
+    retry queue     an IP that failed with a timeout is retried later, at
+                    most `max_retries` times, instead of being dropped
+
+Wrong passwords, refused connections and TCP connect timeouts (the host is
+unreachable, AAA never saw the login) are not retried.
+
+Shard processes each get 1/N of the global rate so the total across a
+sharded crawl stays within it.
+
+Job payload:
+    "auth": {"rate": 5, "burst": 5,               global logins/second
+             "groups": {"tacacs-a": {"rate": 2}},  per credential group
+             "group": "tacacs-a",                  group of this job
+             "backoffBase": 1, "backoffMax": 30, "maxRetries": 2}
+"""
+
+import heapq
+import random
+import threading
+import time
+
+_TRANSIENT_MARKERS = ("timed out", "timeout", "banner", "reset by peer", "temporarily")
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token now; returns how long the caller must wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class AuthLimiter:
+    def __init__(self, rate=None, burst=None, group_rate=None, group_burst=None,
+                 backoff_base=1.0, backoff_max=30.0, max_retries=2):
+        self.buckets = [TokenBucket(r, b) for r, b in ((rate, burst), (group_rate, group_burst)) if r]
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.streak = 0            # consecutive transient failures
+        self.paused_until = 0.0
+        self.attempts = {}         # ip -> retries scheduled so far
+        self.transient = set()     # IPs whose last failure was a timeout
+        self._retries = []         # heap of (due, ip)
+
+    @classmethod
+    def from_payload(cls, opts, shards=1):
+        if not opts:
+            return None
+        shards = max(1, int(shards or 1))
+        group = (opts.get("groups") or {}).get(opts.get("group")) or {}
+
+        def rate(value):
+            return float(value) / shards if value else None
+
+        return cls(
+            rate=rate(opts.get("rate")),
+            burst=opts.get("burst"),
+            group_rate=rate(group.get("rate")),
+            group_burst=group.get("burst"),
+            backoff_base=float(opts.get("backoffBase", 1.0)),
+            backoff_max=float(opts.get("backoffMax", 30.0)),
+            max_retries=int(opts.get("maxRetries", 2)),
+        )
+
+    @staticmethod
+    def is_transient(exc):
+        # socket errors (connect timeout, NoValidConnectionsError) come from the
+        # TCP connect; paramiko raises SSHException only once it is up
+        import paramiko  # already loaded by the ssh_connect that raised `exc`
+
+        if not isinstance(exc, paramiko.SSHException):
+            return False
+        if isinstance(exc, paramiko.AuthenticationException):
+            return "timeout" in str(exc).lower()
+        return any(m in str(exc).lower() for m in _TRANSIENT_MARKERS)
+
+    def backoff(self, attempt):
+        """Jittered exponential delay for the `attempt`-th consecutive failure (1-based)."""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** max(0, attempt - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    # ---- login pacing ----
+    def acquire(self, stop=None):
+        """Block until a new authentication may start (or the `stop` event is set)."""
+        wait = max([b.reserve() for b in self.buckets] or [0.0])
+        with self.lock:
+            wait = max(wait, self.paused_until - time.monotonic())
+        if wait > 0:
+            if stop is not None:
+                stop.wait(wait)
+            else:
+                time.sleep(wait)
+
+    def success(self, ip):
+        with self.lock:
+            self.streak = 0
+            self.transient.discard(ip)
+
+    def failure(self, ip, exc):
+        """Record a failed login; returns True when it looks like AAA/device overload."""
+        transient = self.is_transient(exc)
+        with self.lock:
+            if transient:
+                self.streak += 1
+                self.paused_until = max(self.paused_until, time.monotonic() + self.backoff(self.streak))
+                self.transient.add(ip)
+            else:
+                self.transient.discard(ip)
+        return transient
+
+    # ---- per-IP retry queue ----
+    def schedule_retry(self, ip):
+        """Queue `ip` for another attempt if its last failure was transient and retries remain."""
+        with self.lock:
+            if ip not in self.transient or self.attempts.get(ip, 0) >= self.max_retries:
+                return False
+            self.attempts[ip] = self.attempts.get(ip, 0) + 1
+            heapq.heappush(self._retries, (time.monotonic() + self.backoff(self.attempts[ip]), ip))
+            return True
+
+    def due_retries(self):
+        out = []
+        with self.lock:
+            now = time.monotonic()
+            while self._retries and self._retries[0][0] <= now:
+                out.append(heapq.heappop(self._retries)[1])
+        return out
+
+    def next_retry_in(self):
+        with self.lock:
+            return max(0.0, self._retries[0][0] - time.monotonic()) if self._retries else None
+
+    def claim_retry(self, ip):
+        """Remove `ip` from the retry queue; seconds until it was due, None if not queued."""
+        with self.lock:
+            for i, (due, queued) in enumerate(self._retries):
+                if queued == ip:
+                    self._retries.pop(i)
+                    heapq.heapify(self._retries)
+                    return max(0.0, due - time.monotonic())
+        return None
+
+    def pending_retries(self):
+        with self.lock:
+            return {ip for _, ip in self._retries}
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+End-to-end discovery benchmark
+
+Starts device_simulator.py for a synthetic topology, drives worker_entry.py
+against it exactly like run_discovery does (JSON job on stdin, graph on
+stdout) and reports wall time, devices per second and the worker's peak RSS.
+Exits non-zero when a budget is exceeded so crawl-speed regressions fail CI.
+With --verify-replay the crawl is archived and re-parsed from the archive
+(one worker and a process pool); any difference from the live graph fails
+the run too.
+
+Usage:
+    python bench_discovery.py --devices 10 --latency 0.05 --max-seconds 120
+    python bench_discovery.py --devices 30 --extra '{"shards": 4}'
+    python bench_discovery.py --devices 12 --extra '{"fastFacts": true}' --verify-replay
+    python bench_discovery.py --devices 8 --aliases 2 --extra '{"resolveAliases": true}' --verify-replay
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from device_simulator import DeviceSimulator, SyntheticTopology
+import result_codec
+
+
+def run_benchmark(devices=10, fanout=3, arp_rows=20, latency=0.0, banner_delay=0.0, port=2222,
+                  protocol="cdp", extra=None, seed=1, verify_replay=False, aliases=0):
+    topo = SyntheticTopology(devices, fanout, arp_rows, seed, aliases)
+    sim = DeviceSimulator(topo, port=port, latency=latency, banner_delay=banner_delay).start()
+    job = {
+        **(extra or {}),
+        "seedIps": [topo.devices[0].ip],
+        "username": sim.username,
+        "password": sim.password,
+        "protocol": protocol,
+        "sshPort": port,
+    }
+    archive = None
+    if verify_replay:
+        archive = tempfile.mkdtemp(prefix="cdp-bench-archive-")
+        job["archive"] = archive
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker_entry.py")
+    try:
+        started = time.monotonic()
+        proc = subprocess.run([sys.executable, script_path], input=json.dumps(job).encode("utf-8"),
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        wall = time.monotonic() - started
+    finally:
+        sim.stop()
+
+    if proc.returncode != 0:
+        raise RuntimeError(f"worker_entry failed (code {proc.returncode}): {proc.stderr.decode()[-2000:]}")
+    # --extra '{"output": {...}}' benchmarks the negotiated result encodings too
+    graph = result_codec.decode(proc.stdout)
+    crawled = sum(1 for n in graph.get("nodes", []) if not n.get("placeholder"))
+    # ru_maxrss is KiB on Linux (bytes on macOS); only one child has run
+    peak_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == "darwin":
+        peak_kb //= 1024
+    replay = None
+    if archive is not None:
+        try:
+            replay = verify_replay_graph(archive, graph)
+        finally:
+            shutil.rmtree(archive, ignore_errors=True)
+    report = {
+        "devices": devices,
+        "crawled": crawled,
+        "nodes": len(graph.get("nodes", [])),
+        "links": len(graph.get("links", [])),
+        "wallSeconds": round(wall, 3),
+        "devicesPerSecond": round(crawled / wall, 3) if wall else None,
+        "peakRssMb": round(peak_kb / 1024, 1),
+    }
+    if replay is not None:
+        report["replayMismatches"] = replay
+    return report
+
+
+def verify_replay_graph(archive, graph):
+    """Node ids whose re-parsed record differs from `graph`, per worker count."""
+    from transcript_archive import reparse
+
+    live = {n["id"]: n for n in graph.get("nodes", [])}
+    live_links = sorted(json.dumps(l, sort_keys=True) for l in graph.get("links", []))
+    mismatches = {}
+    for workers in (1, 2):
+        rebuilt = reparse(archive, workers)
+        nodes = {n["id"]: n for n in rebuilt.get("nodes", [])}
+        bad = sorted(i for i in live.keys() | nodes.keys() if live.get(i) != nodes.get(i))
+        if sorted(json.dumps(l, sort_keys=True) for l in rebuilt.get("links", [])) != live_links:
+            bad.append("<links>")
+        mismatches[str(workers)] = bad
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark worker_entry against the device simulator")
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--arp-rows", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--banner-delay", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--protocol", default="cdp", choices=["cdp", "lldp", "both"])
+    parser.add_argument("--extra", default="{}", help="extra job payload keys as JSON")
+    parser.add_argument("--max-seconds", type=float, help="fail if wall time exceeds this")
+    parser.add_argument("--min-dps", type=float, help="fail if devices/second drops below this")
+    parser.add_argument("--max-rss-mb", type=float, help="fail if worker peak RSS exceeds this")
+    parser.add_argument("--aliases", type=int, default=0,
+                        help="devices reachable on a second address (use with resolveAliases)")
+    parser.add_argument("--verify-replay", action="store_true",
+                        help="fail if re-parsing the crawl's transcript archive gives another graph")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.devices, args.fanout, args.arp_rows, args.latency, args.banner_delay,
+                           args.port, args.protocol, json.loads(args.extra), verify_replay=args.verify_replay,
+                           aliases=args.aliases)
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if report["crawled"] < args.devices:
+        failures.append(f"crawled {report['crawled']} of {args.devices} devices")
+    if args.max_seconds is not None and report["wallSeconds"] > args.max_seconds:
+        failures.append(f"wall time {report['wallSeconds']}s > {args.max_seconds}s")
+    if args.min_dps is not None and (report["devicesPerSecond"] or 0) < args.min_dps:
+        failures.append(f"{report['devicesPerSecond']} devices/s < {args.min_dps}")
+    if args.max_rss_mb is not None and report["peakRssMb"] > args.max_rss_mb:
+        failures.append(f"peak RSS {report['peakRssMb']} MB > {args.max_rss_mb} MB")
+    for workers, bad in (report.get("replayMismatches") or {}).items():
+        if bad:
+            failures.append(f"replay with {workers} worker(s) differs on {', '.join(bad[:10])}")
+    for f in failures:
+        sys.stderr.write(f"REGRESSION: {f}\n")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Per-device command capability cache
+
+Remembers, across crawls, which command variants a device answered so the
+next crawl sends only the variant known to work instead of paying a full
+send_command idle window for every failed attempt:
+
+    arp_command      "show arp detail" | "show ip arp detail"
+    type_source      "inventory" | "version"
+    hostname_source  "running-config" | "version"
+    term_length      whether `term length 0` is accepted
+    cdp / lldp       False when the protocol is disabled on the device
+    channels         session channels the device lets one SSH transport hold
+
+Entries are stored per device IP. Command-variant keys are also stored per
+platform family (nxos, iosxe, ios, ...), guessed from the platform string
+the peer advertised, and used for devices seen for the first time. Every
+key, per device and per family, carries its own timestamp: values older
+than `max_age` seconds are ignored so upgrades get re-probed, and False (a
+command or protocol the device refused) already after `negative_max_age`,
+so a device that enables CDP later is picked up again.
+
+One box's refusal says little about its platform (a restricted AAA profile
+rejects `term length 0`, a busy one refuses channels), so False never
+reaches the family and a device never lowers the family's `channels`.
+
+File layout (JSON):
+    {"devices": {ip: {"family": "nxos", "updated": 1700000000, "caps": {...},
+                      "stamps": {key: 1700000000}}},
+     "families": {"nxos": {"caps": {...}, "stamps": {key: 1700000000}}}}
+"""
+
+import json
+import os
+import time
+
+# keys that describe the OS rather than one box's configuration
+SHARED_KEYS = ("arp_command", "type_source", "hostname_source", "term_length", "channels")
+
+
+def platform_family(text):
+    """Guess the OS family from a platform/version string (None if unknown)."""
+    t = (text or "").upper()
+    if not t:
+        return None
+    if any(k in t for k in ("NX-OS", "NEXUS", "N9K", "N7K", "N5K", "N3K")):
+        return "nxos"
+    if any(k in t for k in ("IOS XR", "IOS-XR", "ASR9", "NCS")):
+        return "iosxr"
+    if any(k in t for k in ("ASA", "FIREPOWER", "FPR")):
+        return "asa"
+    if any(k in t for k in ("IOS-XE", "IOS XE", "ISR4", "C9200", "C9300", "C9400", "C9500", "C8", "CSR")):
+        return "iosxe"
+    if any(k in t for k in ("IOS", "WS-C", "C2960", "C3560", "C3750", "C3850", "ISR")):
+        return "ios"
+    return None
+
+
+class CapabilityCache:
+    def __init__(self, path, max_age=7 * 24 * 3600, negative_max_age=24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self.negative_max_age = negative_max_age
+        self.devices = {}
+        self.families = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.devices = data.get("devices") or {}
+        # older files keep bare {key: value} per family, unstamped: re-probed once
+        self.families = {family: caps if "caps" in caps else {"caps": caps}
+                         for family, caps in (data.get("families") or {}).items()}
+
+    def note_family(self, ip, family):
+        if family:
+            entry = self.devices.setdefault(ip, {"caps": {}})
+            entry["family"] = family
+
+    def _fresh(self, entry, key):
+        value = entry["caps"][key]
+        # files written before per-key stamps only have the entry's `updated`
+        stamp = entry.get("stamps", {}).get(key, entry.get("updated", 0))
+        return time.time() - stamp <= (self.negative_max_age if value is False else self.max_age)
+
+    def get(self, ip, key):
+        entry = self.devices.get(ip)
+        if entry and key in entry.get("caps", {}) and self._fresh(entry, key):
+            return entry["caps"][key]
+        shared = self.families.get((entry or {}).get("family")) if key in SHARED_KEYS else None
+        if shared and key in shared.get("caps", {}) and self._fresh(shared, key):
+            return shared["caps"][key]
+        return None
+
+    def set(self, ip, key, value):
+        entry = self.devices.setdefault(ip, {"caps": {}})
+        now = int(time.time())
+        _stamp(entry, key, value, now)
+        entry["updated"] = now
+        if key in SHARED_KEYS and entry.get("family") and value is not False:
+            shared = self.families.setdefault(entry["family"], {"caps": {}})
+            lowered = (key == "channels" and key in shared["caps"] and self._fresh(shared, key)
+                       and value < shared["caps"][key])
+            if not lowered:
+                _stamp(shared, key, value, now)
+        self._dirty = True
+
+    def save(self):
+        """Write the cache atomically, merging entries other workers saved meanwhile."""
+        if not self._dirty:
+            return
+        on_disk = CapabilityCache.__new__(CapabilityCache)
+        on_disk.path, on_disk.devices, on_disk.families = self.path, {}, {}
+        on_disk._load()
+        for ip, entry in on_disk.devices.items():
+            mine = self.devices.get(ip)
+            if mine is None:
+                self.devices[ip] = entry
+                continue
+            _merge(mine, entry)
+            mine["updated"] = max(mine.get("updated", 0), entry.get("updated", 0))
+            if entry.get("family") and not mine.get("family"):
+                mine["family"] = entry["family"]
+        for family, entry in on_disk.families.items():
+            _merge(self.families.setdefault(family, {"caps": {}}), entry)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"devices": self.devices, "families": self.families}, f)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+def _stamp(entry, key, value, now):
+    entry.setdefault("caps", {})[key] = value
+    entry.setdefault("stamps", {})[key] = now
+
+
+def _merge(mine, theirs):
+    """Newest value per key, so one worker's refresh doesn't drop another's."""
+    stamps = theirs.get("stamps", {})
+    for key, value in theirs.get("caps", {}).items():
+        stamp = stamps.get(key, theirs.get("updated", 0))
+        if key not in mine.get("caps", {}) or stamp > mine.get("stamps", {}).get(key, mine.get("updated", 0)):
+            _stamp(mine, key, value, stamp)
@@ -0,0 +1,93 @@
+"""
+Crawl checkpoint
+
+Append-only JSONL journal of a discovery run so a crawl killed half way
+(worker timeout, OOM, container restart) can be resumed.
+
+Record types, one JSON object per line:
+    {"t": "job", "seedIps": [...], "protocol": "cdp"}
+    {"t": "device", "ip": "...", "info": {...}, "neighbors": [...]}
+    {"t": "failed", "ip": "..."}
+
+On resume the discovery replays the same BFS: devices found in the journal
+are served from it instead of being dialed again, so visited_ips,
+connections, covered_seed_ips and the frontier are rebuilt exactly and the
+crawl continues where it stopped. Credentials are never written.
+"""
+
+import json
+import os
+
+from arp_table import ArpTable
+from network_topology_testing import log
+
+
+def _encode(obj):
+    # columnar ARP tables are journaled in their JSON column form
+    if isinstance(obj, ArpTable):
+        return obj.to_json()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+class CrawlCheckpoint:
+    def __init__(self, path, resume=True):
+        self.path = path
+        self.job = None
+        self.devices = {}   # ip -> (device_info, neighbors)
+        self.failed = set()
+        if resume and os.path.exists(path):
+            self._load()
+        self._fh = open(path, "a" if resume else "w", encoding="utf-8")
+        if resume and self._fh.tell() > 0 and not self._ends_with_newline():
+            # terminate a torn last record so the next one starts on its own line
+            self._fh.write("\n")
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # last line may be cut short if the worker died mid-write
+                    continue
+                kind = rec.get("t")
+                if kind == "job" and self.job is None:
+                    self.job = rec
+                elif kind == "device":
+                    info = rec.get("info") or {}
+                    if isinstance(info.get("arp_entries"), dict):
+                        info["arp_entries"] = ArpTable.from_json(info["arp_entries"])
+                    self.devices[rec["ip"]] = (info, rec.get("neighbors") or [])
+                    self.failed.discard(rec["ip"])
+                elif kind == "failed" and rec.get("ip") not in self.devices:
+                    self.failed.add(rec["ip"])
+        log(f"checkpoint: loaded {len(self.devices)} devices, {len(self.failed)} failed from {self.path}")
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _append(self, record):
+        self._fh.write(json.dumps(record, default=_encode) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def record_job(self, seed_ips, protocol):
+        if self.job is None:
+            self.job = {"t": "job", "seedIps": list(seed_ips), "protocol": protocol}
+            self._append(self.job)
+
+    def record_device(self, ip, info, neighbors):
+        self.devices[ip] = (info, neighbors)
+        self._append({"t": "device", "ip": ip, "info": info, "neighbors": neighbors})
+
+    def record_failed(self, ip):
+        self.failed.add(ip)
+        self._append({"t": "failed", "ip": ip})
+
+    def close(self):
+        try:
+            self._fh.close()
+        except Exception:
+            pass
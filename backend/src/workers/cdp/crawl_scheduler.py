@@ -0,0 +1,124 @@
+"""
+Budgeted, priority-ordered crawl frontier
+
+Replaces the plain FIFO queue of Flow 2 (epidemic_discovery). A CrawlPolicy
+holds the limits of one job:
+
+    maxDepth     hops from the seed beyond which neighbors stay placeholders
+    maxDevices   stop once this many devices have been crawled
+    timeBudget   seconds from job start, or
+    deadline     absolute Unix time, whichever comes first
+    prioritize   order the frontier instead of FIFO (default true when any
+                 "crawl" options are given)
+    typeOrder    device types to crawl first, best first
+                 (default router, switch, firewall, wireless, server, vm)
+
+A Frontier is a heap keyed by (type rank, -degree, depth, arrival): core
+platforms before edge devices, and among those the IPs advertised by the
+most crawled neighbors first, so a budget cut keeps the backbone. Degree
+changes re-push the IP; stale heap entries are skipped on pop.
+
+Job payload: "crawl": {"maxDepth": 3, "maxDevices": 200, "timeBudget": 240}
+"""
+
+import heapq
+import itertools
+import time
+
+DEFAULT_TYPE_ORDER = ("router", "switch", "firewall", "wireless", "server", "vm")
+
+
+class CrawlPolicy:
+    def __init__(self, max_depth=None, max_devices=None, time_budget=None, deadline=None,
+                 prioritize=True, type_order=DEFAULT_TYPE_ORDER):
+        self.max_depth = max_depth
+        self.max_devices = max_devices
+        self.prioritize = prioritize
+        self.type_rank = {t: i for i, t in enumerate(type_order)}
+        # everything is tracked on the monotonic clock; `deadline` is wall time
+        now = time.monotonic()
+        ends = []
+        if time_budget is not None:
+            ends.append(now + time_budget)
+        if deadline is not None:
+            ends.append(now + (deadline - time.time()))
+        self.ends_at = min(ends) if ends else None
+
+    @classmethod
+    def from_payload(cls, opts):
+        """None (plain FIFO, no limits) when the job has no "crawl" options."""
+        if not opts:
+            return None
+
+        def num(key, kind):
+            return kind(opts[key]) if opts.get(key) is not None else None
+
+        return cls(
+            max_depth=num("maxDepth", int),
+            max_devices=num("maxDevices", int),
+            time_budget=num("timeBudget", float),
+            deadline=num("deadline", float),
+            prioritize=bool(opts.get("prioritize", True)),
+            type_order=tuple(opts.get("typeOrder") or DEFAULT_TYPE_ORDER),
+        )
+
+    def remaining_time(self):
+        return None if self.ends_at is None else self.ends_at - time.monotonic()
+
+    def exhausted(self, crawled):
+        """'deadline' / 'maxDevices' once a budget is used up, else None."""
+        if self.ends_at is not None and time.monotonic() >= self.ends_at:
+            return "deadline"
+        if self.max_devices is not None and crawled >= self.max_devices:
+            return "maxDevices"
+        return None
+
+    def allowance(self, crawled, batch_size):
+        """How many devices the next batch may crawl."""
+        if self.max_devices is None:
+            return batch_size
+        return max(0, min(batch_size, self.max_devices - crawled))
+
+    def within_depth(self, depth):
+        return self.max_depth is None or depth <= self.max_depth
+
+
+class Frontier:
+    """Flow 2 queue: FIFO without a policy, priority heap with one."""
+
+    def __init__(self, policy=None, classify=None):
+        self.policy = policy
+        self.classify = classify
+        self._heap = []
+        self._seq = itertools.count()
+        self.depth = {}    # ip -> smallest hop count seen
+        self.degree = {}   # ip -> how many crawled devices advertised it
+        self._rank = {}
+
+    def _key(self, ip):
+        if self.policy is None or not self.policy.prioritize:
+            return (next(self._seq),)
+        return (self._rank.get(ip, len(self.policy.type_rank)), -self.degree[ip], self.depth[ip], next(self._seq))
+
+    def push(self, ip, depth, record=None):
+        self.depth[ip] = min(depth, self.depth.get(ip, depth))
+        self.degree[ip] = self.degree.get(ip, 0) + 1
+        platform = (record or {}).get("platform")
+        if platform and self.classify is not None and self.policy is not None:
+            self._rank.setdefault(ip, self.policy.type_rank.get(self.classify(platform), len(self.policy.type_rank)))
+        heapq.heappush(self._heap, (self._key(ip), ip, self.degree[ip]))
+
+    def pop(self):
+        while self._heap:
+            key, ip, degree = heapq.heappop(self._heap)
+            # a newer entry with a higher degree is still in the heap (FIFO keeps duplicates)
+            if self.policy is not None and self.policy.prioritize and degree != self.degree[ip]:
+                continue
+            return ip
+        return None
+
+    def pending(self):
+        return {ip for _, ip, _ in self._heap}
+
+    def __len__(self):
+        return len(self._heap)
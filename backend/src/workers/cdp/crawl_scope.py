@@ -0,0 +1,126 @@
+"""
+Crawl scope
+
+Decides, before an IP is queued for Flow 2, whether it is ours to dial.
+Neighbors outside the scope (carrier PEs, customer CPE, out-of-band
+addresses, ...) stay in the graph as leaf placeholders flagged
+`outOfScope` and are never connected to. Seeds are always dialed.
+
+Job payload:
+    "scope": {
+        "include": ["10.0.0.0/8"],          # only these are dialed (default: all)
+        "exclude": ["10.255.0.0/16"],        # never dialed
+        "hostnames": {"include": ["^core-"], "exclude": ["(?i)^pe-"]},
+        "platforms": {"exclude": ["(?i)asr9k", "Polycom"]}
+    }
+
+CIDRs are compiled into a binary prefix trie per address family, so a
+lookup walks at most 32 (IPv4) or 128 (IPv6) bits. The most specific
+matching prefix decides, which lets an include inside an exclude inside
+an include work as expected. Hostname and platform patterns are regexes
+(re.search) against the CDP/LLDP record that advertised the IP; a record
+without a hostname/platform passes those filters.
+"""
+
+import ipaddress
+import re
+
+INCLUDE, EXCLUDE = True, False
+
+
+class PrefixTrie:
+    """Longest-prefix match over one address family; nodes are [zero, one, value]."""
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.root = [None, None, None]
+
+    def insert(self, network, value):
+        node = self.root
+        addr = int(network.network_address)
+        for i in range(network.prefixlen):
+            bit = (addr >> (self.bits - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        node[2] = value
+
+    def lookup(self, addr):
+        """Value of the longest prefix containing int `addr`, or None."""
+        node = self.root
+        best = node[2]
+        for i in range(self.bits):
+            node = node[(addr >> (self.bits - 1 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                best = node[2]
+        return best
+
+
+def _compile_patterns(patterns):
+    # compiled one by one: each may carry its own global flags such as (?i)
+    return [re.compile(p) for p in patterns or [] if p] or None
+
+
+class _TextFilter:
+    def __init__(self, opts):
+        opts = opts or {}
+        self.include = _compile_patterns(opts.get("include"))
+        self.exclude = _compile_patterns(opts.get("exclude"))
+
+    def allows(self, text):
+        if not text:
+            return True
+        if self.exclude is not None and any(rx.search(text) for rx in self.exclude):
+            return False
+        return self.include is None or any(rx.search(text) for rx in self.include)
+
+
+class CrawlScope:
+    def __init__(self, include=(), exclude=(), hostnames=None, platforms=None):
+        self.tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+        self.has_include = {4: False, 6: False}
+        # insert excludes last: the same prefix listed in both is excluded
+        for cidrs, action in ((include, INCLUDE), (exclude, EXCLUDE)):
+            for cidr in cidrs:
+                net = ipaddress.ip_network(cidr, strict=False)
+                self.tries[net.version].insert(net, action)
+                if action is INCLUDE:
+                    self.has_include[net.version] = True
+        self.hostnames = _TextFilter(hostnames)
+        self.platforms = _TextFilter(platforms)
+
+    @classmethod
+    def from_payload(cls, opts):
+        """None (everything in scope) when the job has no "scope" options."""
+        if not opts:
+            return None
+        return cls(
+            include=opts.get("include") or (),
+            exclude=opts.get("exclude") or (),
+            hostnames=opts.get("hostnames"),
+            platforms=opts.get("platforms"),
+        )
+
+    def address_allowed(self, ip):
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            # not an address (e.g. a hostname identifier): only an include list rules it out
+            return not any(self.has_include.values())
+        action = self.tries[addr.version].lookup(int(addr))
+        if action is None:
+            return not self.has_include[addr.version]
+        return action
+
+    def reason(self, ip, record=None):
+        """Why `ip` is out of scope ('address' / 'hostname' / 'platform'), None if in scope."""
+        if not self.address_allowed(ip):
+            return "address"
+        record = record or {}
+        if not self.hostnames.allows(record.get("hostname")):
+            return "hostname"
+        if not self.platforms.allows(record.get("platform")):
+            return "platform"
+        return None
@@ -0,0 +1,89 @@
+"""
+Device identity resolution
+
+A router with loopback, management and interface addresses may be advertised
+under a different IP by each peer. IdentityResolver merges those addresses
+into one device so it is crawled once and emitted as a single node with an
+`aliases` list.
+
+Identity keys, strongest first:
+    ("serial", SN from show inventory)
+    ("chassis", LLDP chassis id)
+    ("name", short hostname + platform family)
+
+Only crawled devices own keys. A queued IP whose neighbor record (or, after
+login, whose serial) matches a key owned by another device becomes an alias
+of that device instead of being crawled again. The name key is only matched
+when the queried device has neither serial nor chassis id, and two devices
+whose serials (or chassis ids) are both known and differ are never merged.
+Factory-default hostnames (Router, Switch, switch, ...) give no name key.
+"""
+
+import re
+
+from capability_cache import platform_family
+
+# hostnames made up by detect_hostname when the device didn't tell us, and
+# Cisco factory defaults that many unconfigured boxes share
+_FALLBACK_NAME = re.compile(
+    r"^(?:Router|Unknown)-[\w.]+$|^Unknown$"
+    r"|^(?i:router|switch|ios|ciscoasa|ap[0-9a-f]{4}\.[0-9a-f]{4}\.[0-9a-f]{4})$"
+)
+STRONG_KEYS = ("serial", "chassis")
+
+
+def short_hostname(name):
+    """'sw1.corp.local(FOC123)' -> 'sw1' (lowercase)."""
+    return re.sub(r"\(.*\)$", "", name or "").split(".")[0].strip().lower()
+
+
+def identity_keys(hostname=None, platform=None, serial=None, chassis_id=None):
+    keys = []
+    if serial:
+        keys.append(("serial", serial.strip().upper()))
+    if chassis_id:
+        keys.append(("chassis", re.sub(r"[^0-9a-z]", "", chassis_id.lower())))
+    name = short_hostname(hostname)
+    if name and not (_FALLBACK_NAME.match(hostname or "") or _FALLBACK_NAME.match(name)):
+        keys.append(("name", f"{name}|{platform_family(platform) or '?'}"))
+    return keys
+
+
+class IdentityResolver:
+    def __init__(self):
+        self._owner = {}      # identity key -> canonical ip
+        self._strong = {}     # canonical ip -> {"serial"|"chassis": value}
+        self._canonical = {}  # alias ip -> canonical ip
+        self.aliases = {}     # canonical ip -> [alias ip, ...]
+
+    def lookup(self, keys):
+        """Canonical IP of the crawled device matching any of `keys`, else None."""
+        strong = {kind: value for kind, value in keys if kind in STRONG_KEYS}
+        for key in keys:
+            if key[0] == "name" and strong:
+                continue
+            owner = self._owner.get(key)
+            if owner is None:
+                continue
+            known = self._strong.get(owner, {})
+            if any(known.get(kind, value) != value for kind, value in strong.items()):
+                continue   # same name or chassis, different box
+            return owner
+        return None
+
+    def register(self, ip, keys):
+        """Record the keys of crawled device `ip` (first owner of a key wins)."""
+        for key in keys:
+            self._owner.setdefault(key, ip)
+            if key[0] in STRONG_KEYS:
+                self._strong.setdefault(ip, {}).setdefault(key[0], key[1])
+
+    def add_alias(self, ip, canonical):
+        canonical = self.canonical(canonical)
+        if ip == canonical or self._canonical.get(ip) == canonical:
+            return
+        self._canonical[ip] = canonical
+        self.aliases.setdefault(canonical, []).append(ip)
+
+    def canonical(self, ip):
+        return self._canonical.get(ip, ip)
@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+"""
+Offline Cisco device simulator
+
+Serves a deterministic synthetic topology of N devices over SSH (paramiko
+server interface) so NetworkTopologyDiscovery can be exercised without real
+gear. Every device listens on its own loopback address (127.1.x.y) on the
+same port and answers the commands the crawler sends:
+
+    term length 0, enable (+ password), show running-config | include ^hostname,
+    show version [| include uptime], show inventory, show cdp neighbors detail,
+    show lldp neighbors detail, show arp detail, show ip arp detail
+
+both on an interactive shell and on exec channels. Devices form a tree with
+the given fan-out; platforms rotate through Nexus / Catalyst / ISR so the
+NX-OS and IOS code paths are both hit (Nexus rejects `show arp detail`).
+
+Nexus devices also answer the neighbor/ARP commands with `| json`, and with
+`--nxapi-port` serve NX-API (`cli_show`, plain HTTP POST /ins) on that port.
+With `--snmp-port` every device also runs an SNMPv2c agent (GET, GETNEXT,
+GETBULK) exposing the same data through the MIBs snmp_collector.py walks.
+`--max-channels` refuses session channels beyond that many per SSH
+connection with 'Resource shortage', as small IOS boxes do. `--aliases N`
+gives N devices a second SSH address (127.2.x.y) that another device
+advertises, for alias resolution.
+
+Usage:
+    python device_simulator.py --devices 20 --port 2222 --latency 0.05
+"""
+
+import argparse
+import base64
+import bisect
+import copy
+import json
+import random
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import paramiko
+
+import snmp_ber as ber
+import snmp_collector as mib
+
+PLATFORMS = [
+    # (platform string, PID, version banner, accepts `show arp detail`)
+    ("N9K-C93180YC-EX", "N9K-C93180YC-EX", "Cisco Nexus Operating System (NX-OS) Software", False),
+    ("WS-C3850-48P", "WS-C3850-48P", "Cisco IOS Software, Catalyst L3 Switch Software", True),
+    ("ISR4451-X/K9", "ISR4451-X/K9", "Cisco IOS XE Software, ISR Software", True),
+]
+
+INVALID = "% Invalid input detected at '^' marker."
+
+
+def sim_ip(index):
+    """Loopback address of device `index` (0-based)."""
+    return f"127.1.{index // 250}.{index % 250 + 1}"
+
+
+class SimDevice:
+    def __init__(self, index, rng, arp_rows):
+        self.index = index
+        self.ip = sim_ip(index)
+        self.hostname = f"SIM-{index + 1:04d}"
+        self.platform, self.pid, self.banner, self.show_arp_ok = PLATFORMS[index % len(PLATFORMS)]
+        self.serial = f"FDO{rng.randrange(10**7, 10**8)}"
+        self.mac = f"0c{index:010x}"
+        self.links = []   # (local_if, peer SimDevice, peer_if)
+        self.arp = [
+            (f"10.{index % 250}.{r // 250}.{r % 250 + 1}", f"{rng.getrandbits(48):012x}", f"Vlan{10 + r % 4}",
+             f"Ethernet1/{1 + r % 48}")
+            for r in range(arp_rows)
+        ]
+
+    # ---- command rendering ----
+    def _cdp(self):
+        out = []
+        for local_if, peer, peer_if in self.links:
+            out += [
+                "-------------------------",
+                f"Device ID: {peer.hostname}",
+                "Entry address(es): ",
+                f"  IP address: {peer.ip}",
+                f"Platform: cisco {peer.platform},  Capabilities: Router Switch IGMP ",
+                f"Interface: {local_if},  Port ID (outgoing port): {peer_if}",
+                "Holdtime : 150 sec",
+                "",
+            ]
+        return "\n".join(out)
+
+    def _lldp(self):
+        out = []
+        for local_if, peer, peer_if in self.links:
+            out += [
+                "------------------------------------------------",
+                f"Local Intf: {local_if}",
+                f"Chassis id: {peer.mac[0:4]}.{peer.mac[4:8]}.{peer.mac[8:12]}",
+                f"Port id: {peer_if}",
+                f"Port Description: {peer_if}",
+                f"System Name: {peer.hostname}",
+                "",
+                f"System Description: {peer.banner}, {peer.platform}",
+                "",
+                "Management Addresses:",
+                f"    IP: {peer.ip}",
+                "",
+            ]
+        out.append(f"Total entries displayed: {len(self.links)}")
+        return "\n".join(out)
+
+    def _arp(self):
+        rows = [f"{ip:<16} 00:00:18  {mac[0:4]}.{mac[4:8]}.{mac[8:12]}  {iface:<8} {phys}"
+                for ip, mac, iface, phys in self.arp]
+        return "\n".join(["IP ARP Table", "Address         Age       MAC Address     Interface Physical Interface"] + rows)
+
+    @property
+    def nxos(self):
+        return "NX-OS" in self.banner
+
+    def structured(self, base):
+        """NX-OS JSON body for `base`, None if the command has no JSON form."""
+        if base == "show cdp neighbors detail":
+            return {"TABLE_cdp_neighbor_detail_info": {"ROW_cdp_neighbor_detail_info": [
+                {"device_id": peer.hostname, "v4mgmtaddr": peer.ip, "platform_id": f"cisco {peer.platform}",
+                 "intf_id": local_if, "port_id": peer_if, "ttl": "150"}
+                for local_if, peer, peer_if in self.links]}}
+        if base == "show lldp neighbors detail":
+            return {"TABLE_nbor_detail": {"ROW_nbor_detail": [
+                {"chassis_id": f"{peer.mac[0:4]}.{peer.mac[4:8]}.{peer.mac[8:12]}", "port_id": peer_if,
+                 "l_port_id": local_if, "port_desc": peer_if, "sys_name": peer.hostname,
+                 "sys_desc": f"{peer.banner}, {peer.platform}", "mgmt_addr": peer.ip}
+                for local_if, peer, peer_if in self.links]}}
+        if base == "show ip arp detail":
+            return {"TABLE_vrf": {"ROW_vrf": {"vrf-name-out": "default", "TABLE_adj": {"ROW_adj": [
+                {"intf-out": iface, "ip-addr-out": ip, "time-stamp": "00:00:18",
+                 "mac": f"{mac[0:4]}.{mac[4:8]}.{mac[8:12]}", "phy-intf": phys}
+                for ip, mac, iface, phys in self.arp]}}}}
+        return None
+
+    def mib(self):
+        """Sorted [(oid, (tag, value))] view served by the SNMP agent."""
+        def if_index(name):
+            num = name.rsplit("/", 1)[-1] if "/" in name else None
+            return int(num) if num and num.isdigit() else 1000 + int(re.sub(r"\D", "", name) or 0)
+
+        def octets(text):
+            return ber.OCTET_STRING, text.encode()
+
+        view = {
+            mib.SYS_DESCR + (0,): octets(f"{self.banner}, {self.platform}"),
+            mib.SYS_NAME + (0,): octets(self.hostname),
+            mib.ENT_CLASS + (1,): (ber.INTEGER, mib.ENT_CHASSIS),
+            mib.ENT_CLASS + (2,): (ber.INTEGER, 9),
+            mib.ENT_SERIAL + (1,): octets(self.serial),
+            mib.ENT_SERIAL + (2,): octets(f"{self.serial}M"),
+            mib.ENT_MODEL + (1,): octets(self.pid),
+            mib.ENT_MODEL + (2,): octets("SFP-10G-SR"),
+        }
+        ifaces = {l[0] for l in self.links} | {a[2] for a in self.arp}
+        for name in ifaces:
+            view[mib.IF_NAME + (if_index(name),)] = octets(name)
+        for local_if, peer, peer_if in self.links:
+            idx = if_index(local_if)
+            cdp = (idx, 1)
+            view[mib.CDP_CACHE + (3,) + cdp] = (ber.INTEGER, 1)
+            view[mib.CDP_CACHE + (4,) + cdp] = (ber.OCTET_STRING, socket.inet_aton(peer.ip))
+            view[mib.CDP_CACHE + (6,) + cdp] = octets(peer.hostname)
+            view[mib.CDP_CACHE + (7,) + cdp] = octets(peer_if)
+            view[mib.CDP_CACHE + (8,) + cdp] = octets(f"cisco {peer.platform}")
+            view[mib.LLDP_LOC_PORT_ID + (idx,)] = octets(local_if)
+            rem = (0, idx, 1)
+            view[mib.LLDP_REM + (4,) + rem] = (ber.INTEGER, 4)
+            view[mib.LLDP_REM + (5,) + rem] = (ber.OCTET_STRING, bytes.fromhex(peer.mac))
+            view[mib.LLDP_REM + (6,) + rem] = (ber.INTEGER, 5)
+            view[mib.LLDP_REM + (7,) + rem] = octets(peer_if)
+            view[mib.LLDP_REM + (8,) + rem] = octets(peer_if)
+            view[mib.LLDP_REM + (9,) + rem] = octets(peer.hostname)
+            view[mib.LLDP_REM + (10,) + rem] = octets(f"{peer.banner}, {peer.platform}")
+            addr = tuple(int(p) for p in peer.ip.split("."))
+            view[mib.LLDP_REM_MAN_ADDR + rem + (1, 4) + addr] = (ber.INTEGER, 2)
+        for ip, mac, iface, _ in self.arp:
+            view[mib.ARP_PHYS + (if_index(iface),) + tuple(int(p) for p in ip.split("."))] = \
+                (ber.OCTET_STRING, bytes.fromhex(mac))
+        return sorted(view.items())
+
+    def run(self, command):
+        cmd = " ".join(command.split())
+        base, _, modifier = cmd.partition(" | ")
+        if modifier == "json":
+            body = self.structured(base) if self.nxos else None
+            return INVALID if body is None else json.dumps(body)
+        if base in ("term length 0", "terminal length 0", ""):
+            out = ""
+        elif base.startswith("show running-config"):
+            out = f"hostname {self.hostname}"
+        elif base == "show version":
+            out = f"{self.banner}\n{self.hostname} uptime is 1 week, 2 days\ncisco {self.pid} processor"
+        elif base == "show inventory":
+            out = (f'NAME: "Chassis", DESCR: "Cisco {self.platform} Chassis"\n'
+                   f"PID: {self.pid}       , VID: V01  , SN: {self.serial}")
+        elif base == "show cdp neighbors detail":
+            out = self._cdp()
+        elif base == "show lldp neighbors detail":
+            out = self._lldp()
+        elif base == "show ip arp detail" or (base == "show arp detail" and self.show_arp_ok):
+            out = self._arp()
+        else:
+            return INVALID
+        return _apply_modifier(out, modifier)
+
+
+def _apply_modifier(out, modifier):
+    """Minimal `| include` / `| exclude` support (Cisco `_` delimiter included)."""
+    if not modifier:
+        return out
+    kind, _, pattern = modifier.partition(" ")
+    rx = re.compile(pattern.replace("_", r"(?:\s|$|,)"))
+    if kind in ("include", "i", "inc"):
+        return "\n".join(l for l in out.splitlines() if rx.search(l))
+    if kind in ("exclude", "e", "exc"):
+        return "\n".join(l for l in out.splitlines() if not rx.search(l))
+    return out
+
+
+class SyntheticTopology:
+    """Deterministic tree of `devices` nodes with the given fan-out.
+
+    With `aliases`, devices 1.. also answer on a second address (127.2.x.y),
+    advertised by a device from the other end of the tree, so the crawler
+    reaches the same chassis through two IPs.
+    """
+
+    def __init__(self, devices=10, fanout=3, arp_rows=20, seed=1, aliases=0):
+        rng = random.Random(seed)
+        self.devices = [SimDevice(i, rng, arp_rows) for i in range(devices)]
+        ports = [1] * devices
+        for child in range(1, devices):
+            parent = (child - 1) // fanout
+            p_if, c_if = f"Ethernet1/{ports[parent]}", f"Ethernet1/{ports[child]}"
+            ports[parent] += 1
+            ports[child] += 1
+            self.devices[parent].links.append((p_if, self.devices[child], c_if))
+            self.devices[child].links.append((c_if, self.devices[parent], p_if))
+        self.aliases = []   # SimDevice copies sharing serial, hostname and links
+        for k in range(min(aliases, devices - 2)):
+            device, advertiser = self.devices[1 + k], self.devices[-1 - k]
+            if advertiser is device:
+                break
+            alias = copy.copy(device)
+            alias.ip = f"127.2.{k // 250}.{k % 250 + 1}"
+            advertiser.links.append((f"Ethernet9/{k + 1}", alias, "Ethernet9/1"))
+            self.aliases.append(alias)
+        self.by_ip = {d.ip: d for d in self.devices + self.aliases}
+
+
+class _DeviceServer(paramiko.ServerInterface):
+    def __init__(self, username, password, max_channels=None):
+        self.username = username
+        self.password = password
+        self.max_channels = max_channels
+        self.pending = 0     # channels granted but not accepted yet
+        self.channels = []   # accepted channels (closed ones are pruned on the next open)
+        self.requests = {}   # chanid -> ("shell", None) | ("exec", command)
+        self.cond = threading.Condition()
+
+    def check_auth_password(self, username, password):
+        if username == self.username and password == self.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind != "session":
+            return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+        with self.cond:
+            self.channels = [c for c in self.channels if not c.closed]
+            if self.max_channels is not None and len(self.channels) + self.pending >= self.max_channels:
+                return paramiko.OPEN_FAILED_RESOURCE_SHORTAGE
+            self.pending += 1
+        return paramiko.OPEN_SUCCEEDED
+
+    def accepted(self, channel):
+        with self.cond:
+            self.pending -= 1
+            self.channels.append(channel)
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def _set(self, channel, request):
+        with self.cond:
+            self.requests[channel.get_id()] = request
+            self.cond.notify_all()
+        return True
+
+    def check_channel_shell_request(self, channel):
+        return self._set(channel, ("shell", None))
+
+    def check_channel_exec_request(self, channel, command):
+        return self._set(channel, ("exec", command.decode("utf-8", "replace")))
+
+    def wait_request(self, channel, timeout=10):
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            # a channel closed without a request (e.g. a probe) stops the wait too
+            while channel.get_id() not in self.requests and not channel.closed and time.monotonic() < deadline:
+                self.cond.wait(0.1)
+            # channel ids are reused once closed
+            return self.requests.pop(channel.get_id(), None)
+
+
+class DeviceSimulator:
+    """Run SSH listeners for every device of a SyntheticTopology."""
+
+    def __init__(self, topology, port=2222, username="cisco", password="cisco",
+                 enable_password="cisco", latency=0.0, banner_delay=0.0, nxapi_port=None,
+                 snmp_port=None, community="public", max_channels=None):
+        self.topology = topology
+        self.nxapi_port = nxapi_port
+        self.snmp_port = snmp_port
+        self.community = community.encode()
+        self.port = port
+        self.username = username
+        self.password = password
+        self.enable_password = enable_password
+        self.latency = latency
+        self.banner_delay = banner_delay
+        self.max_channels = max_channels
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self._socks = []
+        self._http = []
+        self._stop = threading.Event()
+
+    def start(self):
+        for dev in self.topology.devices + self.topology.aliases:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((dev.ip, self.port))
+            sock.listen(16)
+            sock.settimeout(0.5)
+            self._socks.append(sock)
+            threading.Thread(target=self._accept_loop, args=(sock, dev), daemon=True).start()
+            if dev in self.topology.aliases:
+                continue   # SSH only on alias addresses
+            if self.snmp_port:
+                udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                udp.bind((dev.ip, self.snmp_port))
+                udp.settimeout(0.5)
+                self._socks.append(udp)
+                threading.Thread(target=self._snmp_loop, args=(udp, dev), daemon=True).start()
+            if self.nxapi_port and dev.nxos:
+                httpd = ThreadingHTTPServer((dev.ip, self.nxapi_port), self._nxapi_handler(dev))
+                self._http.append(httpd)
+                threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for sock in self._socks:
+            try:
+                sock.close()
+            except Exception:
+                pass
+        for httpd in self._http:
+            httpd.shutdown()
+            httpd.server_close()
+
+    def _snmp_loop(self, sock, dev):
+        view = dev.mib()
+        oids = [oid for oid, _ in view]
+        while not self._stop.is_set():
+            try:
+                data, addr = sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            try:
+                community, pdu_type, rid, non_rep, max_rep, varbinds = ber.decode_message(data)
+            except ber.BerError:
+                continue
+            if community != self.community:
+                continue
+            if self.latency:
+                time.sleep(self.latency)
+            out = []
+            for oid, _ in varbinds:
+                if pdu_type == ber.GET:
+                    i = bisect.bisect_left(oids, oid)
+                    found = i < len(oids) and oids[i] == oid
+                    out.append((oid, view[i][1] if found else (ber.NO_SUCH_INSTANCE, None)))
+                    continue
+                reps = max(1, max_rep) if pdu_type == ber.GET_BULK else 1
+                i = bisect.bisect_right(oids, oid)
+                for _ in range(reps):
+                    if i >= len(oids):
+                        out.append((oid, (ber.END_OF_MIB_VIEW, None)))
+                        break
+                    out.append(view[i])
+                    oid = oids[i]
+                    i += 1
+            sock.sendto(ber.encode_message(community, ber.RESPONSE, rid, out), addr)
+
+    def _nxapi_handler(self, dev):
+        sim = self
+        auth = "Basic " + base64.b64encode(f"{self.username}:{self.password}".encode()).decode()
+
+        class NxapiHandler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if self.path != "/ins" or self.headers.get("Authorization") != auth:
+                    self.send_error(401 if self.path == "/ins" else 404)
+                    return
+                if sim.latency:
+                    time.sleep(sim.latency)
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+                outputs = []
+                for command in request["ins_api"]["input"].split(";"):
+                    body = dev.structured(" ".join(command.split()))
+                    if body is None:
+                        outputs.append({"input": command.strip(), "code": "400", "msg": "Input CLI command error"})
+                    else:
+                        outputs.append({"input": command.strip(), "body": body, "code": "200", "msg": "Success"})
+                data = json.dumps({"ins_api": {"type": "cli_show", "version": "1.0", "sid": "eoc", "outputs": {
+                    "output": outputs[0] if len(outputs) == 1 else outputs}}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return NxapiHandler
+
+    def _accept_loop(self, sock, dev):
+        while not self._stop.is_set():
+            try:
+                client, _ = sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            threading.Thread(target=self._handle_client, args=(client, dev), daemon=True).start()
+
+    def _handle_client(self, client, dev):
+        if self.banner_delay:
+            time.sleep(self.banner_delay)
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        server = _DeviceServer(self.username, self.password, self.max_channels)
+        try:
+            transport.start_server(server=server)
+        except Exception:
+            return
+        while transport.is_active() and not self._stop.is_set():
+            chan = transport.accept(1)
+            if chan is None:
+                continue
+            server.accepted(chan)
+            threading.Thread(target=self._serve_channel, args=(server, chan, dev), daemon=True).start()
+
+    def _serve_channel(self, server, chan, dev):
+        request = server.wait_request(chan)
+        try:
+            if request is None:
+                return
+            kind, command = request
+            if kind == "exec":
+                if self.latency:
+                    time.sleep(self.latency)
+                chan.sendall((dev.run(command) + "\n").encode())
+                chan.send_exit_status(0)
+            else:
+                self._shell(chan, dev)
+        except Exception:
+            pass
+        finally:
+            try:
+                chan.close()
+            except Exception:
+                pass
+
+    def _shell(self, chan, dev):
+        prompt = f"\r\n{dev.hostname}#"
+        chan.sendall(f"\r\n{dev.hostname}>".encode() if self.enable_password else prompt.encode())
+        privileged = not self.enable_password
+        awaiting_password = False
+        buf = ""
+        while not self._stop.is_set():
+            data = chan.recv(4096)
+            if not data:
+                return
+            buf += data.decode("utf-8", "replace")
+            while "\n" in buf or "\r" in buf:
+                idx = min(i for i in (buf.find("\n"), buf.find("\r")) if i >= 0)
+                line, buf = buf[:idx].strip(), buf[idx + 1:].lstrip("\n")
+                if self.latency:
+                    time.sleep(self.latency)
+                if awaiting_password:
+                    awaiting_password = False
+                    privileged = privileged or line == self.enable_password
+                    out = "" if privileged else "% Access denied"
+                elif line.split(" ")[0] in ("en", "enable"):
+                    awaiting_password = True
+                    chan.sendall(f"{line}\r\nPassword: ".encode())
+                    continue
+                else:
+                    out = f"{line}\r\n" + dev.run(line).replace("\n", "\r\n") if line else ""
+                mark = "#" if privileged else ">"
+                chan.sendall((out + f"\r\n{dev.hostname}{mark}").encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic Cisco topology over SSH")
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--arp-rows", type=int, default=20)
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each command reply")
+    parser.add_argument("--banner-delay", type=float, default=0.0, help="seconds before the SSH banner")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--nxapi-port", type=int, help="serve NX-API over HTTP on Nexus devices")
+    parser.add_argument("--snmp-port", type=int, help="run an SNMPv2c agent (community 'public') on this UDP port")
+    parser.add_argument("--max-channels", type=int, help="session channels allowed per SSH connection")
+    parser.add_argument("--aliases", type=int, default=0, help="devices that also answer on a second address")
+    args = parser.parse_args()
+
+    topo = SyntheticTopology(args.devices, args.fanout, args.arp_rows, args.seed, args.aliases)
+    sim = DeviceSimulator(topo, port=args.port, latency=args.latency, banner_delay=args.banner_delay,
+                          nxapi_port=args.nxapi_port, snmp_port=args.snmp_port,
+                          max_channels=args.max_channels).start()
+    print(f"Simulating {len(topo.devices)} devices on port {args.port}, root {topo.devices[0].ip}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
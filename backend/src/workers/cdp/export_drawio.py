@@ -8,17 +8,28 @@ Usage:
     Reads JSON from stdin with structure:
     {
         "nodes": [{"id": "...", "label": "...", "type": "router|switch|...", "mgmtIp": "..."}],
-        "links": [{"source": "...", "target": "...", "srcIfName": "...", "dstIfName": "..."}]
+        "links": [{"source": "...", "target": "...", "srcIfName": "...", "dstIfName": "..."}],
+        "lod": {"level": "auto", "maxNodes": 200}    # optional, see graph_lod.py
     }
 
     Outputs Draw.io XML to stdout
+
+Batch mode:
+    {
+        "pages": [{"name": "...", "nodes": [...], "links": [...], "lod": {...}}, ...],
+        "lod": {...},                  # default for pages without their own
+        "split": "component",          # optional: one page per connected topology
+        "workers": 4                   # layout processes, default: one per CPU
+    }
+
+    Pages are laid out in parallel and written as one multi-page .drawio file.
 """
 
 import sys
 import json
 import math
-
-from drawio_network_plot import NetPlot
+import os
+import xml.etree.ElementTree as ET
 
 
 # Node type to drawio_network_plot node type mapping
@@ -34,6 +45,7 @@ NETPLOT_TYPE_MAP = {
     'cloud': 'cloud',
     'unknown': 'generic_appliance',
     'vm': 'virtual_machine',
+    'cluster': 'cloud',
 }
 
 
@@ -111,6 +123,9 @@ def compute_hierarchical_positions(nodes, links, width=1800, height=1200):
 
 def generate_drawio_xml(nodes, links):
     """Generate Draw.io XML using drawio_network_plot library"""
+    # imported here so bad input fails fast without loading the plot library
+    from drawio_network_plot import NetPlot
+
     plot = NetPlot()
     
     # Check if nodes already have positions from canvas
@@ -134,12 +149,21 @@ def generate_drawio_xml(nodes, links):
         
         pos = positions.get(node['id'], {'x': 400, 'y': 300})
         
+        cluster = node.get('cluster')
+        if cluster:
+            # collapsed cluster: one cell summarising its members
+            model = ', '.join(f"{count} {t}" for t, count in sorted(cluster['types'].items()))
+            role = f"{cluster['kind']} cluster, {cluster.get('internalLinks', 0)} internal links"
+        else:
+            model = node.get('model') or node.get('platform') or ''
+            role = node.get('role') or node_type.title()
+
         device_list.append({
             'nodeName': node['id'],
             'nodeType': netplot_type,
             'hostname': node.get('label') or node.get('hostname') or node['id'],
-            'model': node.get('model') or node.get('platform') or '',
-            'role': node.get('role') or node_type.title(),
+            'model': model,
+            'role': role,
             'x': pos['x'],
             'y': pos['y'],
         })
@@ -149,6 +173,9 @@ def generate_drawio_xml(nodes, links):
     for link in links:
         src_if = link.get('srcIfName') or link.get('sourceInterface') or ''
         dst_if = link.get('dstIfName') or link.get('targetInterface') or ''
+        if link.get('count'):
+            # links folded by graph_lod
+            src_if, dst_if = f"{link['count']} links", ''
         
         connection_list.append({
             'sourceNodeID': link.get('source'),
@@ -165,6 +192,106 @@ def generate_drawio_xml(nodes, links):
     return plot.display_xml()
 
 
+def apply_lod(nodes, links, lod, name=None):
+    """Optional level-of-detail clustering for large topologies"""
+    if not lod:
+        return nodes, links
+    from graph_lod import LodOptions, cluster_graph
+    nodes, links, level = cluster_graph(nodes, links, LodOptions.from_payload(lod))
+    where = f" ({name})" if name else ""
+    sys.stderr.write(f"export_drawio: detail level {level}{where}, {len(nodes)} nodes, {len(links)} links\n")
+    return nodes, links
+
+
+def split_topologies(nodes, links):
+    """Split a graph into its connected topologies, largest first"""
+    adjacency = {n['id']: [] for n in nodes}
+    for link in links:
+        src, dst = link.get('source'), link.get('target')
+        if src in adjacency and dst in adjacency:
+            adjacency[src].append(dst)
+            adjacency[dst].append(src)
+
+    component = {}
+    groups = []
+    for node_id in adjacency:
+        if node_id in component:
+            continue
+        component[node_id] = len(groups)
+        members, stack = [node_id], [node_id]
+        while stack:
+            for neighbor in adjacency[stack.pop()]:
+                if neighbor not in component:
+                    component[neighbor] = len(groups)
+                    members.append(neighbor)
+                    stack.append(neighbor)
+        groups.append(members)
+
+    pages = [([], []) for _ in groups]
+    for node in nodes:
+        pages[component[node['id']]][0].append(node)
+    for link in links:
+        if link.get('source') in component:
+            pages[component[link['source']]][1].append(link)
+    return sorted(pages, key=lambda page: -len(page[0]))
+
+
+def render_page(page):
+    """Draw.io XML for one page (runs in a worker process in batch mode)"""
+    nodes, links = apply_lod(page['nodes'], page['links'], page.get('lod'), page.get('name'))
+    return generate_drawio_xml(nodes, links)
+
+
+def combine_pages(names, xml_pages):
+    """Merge single-page Draw.io documents into one multi-page <mxfile>"""
+    mxfile = None
+    for i, (name, xml) in enumerate(zip(names, xml_pages), 1):
+        root = ET.fromstring(xml)
+        if root.tag == 'mxfile':
+            diagrams = root.findall('diagram')
+            if mxfile is None:
+                mxfile = ET.Element('mxfile', root.attrib)
+        else:
+            # bare <mxGraphModel>: wrap it in a page of its own
+            diagram = ET.Element('diagram')
+            diagram.append(root)
+            diagrams = [diagram]
+        if mxfile is None:
+            mxfile = ET.Element('mxfile', {'host': 'drawio'})
+        for j, diagram in enumerate(diagrams):
+            diagram.set('id', f"page-{i}" if len(diagrams) == 1 else f"page-{i}-{j + 1}")
+            diagram.set('name', name if len(diagrams) == 1 else f"{name} ({j + 1})")
+            mxfile.append(diagram)
+    mxfile.set('pages', str(len(mxfile)))
+    return ET.tostring(mxfile, encoding='unicode')
+
+
+def export_pages(data):
+    """One multi-page Draw.io document for a batch job"""
+    pages = []
+    for i, page in enumerate(data['pages'], 1):
+        name = page.get('name') or f"Topology {i}"
+        lod = page.get('lod', data.get('lod'))
+        parts = [(page.get('nodes', []), page.get('links', []))]
+        if data.get('split') == 'component':
+            parts = split_topologies(*parts[0])
+        for k, (nodes, links) in enumerate(parts, 1):
+            if nodes:
+                pages.append({'name': name if len(parts) == 1 else f"{name} - {k}",
+                              'nodes': nodes, 'links': links, 'lod': lod})
+    if not pages:
+        raise ValueError("No nodes provided")
+
+    workers = min(int(data.get('workers') or os.cpu_count() or 1), len(pages))
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            xml_pages = list(pool.map(render_page, pages))
+    else:
+        xml_pages = [render_page(page) for page in pages]
+    return combine_pages([page['name'] for page in pages], xml_pages)
+
+
 def main():
     try:
         # Read input from stdin
@@ -173,11 +300,17 @@ def main():
             raise ValueError("No input data provided")
         
         data = json.loads(input_data)
+        if 'pages' in data:
+            print(export_pages(data))
+            return
+
         nodes = data.get('nodes', [])
         links = data.get('links', [])
         
         if not nodes:
             raise ValueError("No nodes provided")
+
+        nodes, links = apply_lod(nodes, links, data.get('lod'))
         
         # Generate XML using drawio_network_plot
         xml = generate_drawio_xml(nodes, links)
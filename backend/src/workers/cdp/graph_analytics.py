@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Graph analytics over a discovered {nodes, links} graph
+
+CsrGraph turns the graph into an undirected CSR adjacency held in NumPy
+arrays (indptr/indices, int32; parallel and self links folded) and
+answers the questions the UI otherwise works out by scanning lists:
+
+    bfs / path        hop distances from a device, shortest path between two
+    components        connected components (vectorised hook + pointer jumping)
+    articulation      devices whose failure splits the network, with the
+                      number of devices they cut off (blast radius)
+    bridges           links whose failure splits the network
+    degree_stats      min/max/mean/median/p95 and the best-connected devices
+
+BFS and components are level-synchronous array operations; articulation
+points and bridges need a DFS (Tarjan), which runs iteratively over the
+CSR lists. A 50k-link graph takes well under a second either way.
+
+`"analytics": true` (or {"top": 20}) in the job payload adds an `analytics`
+section to the worker output.
+
+Usage:
+    python graph_analytics.py graph.json [--top 10]
+    python graph_analytics.py graph.json --path 10.0.0.1 10.0.9.7
+    python graph_analytics.py graph.json --blast 10.0.0.1
+    cat graph.json | python graph_analytics.py -
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+
+class CsrGraph:
+    def __init__(self, ids, edges):
+        """`ids`: node ids by index; `edges`: int array (m, 2) of unique u < v pairs."""
+        self.ids = ids
+        self.index = {node_id: i for i, node_id in enumerate(ids)}
+        self.edges = edges
+        n = len(ids)
+        src = np.concatenate([edges[:, 0], edges[:, 1]])
+        dst = np.concatenate([edges[:, 1], edges[:, 0]])
+        order = np.argsort(src, kind="stable")
+        self.indices = dst[order].astype(np.int32)
+        self.edge_of = np.concatenate([np.arange(len(edges))] * 2)[order].astype(np.int32)
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=self.indptr[1:])
+
+    @classmethod
+    def from_graph(cls, graph):
+        ids = [n["id"] for n in graph.get("nodes", [])]
+        seen = set(ids)
+        for link in graph.get("links", []):
+            for end in (link.get("source"), link.get("target")):
+                if end is not None and end not in seen:
+                    seen.add(end)
+                    ids.append(end)
+        index = {node_id: i for i, node_id in enumerate(ids)}
+        pairs = np.array([(index[l["source"]], index[l["target"]]) for l in graph.get("links", [])
+                          if l.get("source") is not None and l.get("target") is not None],
+                         dtype=np.int64).reshape(-1, 2)
+        pairs = np.sort(pairs, axis=1)
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        edges = np.unique(pairs, axis=0) if len(pairs) else pairs
+        return cls(ids, edges)
+
+    @property
+    def n(self):
+        return len(self.ids)
+
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    # ---- traversal ----
+    def slots(self, frontier):
+        """(adjacency positions, owning node) for every entry of the frontier nodes."""
+        starts = self.indptr[frontier]
+        counts = self.indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        return offsets, np.repeat(frontier, counts)
+
+    def _expand(self, frontier):
+        """(neighbor, from) pairs for every adjacency entry of the frontier nodes."""
+        offsets, came_from = self.slots(frontier)
+        return self.indices[offsets], came_from
+
+    def bfs(self, source, max_depth=None):
+        """(dist, parent) arrays from node index `source`; -1 where unreachable."""
+        dist = np.full(self.n, -1, dtype=np.int32)
+        parent = np.full(self.n, -1, dtype=np.int32)
+        dist[source] = 0
+        frontier = np.array([source], dtype=np.int32)
+        level = 0
+        while len(frontier) and (max_depth is None or level < max_depth):
+            level += 1
+            nbrs, came_from = self._expand(frontier)
+            fresh = dist[nbrs] < 0
+            nbrs, first = np.unique(nbrs[fresh], return_index=True)
+            dist[nbrs] = level
+            parent[nbrs] = came_from[fresh][first]
+            frontier = nbrs.astype(np.int32)
+        return dist, parent
+
+    def path(self, a, b):
+        """Shortest path between node ids `a` and `b` as a list of ids, None if disconnected."""
+        src, dst = self.index[a], self.index[b]
+        dist, parent = self.bfs(src)
+        if dist[dst] < 0:
+            return None
+        hops = [dst]
+        while hops[-1] != src:
+            hops.append(int(parent[hops[-1]]))
+        return [self.ids[i] for i in reversed(hops)]
+
+    def components(self):
+        """Component label (smallest member index) per node."""
+        labels = np.arange(self.n, dtype=np.int64)
+        u, v = self.edges[:, 0], self.edges[:, 1]
+        while True:
+            lu, lv = labels[u], labels[v]
+            low = np.minimum(lu, lv)
+            hooked = labels.copy()
+            # hook each root onto the smallest root it touches, then flatten
+            np.minimum.at(hooked, lu, low)
+            np.minimum.at(hooked, lv, low)
+            while True:
+                jumped = hooked[hooked]
+                if np.array_equal(jumped, hooked):
+                    break
+                hooked = jumped
+            if np.array_equal(hooked, labels):
+                return labels
+            labels = hooked
+
+    # ---- cut vertices / cut edges ----
+    def articulation(self):
+        """(articulation {index: cut-off}, bridges [(edge index, cut-off)]).
+
+        Iterative Tarjan. The cut-off is how many devices end up outside the
+        largest remaining piece of their component when the device or link
+        fails, i.e. its blast radius.
+        """
+        n = self.n
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        edge_of = self.edge_of.tolist()
+        disc = [-1] * n
+        low = [0] * n
+        size = [1] * n
+        cut = {}
+        bridges = []
+        timer = 0
+        for root in range(n):
+            if disc[root] >= 0:
+                continue
+            disc[root] = low[root] = timer
+            timer += 1
+            pieces = {}              # node -> sizes of the subtrees it separates
+            cut_edges = []           # (edge, child) bridges of this component
+            stack = [(root, -1, indptr[root])]
+            while stack:
+                node, via, pos = stack[-1]
+                if pos < indptr[node + 1]:
+                    stack[-1] = (node, via, pos + 1)
+                    nxt, edge = indices[pos], edge_of[pos]
+                    if edge == via:
+                        continue
+                    if disc[nxt] < 0:
+                        disc[nxt] = low[nxt] = timer
+                        timer += 1
+                        stack.append((nxt, edge, indptr[nxt]))
+                    elif disc[nxt] < low[node]:
+                        low[node] = disc[nxt]
+                    continue
+                stack.pop()
+                if not stack:
+                    break
+                parent = stack[-1][0]
+                size[parent] += size[node]
+                if low[node] < low[parent]:
+                    low[parent] = low[node]
+                if low[node] >= disc[parent]:
+                    pieces.setdefault(parent, []).append(size[node])
+                if low[node] > disc[parent]:
+                    cut_edges.append((via, node))
+            total = size[root]
+            for node, sizes in pieces.items():
+                if node == root and len(sizes) < 2:
+                    continue
+                rest = total - 1 - sum(sizes)
+                cut[node] = total - 1 - max(max(sizes), rest)
+            for edge, child in cut_edges:
+                bridges.append((edge, min(size[child], total - size[child])))
+        return cut, bridges
+
+    def degree_stats(self, top=10):
+        deg = self.degrees()
+        if self.n == 0:
+            return {"min": 0, "max": 0, "mean": 0.0, "median": 0.0, "p95": 0.0, "isolated": 0, "top": []}
+        best = np.argsort(-deg, kind="stable")[:top]
+        return {
+            "min": int(deg.min()),
+            "max": int(deg.max()),
+            "mean": round(float(deg.mean()), 3),
+            "median": float(np.median(deg)),
+            "p95": float(np.percentile(deg, 95)),
+            "isolated": int((deg == 0).sum()),
+            "top": [{"id": self.ids[i], "degree": int(deg[i])} for i in best],
+        }
+
+
+def analyze(graph, top=10):
+    """Analytics section for a worker graph."""
+    g = CsrGraph.from_graph(graph)
+    labels = g.components()
+    _, sizes = np.unique(labels, return_counts=True)
+    sizes = np.sort(sizes)[::-1]
+    cut, bridges = g.articulation()
+    return {
+        "nodes": g.n,
+        "links": int(len(g.edges)),
+        "components": {
+            "count": int(len(sizes)),
+            "largest": int(sizes[0]) if len(sizes) else 0,
+            "sizes": sizes[:top].tolist(),
+        },
+        "degree": g.degree_stats(top),
+        "articulationPoints": [
+            {"id": g.ids[i], "cutoff": c} for i, c in sorted(cut.items(), key=lambda kv: -kv[1])
+        ],
+        "bridges": [
+            {"source": g.ids[g.edges[e, 0]], "target": g.ids[g.edges[e, 1]], "cutoff": c}
+            for e, c in sorted(bridges, key=lambda ec: -ec[1])
+        ],
+    }
+
+
+def blast_radius(graph, node_id):
+    """Devices cut off from the rest of their component if `node_id` fails."""
+    g = CsrGraph.from_graph(graph)
+    victim = g.index[node_id]
+    keep = np.ones(len(g.edges), dtype=bool)
+    keep &= (g.edges[:, 0] != victim) & (g.edges[:, 1] != victim)
+    rest = CsrGraph(g.ids, g.edges[keep])
+    before = g.components()
+    after = rest.components()
+    members = np.flatnonzero((before == before[victim]) & (np.arange(g.n) != victim))
+    if len(members) == 0:
+        return []
+    groups, counts = np.unique(after[members], return_counts=True)
+    main = groups[np.argmax(counts)]
+    return [g.ids[i] for i in members if after[i] != main]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytics over a discovery graph")
+    parser.add_argument("graph", help="graph JSON file, or - for stdin")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--path", nargs=2, metavar=("FROM", "TO"), help="shortest path between two node ids")
+    parser.add_argument("--blast", metavar="ID", help="devices cut off if this node fails")
+    args = parser.parse_args()
+
+    with (sys.stdin if args.graph == "-" else open(args.graph, "r", encoding="utf-8")) as f:
+        graph = json.load(f)
+    if args.path:
+        hops = CsrGraph.from_graph(graph).path(*args.path)
+        out = {"path": hops, "hops": None if hops is None else len(hops) - 1}
+    elif args.blast:
+        out = {"id": args.blast, "cutOff": blast_radius(graph, args.blast)}
+    else:
+        out = analyze(graph, args.top)
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
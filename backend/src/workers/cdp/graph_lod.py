@@ -0,0 +1,264 @@
+"""
+Level-of-detail clustering for exports
+
+Collapses a {nodes, links} graph into clusters so that exports of large
+topologies stay small: each cluster becomes one node of type "cluster"
+(member list, device type counts and internal link count attached) and
+the links between two clusters/devices are folded into one link carrying
+a `count`.
+
+Clustering stages are applied cumulatively, each on the result of the
+previous one; the detail level is the number of stages applied:
+
+    fans        devices hanging off a single neighbor (access switches,
+                phones, APs) grouped per neighbor; the neighbor stays visible
+    site        hostname prefix, `sitePattern` group 1 (default: the text
+                before the first '-', '.' or '_')
+    subnet      management subnet (`subnetPrefix`, default /24)
+    component   whole connected components
+
+Export payload:
+    "lod": {
+        "level": "auto",              # or 0..4; auto = coarsen until <= maxNodes
+        "maxNodes": 200,
+        "stages": ["fans", "site", "subnet", "component"],
+        "sitePattern": "^([a-z]+\\d*)-",
+        "subnetPrefix": 24,
+        "minClusterSize": 3,          # smaller groups are left expanded
+        "keep": ["10.0.0.1"]          # never collapsed
+    }
+"""
+
+import ipaddress
+import re
+from collections import Counter
+
+STAGES = ("fans", "site", "subnet", "component")
+DEFAULT_SITE_PATTERN = r"^([A-Za-z0-9]+)[-._]"
+
+
+class LodOptions:
+    def __init__(self, level="auto", max_nodes=200, stages=STAGES, site_pattern=DEFAULT_SITE_PATTERN,
+                 subnet_prefix=24, min_size=3, keep=()):
+        unknown = [s for s in stages if s not in STAGES]
+        if unknown:
+            raise ValueError(f"unknown lod stages: {unknown}")
+        self.level = level if level == "auto" else int(level)
+        self.max_nodes = int(max_nodes)
+        self.stages = list(stages)
+        self.site_pattern = re.compile(site_pattern)
+        self.subnet_prefix = int(subnet_prefix)
+        self.min_size = max(2, int(min_size))
+        self.keep = set(keep)
+
+    @classmethod
+    def from_payload(cls, opts):
+        """None (full detail) when the export has no "lod" options; `true` = auto."""
+        if not opts:
+            return None
+        if opts is True:
+            return cls()
+        if not isinstance(opts, dict):
+            return cls(level=opts)
+        return cls(
+            level=opts.get("level", "auto"),
+            max_nodes=opts.get("maxNodes", 200),
+            stages=opts.get("stages") or STAGES,
+            site_pattern=opts.get("sitePattern") or DEFAULT_SITE_PATTERN,
+            subnet_prefix=opts.get("subnetPrefix", 24),
+            min_size=opts.get("minClusterSize", 3),
+            keep=opts.get("keep") or (),
+        )
+
+
+class _Clusters:
+    """Union-find over node ids; roots carry the cluster (kind, key, members)."""
+
+    def __init__(self, ids, links):
+        self.parent = {i: i for i in ids}
+        self.info = {i: (None, None, [i]) for i in ids}
+        self.pairs = [(l.get("source"), l.get("target")) for l in links
+                      if l.get("source") in self.parent and l.get("target") in self.parent]
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def roots(self):
+        return [i for i in self.parent if self.parent[i] == i]
+
+    def merge(self, roots, kind, key):
+        first = roots[0]
+        members = []
+        for r in roots:
+            members.extend(self.info.pop(r)[2])
+            self.parent[r] = first
+        self.info[first] = (kind, key, members)
+
+    def neighbors(self):
+        adj = {r: set() for r in self.roots()}
+        for a, b in self.pairs:
+            ra, rb = self.find(a), self.find(b)
+            if ra != rb:
+                adj[ra].add(rb)
+                adj[rb].add(ra)
+        return adj
+
+
+def _site(node, pattern):
+    m = pattern.search(str(node.get("label") or node.get("hostname") or ""))
+    return m.group(1) if m else None
+
+
+def _subnet(node, prefix):
+    try:
+        return str(ipaddress.ip_network(f"{node.get('mgmtIp') or node.get('id')}/{prefix}", strict=False))
+    except ValueError:
+        return None
+
+
+def _group(clusters, groups, kind, min_size, pinned):
+    for key, roots in groups:
+        roots = [r for r in roots if r not in pinned]
+        size = sum(len(clusters.info[r][2]) for r in roots)
+        if len(roots) > 1 and size >= min_size:
+            clusters.merge(roots, kind, key)
+
+
+def _name(clusters, root, by_id):
+    kind, key, _ = clusters.info[root]
+    return key if kind is not None else by_id[root].get("label") or root
+
+
+def _apply_stage(clusters, stage, by_id, opts, pinned):
+    groups = {}
+    if stage == "fans":
+        fans = {}
+        for root, nbrs in clusters.neighbors().items():
+            if len(nbrs) == 1:
+                fans.setdefault(next(iter(nbrs)), []).append(root)
+        for p, roots in fans.items():
+            key = _name(clusters, p, by_id)
+            groups[key if key not in groups else f"{key} [{p}]"] = roots
+    elif stage == "component":
+        adj = clusters.neighbors()
+        seen = set()
+        for start in adj:
+            if start in seen:
+                continue
+            seen.add(start)
+            comp, stack = [start], [start]
+            while stack:
+                for nxt in adj[stack.pop()]:
+                    if nxt not in seen:
+                        seen.add(nxt)
+                        comp.append(nxt)
+                        stack.append(nxt)
+            groups[f"component {len(groups) + 1}"] = comp
+    else:
+        keyed = {}
+        for root in clusters.roots():
+            keys = Counter(
+                _site(by_id[m], opts.site_pattern) if stage == "site" else _subnet(by_id[m], opts.subnet_prefix)
+                for m in clusters.info[root][2] if m in by_id
+            )
+            keys.pop(None, None)
+            keyed[root] = keys.most_common(1)[0][0] if keys else None
+        adj = clusters.neighbors()
+        for root, key in keyed.items():
+            if key is None and len(adj[root]) == 1:
+                # unnamed leaves (APs, phones, fans of them) follow their uplink
+                key = keyed[next(iter(adj[root]))]
+            if key is not None:
+                groups.setdefault(key, []).append(root)
+    _group(clusters, groups.items(), stage, opts.min_size, pinned)
+
+
+def _cluster_node(node_id, kind, key, members, by_id):
+    records = [by_id[m] for m in members]
+    node = {
+        "id": node_id,
+        "label": f"{len(members)} via {key}" if kind == "fans" else f"{key} ({len(members)})",
+        "type": "cluster",
+        "cluster": {
+            "kind": kind,
+            "key": key,
+            "size": len(members),
+            "members": members,
+            "types": dict(Counter((r.get("type") or "device") for r in records)),
+        },
+    }
+    if all(isinstance(r.get("x"), (int, float)) and isinstance(r.get("y"), (int, float)) for r in records):
+        # keep canvas layouts meaningful: a cluster sits at its members' centroid
+        node["x"] = sum(r["x"] for r in records) / len(records)
+        node["y"] = sum(r["y"] for r in records) / len(records)
+    return node
+
+
+def _build(clusters, nodes, links, by_id):
+    ids = {}
+    taken = set(by_id)
+    out_nodes = []
+    for node in nodes:
+        root = clusters.find(node["id"])
+        if root in ids:
+            continue
+        kind, key, members = clusters.info[root]
+        if kind is None:
+            ids[root] = node["id"]
+            out_nodes.append(node)
+            continue
+        node_id = f"cluster:{kind}:{key}"
+        while node_id in taken:
+            node_id += "'"
+        taken.add(node_id)
+        ids[root] = node_id
+        out_nodes.append(_cluster_node(node_id, kind, key, members, by_id))
+
+    internal = Counter()
+    folded = {}
+    for link in links:
+        src, dst = link.get("source"), link.get("target")
+        if src is None or dst is None:
+            continue
+        a = ids[clusters.find(src)] if src in clusters.parent else src
+        b = ids[clusters.find(dst)] if dst in clusters.parent else dst
+        if a == b:
+            internal[a] += 1
+            continue
+        pair = (a, b) if a <= b else (b, a)
+        if pair not in folded:
+            folded[pair] = {**link, "source": a, "target": b}
+        else:
+            agg = folded[pair]
+            if "count" not in agg:
+                # more than one link: interface names no longer apply
+                folded[pair] = agg = {"id": f"{pair[0]}<->{pair[1]}", "source": pair[0], "target": pair[1],
+                                      "linkType": agg.get("linkType"), "count": 1}
+            agg["count"] += 1
+    for node in out_nodes:
+        if node.get("type") == "cluster":
+            node["cluster"]["internalLinks"] = internal[node["id"]]
+    return out_nodes, list(folded.values())
+
+
+def cluster_graph(nodes, links, opts):
+    """(nodes, links, level) of `nodes`/`links` at the detail level of `opts`."""
+    if opts is None:
+        return nodes, links, 0
+    by_id = {n["id"]: n for n in nodes}
+    clusters = _Clusters(list(by_id), links)
+    pinned = set(opts.keep)
+    target = len(opts.stages) if opts.level == "auto" else min(opts.level, len(opts.stages))
+    level = 0
+    for stage in opts.stages[:target]:
+        if opts.level == "auto" and len(clusters.info) <= opts.max_nodes:
+            break
+        _apply_stage(clusters, stage, by_id, opts, pinned)
+        level += 1
+    out_nodes, out_links = _build(clusters, nodes, links, by_id)
+    return out_nodes, out_links, level
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Graph query service
+
+A small local HTTP service that keeps saved discovery graphs indexed in
+memory (CsrGraph from graph_analytics, plus node records and links per
+adjacency slot) so the UI can ask for the part of a huge topology it is
+looking at instead of loading the whole `graph` blob:
+
+    PUT    /graphs/<id>                          load/replace a graph (body: {nodes, links})
+    DELETE /graphs/<id>                          drop it from the cache
+    GET    /graphs                               cached graphs, most recently used first
+    GET    /graphs/<id>/khop?node=X&k=2&offset=0&limit=500
+    GET    /graphs/<id>/path?from=X&to=Y
+    GET    /graphs/<id>/nodes?q=^core-&vendor=cisco&minDegree=2&offset=0&limit=500
+    GET    /health
+
+`node`, `from` and `to` accept a node id, its label, mgmtIp or one of its
+aliases. k-hop pages are ordered by (hops, node order); every link between
+two nodes of the neighborhood is returned exactly once, on the page of its
+later endpoint, so the union of all pages is the induced subgraph. Unknown
+graphs answer 404 {"error": "unknown graph"}; with --graph-dir the service
+first looks for <dir>/<id>.json.
+
+Graphs are evicted least recently used once more than --cache graphs or
+--max-mb megabytes of source JSON are held.
+
+Usage:
+    python graph_query.py --socket /tmp/cdp-graph-query.sock [--cache 8] [--max-mb 512]
+    python graph_query.py --port 8765 [--graph-dir /var/lib/cdp/graphs]
+"""
+
+import argparse
+import os
+import re
+import socketserver
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+
+import result_codec
+from graph_analytics import CsrGraph
+from network_topology_testing import log
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+GRAPH_ID = re.compile(r"^[A-Za-z0-9._-]+$")
+TEXT_FIELDS = ("label", "hostname", "mgmtIp", "vendor", "platform", "model")
+FLAG_FIELDS = ("placeholder", "unexplored", "outOfScope")
+
+
+class QueryError(ValueError):
+    """Bad request; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class GraphIndex:
+    """One graph ready for queries: CSR adjacency plus records by index."""
+
+    def __init__(self, graph, nbytes=0):
+        self.csr = CsrGraph.from_graph(graph)
+        self.nbytes = nbytes
+        by_id = {n["id"]: n for n in graph.get("nodes", [])}
+        # link endpoints without a node record get a bare one
+        self.records = [by_id.get(node_id) or {"id": node_id} for node_id in self.csr.ids]
+        self.degree = self.csr.degrees()
+        self.names = {}
+        for i, rec in enumerate(self.records):
+            for name in [rec.get("label"), rec.get("mgmtIp")] + list(rec.get("aliases") or []):
+                if name and name not in self.csr.index:
+                    self.names.setdefault(name, i)
+        pair_edge = {pair: e for e, pair in enumerate(map(tuple, self.csr.edges.tolist()))}
+        self.edge_links = [[] for _ in range(len(self.csr.edges))]
+        index = self.csr.index
+        for link in graph.get("links", []):
+            u, v = index.get(link.get("source")), index.get(link.get("target"))
+            if u is None or v is None or u == v:
+                continue
+            self.edge_links[pair_edge[(min(u, v), max(u, v))]].append(link)
+
+    def resolve(self, name):
+        if not name:
+            raise QueryError("node is required")
+        i = self.csr.index.get(name)
+        if i is None:
+            i = self.names.get(name)
+        if i is None:
+            raise QueryError(f"unknown node {name!r}", 404)
+        return i
+
+    def _node(self, i, **extra):
+        return {**self.records[i], "degree": int(self.degree[i]), **extra}
+
+    def _links_within(self, page, rank):
+        """Links from each page node to nodes ranked before it."""
+        offsets, owner = self.csr.slots(page)
+        nbrs = self.csr.indices[offsets]
+        keep = (rank[nbrs] >= 0) & (rank[nbrs] < rank[owner])
+        return [link for e in self.csr.edge_of[offsets[keep]].tolist() for link in self.edge_links[e]]
+
+    def khop(self, node, k=1, offset=0, limit=DEFAULT_LIMIT):
+        src = self.resolve(node)
+        dist, _ = self.csr.bfs(src, k)
+        hood = np.flatnonzero(dist >= 0)
+        hood = hood[np.lexsort((hood, dist[hood]))]
+        rank = np.full(self.csr.n, -1, dtype=np.int64)
+        rank[hood] = np.arange(len(hood))
+        page = hood[offset:offset + limit]
+        return {
+            "center": self.csr.ids[src],
+            "k": k,
+            **_page_info(len(hood), offset, limit),
+            "nodes": [self._node(i, hops=int(dist[i])) for i in page.tolist()],
+            "links": self._links_within(page, rank),
+        }
+
+    def path(self, a, b):
+        src, dst = self.resolve(a), self.resolve(b)
+        hops = self.csr.path(self.csr.ids[src], self.csr.ids[dst])
+        if hops is None:
+            return {"path": None, "hops": None, "nodes": [], "links": []}
+        order = [self.csr.index[h] for h in hops]
+        rank = np.full(self.csr.n, -1, dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        return {
+            "path": hops,
+            "hops": len(hops) - 1,
+            "nodes": [self._node(i) for i in order],
+            # a shortest path has no chords: these are exactly the hop links
+            "links": self._links_within(np.array(order, dtype=np.int32), rank),
+        }
+
+    def nodes(self, filters, offset=0, limit=DEFAULT_LIMIT):
+        match = [i for i in range(self.csr.n) if filters.accepts(self.records[i], int(self.degree[i]))]
+        return {
+            **_page_info(len(match), offset, limit),
+            "nodes": [self._node(i) for i in match[offset:offset + limit]],
+        }
+
+
+class NodeFilter:
+    """`nodes` query parameters: `q` searches id/label/hostname/mgmtIp/aliases,
+    text fields are regexes (re.search, case-insensitive), flags are true/false."""
+
+    def __init__(self, params):
+        self.patterns = {}
+        for field in ("q",) + TEXT_FIELDS:
+            if params.get(field):
+                try:
+                    self.patterns[field] = re.compile(params[field], re.IGNORECASE)
+                except re.error as e:
+                    raise QueryError(f"bad pattern for {field}: {e}")
+        self.flags = {f: params[f].lower() in ("1", "true", "yes") for f in FLAG_FIELDS if f in params}
+        self.min_degree = _int(params, "minDegree", 0)
+        self.max_degree = _int(params, "maxDegree", None)
+
+    def accepts(self, rec, degree):
+        if degree < self.min_degree or (self.max_degree is not None and degree > self.max_degree):
+            return False
+        for flag, wanted in self.flags.items():
+            if bool(rec.get(flag)) != wanted:
+                return False
+        for field, rx in self.patterns.items():
+            if field == "q":
+                texts = [rec.get("id"), rec.get("label"), rec.get("hostname"), rec.get("mgmtIp")] + list(rec.get("aliases") or [])
+                if not any(rx.search(str(t)) for t in texts if t):
+                    return False
+            elif not rx.search(str(rec.get(field) or "")):
+                return False
+        return True
+
+
+def _page_info(total, offset, limit):
+    nxt = offset + limit
+    return {"total": total, "offset": offset, "limit": limit, "next": nxt if nxt < total else None}
+
+
+def _int(params, key, default, low=None, high=None):
+    raw = params.get(key)
+    if raw is None or raw == "":
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise QueryError(f"{key} must be an integer")
+    if low is not None and value < low:
+        raise QueryError(f"{key} must be >= {low}")
+    return min(value, high) if high is not None else value
+
+
+class GraphCache:
+    """LRU of GraphIndex by graph id, bounded by count and source bytes."""
+
+    def __init__(self, max_graphs=8, max_bytes=512 * 1024 * 1024, graph_dir=None):
+        self.max_graphs = max_graphs
+        self.max_bytes = max_bytes
+        self.graph_dir = graph_dir
+        self._graphs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, graph_id, body):
+        graph = result_codec.loads(body)
+        if not isinstance(graph, dict) or not isinstance(graph.get("nodes"), list) or not isinstance(graph.get("links"), list):
+            raise QueryError("graph must be an object with nodes and links")
+        index = GraphIndex(graph, len(body))
+        with self._lock:
+            self._graphs[graph_id] = index
+            self._graphs.move_to_end(graph_id)
+            self._evict()
+        log(f"graph_query: loaded {graph_id} ({index.csr.n} nodes, {len(index.csr.edges)} edges)")
+        return index
+
+    def get(self, graph_id):
+        with self._lock:
+            index = self._graphs.get(graph_id)
+            if index is not None:
+                self._graphs.move_to_end(graph_id)
+                return index
+        path = self.graph_dir and os.path.join(self.graph_dir, f"{graph_id}.json")
+        if path and os.path.isfile(path):
+            with open(path, "rb") as f:
+                return self.put(graph_id, f.read())
+        raise QueryError("unknown graph", 404)
+
+    def drop(self, graph_id):
+        with self._lock:
+            return self._graphs.pop(graph_id, None) is not None
+
+    def listing(self):
+        with self._lock:
+            items = list(self._graphs.items())
+        return [{"id": gid, "nodes": g.csr.n, "edges": int(len(g.csr.edges)), "bytes": g.nbytes}
+                for gid, g in reversed(items)]
+
+    def _evict(self):
+        total = sum(g.nbytes for g in self._graphs.values())
+        while len(self._graphs) > 1 and (len(self._graphs) > self.max_graphs or total > self.max_bytes):
+            gid, g = self._graphs.popitem(last=False)
+            total -= g.nbytes
+            log(f"graph_query: evicted {gid}")
+
+
+def make_handler(cache):
+    class QueryHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def address_string(self):
+            # Unix socket peers have no address
+            return self.client_address[0] if self.client_address else "local"
+
+        def _send(self, status, obj):
+            data = result_codec.dumps(obj)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, method):
+            url = urlparse(self.path)
+            parts = [unquote(p) for p in url.path.strip("/").split("/") if p]
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                self._send(200, self._route(method, parts, params))
+            except QueryError as e:
+                self._send(e.status, {"error": str(e)})
+            except Exception as e:
+                log(f"graph_query: {method} {url.path} failed: {e}")
+                self._send(500, {"error": str(e)})
+
+        def _route(self, method, parts, params):
+            if parts == ["health"]:
+                return {"ok": True}
+            if parts == ["graphs"] and method == "GET":
+                return {"graphs": cache.listing()}
+            if len(parts) < 2 or parts[0] != "graphs" or not GRAPH_ID.match(parts[1]):
+                raise QueryError("not found", 404)
+            graph_id = parts[1]
+            if len(parts) == 2 and method == "PUT":
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                index = cache.put(graph_id, body)
+                return {"id": graph_id, "nodes": index.csr.n, "edges": int(len(index.csr.edges))}
+            if len(parts) == 2 and method == "DELETE":
+                return {"id": graph_id, "dropped": cache.drop(graph_id)}
+            if len(parts) != 3 or method != "GET":
+                raise QueryError("not found", 404)
+            index = cache.get(graph_id)
+            offset = _int(params, "offset", 0, low=0)
+            limit = _int(params, "limit", DEFAULT_LIMIT, low=1, high=MAX_LIMIT)
+            if parts[2] == "khop":
+                k = _int(params, "k", 1, low=0)
+                return {"graph": graph_id, **index.khop(params.get("node"), k, offset, limit)}
+            if parts[2] == "path":
+                return {"graph": graph_id, **index.path(params.get("from"), params.get("to"))}
+            if parts[2] == "nodes":
+                return {"graph": graph_id, **index.nodes(NodeFilter(params), offset, limit)}
+            raise QueryError("not found", 404)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_PUT(self):
+            self._dispatch("PUT")
+
+        def do_DELETE(self):
+            self._dispatch("DELETE")
+
+    return QueryHandler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(cache, socket_path=None, host="127.0.0.1", port=8765):
+    handler = make_handler(cache)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        httpd = UnixHTTPServer(socket_path, handler)
+        where = socket_path
+    else:
+        httpd = ThreadingHTTPServer((host, port), handler)
+        where = f"{host}:{httpd.server_address[1]}"
+    log(f"graph_query: listening on {where}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="k-hop / path / filter queries over saved discovery graphs")
+    parser.add_argument("--socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache", type=int, default=8, help="graphs kept in memory")
+    parser.add_argument("--max-mb", type=float, default=512, help="source JSON megabytes kept in memory")
+    parser.add_argument("--graph-dir", help="load <dir>/<id>.json for graphs not in the cache")
+    args = parser.parse_args()
+
+    cache = GraphCache(max(1, args.cache), int(args.max_mb * 1024 * 1024), args.graph_dir)
+    serve(cache, args.socket, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
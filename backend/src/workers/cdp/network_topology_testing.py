@@ -1,12 +1,18 @@
-from time import sleep
-import paramiko
+from time import monotonic, time
 import re
+import io
 import json
-from collections import defaultdict, deque
+from collections import defaultdict
 import os
-import urllib.request
-import math     # used inside calculate_device_positions
+import math     # used inside _circle_positions
 import sys
+import threading
+
+from arp_table import ArpTable
+from capability_cache import platform_family
+from device_identity import identity_keys
+from crawl_scheduler import Frontier
+from nxos_structured import NxapiClient, StructuredOutputError, decode_cli_json, cdp_neighbors, lldp_neighbors, arp_rows
 
 def log(msg: str):
     try:
@@ -14,6 +20,32 @@ def log(msg: str):
     except Exception:
         pass
 
+class _ExecChannel:
+    """`ssh` stand-in for one parallel collector.
+
+    Every exec_command holds one of the shared channel `slots` until its
+    output is read. A channel that fails (refused with ChannelException,
+    e.g. 'Resource shortage', or cut with the session) is remembered in
+    `refused` so the collector can be redone on the interactive shell.
+    """
+
+    def __init__(self, ssh, slots):
+        self.ssh = ssh
+        self.slots = slots
+        self.refused = None
+
+    def exec_command(self, command):
+        with self.slots:
+            try:
+                _, stdout, _ = self.ssh.exec_command(command)
+            except Exception as e:
+                self.refused = e
+                raise
+            data = stdout.read()
+            stdout.channel.close()
+        return None, io.BytesIO(data), None
+
+
 # ================================================================
 #  CORE DISCOVERY CLASS
 # ================================================================
@@ -27,10 +59,56 @@ class NetworkTopologyDiscovery:
         self.visited_ips = set()
         self.connections = []          # {from,to,from_hostname,to_hostname}
         self.covered_seed_ips = set()  # IP yang sudah tercakup sebagai neighbor dari seed sebelumnya
+        self.claim_ip = None           # optional callable(ip) -> bool, dipakai oleh mode sharded
+        self.checkpoint = None         # optional CrawlCheckpoint (resume tanpa SSH ulang)
+        self.arp_options = None        # optional ArpOptions (filter, cap, columnar storage)
+        self.arp_index = None          # optional ArpIndex, diisi selama crawl
+        self.ssh_port = 22
+        self.capabilities = None       # optional CapabilityCache (varian command yang berhasil)
+        self.neighbor_records = {}     # ip -> record CDP/LLDP pertama yang mengiklankan ip tsb
+        self.fast_facts = False        # hostname dari prompt, tipe dari platform neighbor
+        self.identity = None           # optional IdentityResolver (gabungkan alias IP satu chassis)
+        self.nxos = None               # {"mode": "json"|"nxapi", ...}: structured collectors untuk NX-OS
+        self.batch_size = 1            # berapa IP dari antrian Flow 2 dikumpulkan sekaligus (collect_batch)
+        self.crawl_policy = None       # optional CrawlPolicy (prioritas frontier, depth/device/time budget)
+        self.unexplored = set()        # IP di frontier yang tidak sempat/boleh di-crawl
+        self.scope = None              # optional CrawlScope (CIDR/hostname/platform yang boleh di-dial)
+        self.out_of_scope = {}         # ip -> alasan ('address'|'hostname'|'platform'), tetap placeholder
+        self.stop_reason = None        # 'deadline' | 'maxDevices' | 'terminated' bila crawl dihentikan
+        self.auth_limiter = None       # optional AuthLimiter (rate limit login AAA + retry timeout)
+        self.archive = None            # optional TranscriptArchive (simpan output mentah tiap command)
+        self._device = threading.local()   # device yang sedang di-collect per thread (untuk archive)
+        self.channels = None           # optional int: maks channel paralel per transport (CDP/LLDP/ARP via exec)
+        self.stopping = threading.Event()  # diset oleh abort(): SIGTERM / deadline job
+        self._sessions = set()         # SSHClient yang sedang terbuka (ditutup saat abort)
+        self._sessions_lock = threading.Lock()
 
     # ----------------------------------------------------------------
     #  HELPERS
     # ----------------------------------------------------------------
+    # Prompt patterns used by the post-auth step engine
+    PASSWORD_PROMPT = r"(?i)(?:password|passcode)\s*:\s*$"
+    PRIVILEGED_PROMPT = r"\S+#\s*$"
+    ANY_PROMPT = r"(?i)(?:(?:password|passcode)\s*:|\S+[>#])\s*$"
+
+    def expect(self, connection, pattern, timeout=10):
+        """Read from `connection` until `pattern` matches the end of the output.
+
+        Returns (matched, output) as soon as the pattern shows up instead of
+        sleeping for a fixed time.
+        """
+        rx = re.compile(pattern)
+        buf = ""
+        deadline = monotonic() + timeout
+        while monotonic() < deadline and not self.stopping.is_set():
+            if connection.recv_ready():
+                buf += connection.recv(65535).decode("utf-8", "replace")
+                if rx.search(buf):
+                    return True, buf
+            else:
+                self.stopping.wait(0.05)
+        return False, buf
+
     def execute_post_auth_steps(self, connection):
         """Execute post-authentication steps (commands and passwords) after initial login.
         
@@ -38,40 +116,53 @@ class NetworkTopologyDiscovery:
         - Enable mode: send 'en 14' then send enable password
         - Multiple privilege escalations
         - Any command/password sequence needed after SSH login
+
+        Each step is {type, value, expect?, timeout?}. After sending, the step
+        waits until `expect` (a regex) matches the device output: by default a
+        password or any CLI prompt for commands, and the privileged `#` prompt
+        for passwords. A password step is skipped when no password prompt was
+        seen. Returns {"ok", "failedStep", "error"}; the first step that times
+        out stops the sequence.
         """
+        result = {"ok": True, "failedStep": None, "error": None}
         if not self.post_auth_steps:
-            return
+            return result
         
         log(f"Executing {len(self.post_auth_steps)} post-auth steps")
+        # drain what is left over from login / term length (it may already
+        # hold a password prompt for the first step)
+        last_output = ""
+        while connection.recv_ready():
+            last_output += connection.recv(65535).decode("utf-8", "replace")
         for idx, step in enumerate(self.post_auth_steps):
             step_type = step.get('type', 'command')
             step_value = step.get('value', '')
             
             if not step_value:
                 continue
-            
+
+            if step_type == 'password' and not re.search(self.PASSWORD_PROMPT, last_output):
+                log(f"Post-auth step {idx + 1}: no password prompt, skipping password")
+                continue
+
+            default_expect = self.PRIVILEGED_PROMPT if step_type == 'password' else self.ANY_PROMPT
+            pattern = step.get('expect') or default_expect
+            timeout = float(step.get('timeout') or 10)
             log(f"Post-auth step {idx + 1}: type={step_type}")
             
             try:
-                if step_type == 'command':
-                    # Send command and wait for response/prompt
-                    connection.send(step_value + "\n")
-                    sleep(1)
-                    # Read any output (might be asking for password)
-                    if connection.recv_ready():
-                        connection.recv(65535)
-                elif step_type == 'password':
-                    # Send password (typically after a password prompt)
-                    connection.send(step_value + "\n")
-                    sleep(1)
-                    # Read any output after password
-                    if connection.recv_ready():
-                        connection.recv(65535)
+                connection.send(step_value + "\n")
+                matched, last_output = self.expect(connection, pattern, timeout)
             except Exception as e:
-                log(f"Error in post-auth step {idx + 1}: {e}")
-        
-        # Small delay to let the shell settle after post-auth
-        sleep(0.5)
+                matched, last_output = False, ""
+                result["error"] = str(e)
+            if not matched:
+                result["ok"] = False
+                result["failedStep"] = idx + 1
+                result["error"] = result["error"] or f"timed out after {timeout}s waiting for /{pattern}/"
+                log(f"Error in post-auth step {idx + 1}: {result['error']}; last output: {last_output[-200:]!r}")
+                break
+        return result
 
     def get_device_icon(self, device_type):
         icon_mapping = {
@@ -85,72 +176,176 @@ class NetworkTopologyDiscovery:
         return f"doc_jpg/{icon_mapping.get(device_type, 'router.jpg')}"
 
     def ssh_connect(self, ip):
+        import paramiko  # lazy: SNMP, replay and export runs never open SSH
+
+        if self.auth_limiter is not None:
+            self.auth_limiter.acquire(self.stopping)
+        if self.stopping.is_set():
+            return None
         try:
             ssh = paramiko.SSHClient()
             ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh.connect(ip, username=self.username, password=self.password,
+            ssh.connect(ip, port=self.ssh_port, username=self.username, password=self.password,
                         banner_timeout=200, timeout=10, look_for_keys=False, allow_agent=False)
+            if self.auth_limiter is not None:
+                self.auth_limiter.success(ip)
+            with self._sessions_lock:
+                self._sessions.add(ssh)
             return ssh
         except Exception as e:
             log(f"SSH failed to {ip}: {e}")
+            if self.auth_limiter is not None and self.auth_limiter.failure(ip, e):
+                log(f"Login to {ip} timed out, slowing down new authentications")
             return None
         
 
     def send_command(self, connection, command):
         try:
             connection.send(command + "\n")
-            sleep(1)
+            self.stopping.wait(1)
             connection.send("\n")
-            sleep(1)
+            self.stopping.wait(1)
             output = ""
             timeout = 0
-            while timeout < 10:
+            while timeout < 10 and not self.stopping.is_set():
                 if connection.recv_ready():
                     output += connection.recv(65535).decode()
                     timeout = 0
                 else:
-                    sleep(0.5)
+                    self.stopping.wait(0.5)
                     timeout += 0.5
+            self._record(command, output)
             return output
         except Exception as e:
             log(f"Command error: {e}")
             return ""
 
+    def disconnect(self, ssh):
+        with self._sessions_lock:
+            self._sessions.discard(ssh)
+        try:
+            ssh.close()
+        except Exception:
+            pass
+
+    def abort(self, reason):
+        """Stop the crawl: dequeue nothing more and close open SSH sessions now.
+
+        Safe from a signal handler or timer thread. discover_all_topologies
+        then returns what it has, with stop_reason set; devices that were
+        being collected stay placeholders (unexplored).
+        """
+        if self.stopping.is_set():
+            return
+        self.stop_reason = self.stop_reason or reason
+        self.stopping.set()
+        log(f"Stopping crawl ({reason}), closing open SSH sessions")
+        threading.Thread(target=self._close_sessions, daemon=True).start()
+
+    def _close_sessions(self):
+        with self._sessions_lock:
+            sessions = list(self._sessions)
+        for ssh in sessions:
+            self.disconnect(ssh)
+
+    @property
+    def _current_ip(self):
+        # per thread: parallel collectors of one device run on their own threads
+        return getattr(self._device, "ip", None)
+
+    @_current_ip.setter
+    def _current_ip(self, ip):
+        self._device.ip = ip
+
+    def _record(self, command, output):
+        if self.archive is not None and self._current_ip:
+            self.archive.record(self._current_ip, command, output)
+
     # ----------------------------------------------------------------
     #  DEVICE INFO HELPERS
     # ----------------------------------------------------------------
+    def _run(self, command, connection=None, ssh=None):
+        """Run `command` on the interactive shell if we have one, else via exec."""
+        if connection is not None:
+            return self.send_command(connection, command)
+        if ssh is not None:
+            stdin, stdout, stderr = ssh.exec_command(command)
+            out = stdout.read().decode()
+            self._record(command, out)
+            return out
+        return ""
+
+    def _cap(self, ip, key):
+        if self.capabilities is None or not ip:
+            return None
+        return self.capabilities.get(ip, key)
+
+    def _set_cap(self, ip, key, value):
+        if self.capabilities is not None and ip:
+            self.capabilities.set(ip, key, value)
+
+    def _prefer(self, ip, key, variants, name=lambda v: v):
+        """Move the variant the capability cache says works to the front."""
+        known = self._cap(ip, key)
+        return sorted(variants, key=lambda v: name(v) != known) if known else list(variants)
+
     def detect_hostname(self, connection=None, ssh=None, ip: str = "") -> str:
         """Ambil hostname dengan beberapa fallback yang robust."""
-        # 1) show running-config | include ^hostname
-        try:
-            if connection is not None:
-                out = self.send_command(connection, "show running-config | include ^hostname")
-            elif ssh is not None:
-                stdin, stdout, stderr = ssh.exec_command("show running-config | include ^hostname")
-                out = stdout.read().decode()
-            else:
-                out = ""
-            m = re.search(r"^hostname\s+(\S+)", out, re.MULTILINE)
-            if m:
-                return m.group(1)
-        except Exception:
-            pass
-        # 2) show version | include uptime
-        try:
-            if connection is not None:
-                out = self.send_command(connection, "show version | include uptime")
-            elif ssh is not None:
-                stdin, stdout, stderr = ssh.exec_command("show version | include uptime")
-                out = stdout.read().decode()
-            else:
-                out = ""
-            m = re.search(r"^(\S+)\s+uptime is ", out, re.MULTILINE)
-            if m:
-                return m.group(1)
-        except Exception:
-            pass
+        variants = [
+            # 1) show running-config | include ^hostname
+            ("running-config", "show running-config | include ^hostname", r"^hostname\s+(\S+)"),
+            # 2) show version | include uptime
+            ("version", "show version | include uptime", r"^(\S+)\s+uptime is "),
+        ]
+        for source, command, pattern in self._prefer(ip, "hostname_source", variants, name=lambda v: v[0]):
+            try:
+                out = self._run(command, connection=connection, ssh=ssh)
+                m = re.search(pattern, out, re.MULTILINE)
+                if m:
+                    self._set_cap(ip, "hostname_source", source)
+                    return m.group(1)
+            except Exception:
+                pass
         # 3) fallback
         return f"Router-{ip.split('.')[-1]}" if ip else "Unknown"
+    # Cisco prompt: hostname, optional (config...) mode, then > or #
+    PROMPT_RE = re.compile(r"^([\w.\-/:]+?)(?:\([\w\-]+\))?[>#]\s*$")
+
+    def _prompt_hostname(self, output: str):
+        """Hostname from the last CLI prompt in `output` (None if no prompt)."""
+        for line in reversed(output.splitlines()):
+            line = line.strip()
+            if line:
+                m = self.PROMPT_RE.match(line)
+                return m.group(1) if m else None
+        return None
+
+    def _short_name(self, name: str) -> str:
+        """CDP Device IDs may carry a domain or a serial: 'sw1.corp(FOC123)' -> 'sw1'."""
+        return re.sub(r"\(.*\)$", "", name or "").split(".")[0].strip()
+
+    def infer_fast_facts(self, ip, shell_output):
+        """Hostname from the CLI prompt, type from the peer's CDP/LLDP platform.
+
+        Returns (hostname, device_type) without sending any command; an item is
+        None when its source is missing or the prompt and the peer record
+        disagree, so the caller falls back to the CLI for it.
+        """
+        prompt = self._prompt_hostname(shell_output)
+        peer = self.neighbor_records.get(ip) or {}
+        if not prompt:
+            return None, None
+        hostname = prompt
+        peer_name = self._short_name(peer.get("hostname", ""))
+        if peer_name and peer_name.lower() != prompt.lower():
+            if not peer_name.lower().startswith(prompt.lower()):
+                log(f"fast facts: prompt '{prompt}' disagrees with neighbor record '{peer_name}' for {ip}")
+                return None, None
+            # some platforms truncate long hostnames in the prompt
+            hostname = peer_name
+        dtype = self._classify_device_type(peer["platform"]) if peer.get("platform") else None
+        return hostname, dtype
+
     def _classify_device_type(self, text: str) -> str:
         """Heuristik klasifikasi device berdasarkan string platform/versi/model."""
         if not text:
@@ -219,22 +414,34 @@ class NetworkTopologyDiscovery:
             return "router"
         return "router"
 
-    def detect_device_type_from_inventory(self, connection) -> str:
-        """Prefer deteksi tipe dari PID di show inventory (chassis). Fallback ke show version."""
+    def detect_device_type_from_inventory(self, connection, ip: str = "", facts=None) -> str:
+        """Prefer deteksi tipe dari PID di show inventory (chassis). Fallback ke show version.
+
+        If `facts` is a dict, the chassis PID and serial are stored in it.
+        """
         try:
-            inv = self.send_command(connection, "show inventory")
-            # Cari blok Chassis terlebih dahulu
-            # Format umum: NAME: "Chassis", ...\nPID: <PID>, VID: ..., SN: ...
-            pid_match = re.search(r"PID:\s*([\w-]+)", inv, re.IGNORECASE)
-            if pid_match:
-                return self._classify_device_type(pid_match.group(1))
+            if self._cap(ip, "type_source") != "version":
+                inv = self.send_command(connection, "show inventory")
+                # Cari blok Chassis terlebih dahulu
+                # Format umum: NAME: "Chassis", ...\nPID: <PID>, VID: ..., SN: ...
+                pid_match = re.search(r"PID:\s*([\w-]+)", inv, re.IGNORECASE)
+                sn_match = re.search(r"SN:\s*([\w-]+)", inv, re.IGNORECASE)
+                if facts is not None and pid_match:
+                    facts["pid"] = pid_match.group(1)
+                if facts is not None and sn_match:
+                    facts["serial"] = sn_match.group(1)
+                if pid_match:
+                    self._set_cap(ip, "type_source", "inventory")
+                    return self._classify_device_type(pid_match.group(1))
             # Fallback kuat ke versi
             ver = self.send_command(connection, "show version")
+            if ver and "Invalid input" not in ver:
+                self._set_cap(ip, "type_source", "version")
             return self._classify_device_type(ver)
         except Exception:
             return "router"
 
-    def get_arp_detail(self, ssh=None, connection=None):
+    def get_arp_detail(self, ssh=None, connection=None, ip: str = ""):
         """Parse ARP table → list of {ip, mac, iface, phys_iface}.
 
         Some platforms use `show arp detail`, others `show ip arp detail`.
@@ -242,22 +449,25 @@ class NetworkTopologyDiscovery:
         existing interactive channel (connection) to avoid opening additional
         exec channels, which some devices limit and report as
         `ChannelException(4, 'Resource shortage')`.
+
+        With `arp_options` set, rows are filtered (partly on the device via an
+        output modifier), capped and stored in a columnar ArpTable instead.
         """
-        entries = []
+        opts = self.arp_options
+        if opts is not None and opts.mode == "off":
+            return []
+        suffix = opts.command_filter() if opts is not None else ""
+        rows = []
         try:
-            if connection is not None:
-                out = self.send_command(connection, "show arp detail")
-                if not out or "Invalid input" in out or "Incomplete" in out:
-                    out = self.send_command(connection, "show ip arp detail")
-            elif ssh is not None:
-                # Try generic first
-                stdin, stdout, stderr = ssh.exec_command("show arp detail")
-                out = stdout.read().decode()
-                if not out or "Invalid input" in out or "Incomplete" in out:
-                    stdin, stdout, stderr = ssh.exec_command("show ip arp detail")
-                    out = stdout.read().decode()
-            else:
+            if connection is None and ssh is None:
                 return []
+            # Try generic first, unless the cache knows which one this device takes
+            out = ""
+            for command in self._prefer(ip, "arp_command", ["show arp detail", "show ip arp detail"]):
+                out = self._run(command + suffix, connection=connection, ssh=ssh)
+                if out and "Invalid input" not in out and "Incomplete" not in out:
+                    self._set_cap(ip, "arp_command", command)
+                    break
             for line in out.splitlines():
                 line = line.strip()
                 # Example row:
@@ -267,33 +477,39 @@ class NetworkTopologyDiscovery:
                     ip, mac, iface, phys = m.group(1), m.group(2), m.group(3), m.group(4)
                     if mac.upper() == 'INCOMPLETE':
                         mac = None
-                    entries.append({
-                        "ip": ip,
-                        "mac": mac,
-                        "iface": iface,
-                        "phys_iface": phys,
-                    })
+                    rows.append((ip, mac, iface, phys))
         except Exception as e:
             log(f"Error getting ARP detail: {e}")
+        return self._arp_entries(rows)
+
+    def _arp_entries(self, rows):
+        """(ip, mac, iface, phys) rows → legacy dict list, or filtered ArpTable with arp_options."""
+        opts = self.arp_options
+        if opts is None:
+            return [{"ip": ip, "mac": mac, "iface": iface, "phys_iface": phys} for ip, mac, iface, phys in rows]
+        entries = ArpTable(opts.max_rows)
+        for ip, mac, iface, phys in rows:
+            if opts.accepts(iface, phys, mac):
+                entries.append(ip, mac, iface, phys)
+        if entries.dropped:
+            log(f"ARP table capped at {opts.max_rows} rows, {entries.dropped} dropped")
         return entries
 
     def get_device_info(self, ssh, ip):
         """Return hostname and device-type without invoke_shell()"""
         try:
-            stdin, stdout, stderr = ssh.exec_command("show running-config | include hostname")
-            hostname_line = stdout.read().decode()
+            hostname_line = self._run("show running-config | include hostname", ssh=ssh)
             m = re.search(r"hostname (\S+)", hostname_line)
             hostname = m.group(1) if m else f"Router-{ip.split('.')[-1]}"
 
-            stdin, stdout, stderr = ssh.exec_command("show version")
-            ver_out = stdout.read().decode()
+            ver_out = self._run("show version", ssh=ssh)
             dtype = self._classify_device_type(ver_out)
             return {"ip": ip, "hostname": hostname, "device_type": dtype}
         except Exception as e:
             log(f"Error getting device info for {ip}: {e}")
             return {"ip": ip, "hostname": f"Unknown-{ip.split('.')[-1]}", "device_type": "router"}
 
-    def get_cdp_neighbors(self, ssh=None, connection=None):
+    def get_cdp_neighbors(self, ssh=None, connection=None, ip: str = ""):
         """Return list of CDP neighbors.
 
         If an interactive shell channel (`connection`) is provided, reuse it
@@ -304,13 +520,13 @@ class NetworkTopologyDiscovery:
         try:
             # Use canonical IOS syntax with plural "neighbors". Some images
             # don't accept the singular form and would return no CDP output.
-            if connection is not None:
-                out = self.send_command(connection, "show cdp neighbors detail")
-            elif ssh is not None:
-                stdin, stdout, stderr = ssh.exec_command("show cdp neighbors detail")
-                out = stdout.read().decode()
-            else:
+            if connection is None and ssh is None:
                 return []
+            out = self._run("show cdp neighbors detail", connection=connection, ssh=ssh)
+            if "not enabled" in out or "Invalid input" in out:
+                self._set_cap(ip, "cdp", False)
+                return []
+            self._set_cap(ip, "cdp", True)
             neighbors = []
             cur = {}
             for line in out.splitlines():
@@ -355,7 +571,7 @@ class NetworkTopologyDiscovery:
             log(f"Error getting CDP neighbors: {e}")
             return []
 
-    def get_lldp_neighbors(self, ssh):
+    def get_lldp_neighbors(self, ssh, ip: str = ""):
         """Return list of LLDP neighbors
         
         LLDP output format example:
@@ -374,8 +590,11 @@ class NetworkTopologyDiscovery:
         """
         try:
             # Same as CDP: use canonical plural form to avoid syntax issues.
-            stdin, stdout, stderr = ssh.exec_command("show lldp neighbors detail")
-            out = stdout.read().decode()
+            out = self._run("show lldp neighbors detail", ssh=ssh)
+            if "not enabled" in out or "Invalid input" in out:
+                self._set_cap(ip, "lldp", False)
+                return []
+            self._set_cap(ip, "lldp", True)
             neighbors = []
             cur = {}
             current_section = None
@@ -450,49 +669,355 @@ class NetworkTopologyDiscovery:
             return []
 
     # ----------------------------------------------------------------
-    #  FLOW 1  – immediate topology (no SSH to neighbours)
+    #  PER-DEVICE COLLECTION (shared by Flow 1 and Flow 2)
     # ----------------------------------------------------------------
-    def build_flow1_topology(self, start_ip, protocol='cdp'):
-        ssh = self.ssh_connect(start_ip)
+    def can_crawl(self, ip) -> bool:
+        """Return False when another worker owns `ip` (sharded mode only)."""
+        if self.claim_ip is None:
+            return True
+        try:
+            return bool(self.claim_ip(ip))
+        except Exception as e:
+            log(f"Claim check failed for {ip}: {e}")
+            return False
+
+    def _identity_keys(self, ip, info=None):
+        record = self.neighbor_records.get(ip) or {}
+        info = info or {}
+        return identity_keys(
+            hostname=info.get("hostname") or record.get("hostname"),
+            platform=record.get("platform") or info.get("pid"),
+            serial=info.get("serial"),
+            chassis_id=record.get("chassis_id"),
+        )
+
+    def resolve_alias(self, ip, info=None):
+        """Canonical IP if `ip` is another address of a device already crawled.
+
+        Without `info` only the neighbor record that advertised `ip` is used
+        (checked before dialing); with `info` the serial and hostname read
+        after login are used as well.
+        """
+        if self.identity is None:
+            return None
+        canonical = self.identity.lookup(self._identity_keys(ip, info))
+        if canonical is None or canonical == ip:
+            return None
+        self.identity.add_alias(ip, canonical)
+        log(f"{ip} is an alias of {canonical}, not crawling it again")
+        return canonical
+
+    def _family(self, ip, info):
+        return (platform_family(info.get("pid"))
+                or platform_family(self.neighbor_records.get(ip, {}).get("platform"))
+                or ((self.capabilities.devices.get(ip) or {}).get("family") if self.capabilities else None))
+
+    def collect_structured(self, ip, connection, protocol='cdp'):
+        """NX-OS: (neighbors, arp rows) from JSON output, None to fall back to text.
+
+        Uses `| json` on the interactive shell, or one NX-API request for all
+        commands when `nxos.mode` is "nxapi". Any rejected command or
+        truncated JSON fails the whole attempt so no table is half-parsed.
+        """
+        opts = self.nxos or {}
+        commands = []
+        if protocol in ['cdp', 'both'] and self._cap(ip, "cdp") is not False:
+            commands.append(("cdp", "show cdp neighbors detail"))
+        if protocol in ['lldp', 'both'] and self._cap(ip, "lldp") is not False:
+            commands.append(("lldp", "show lldp neighbors detail"))
+        if self.arp_options is None or self.arp_options.mode != "off":
+            commands.append(("arp", "show ip arp detail"))
+        try:
+            if opts.get("mode") == "nxapi":
+                client = NxapiClient(ip, self.username, self.password, port=opts.get("port"),
+                                     scheme=opts.get("scheme", "https"), verify=bool(opts.get("verify")))
+                bodies = client.show([command for _, command in commands])
+            else:
+                if connection is None:
+                    return None
+                bodies = [decode_cli_json(self.send_command(connection, f"{command} | json"))
+                          for _, command in commands]
+        except StructuredOutputError as e:
+            log(f"Structured collection failed for {ip} ({e}), falling back to text parsing")
+            return None
+
+        neighbors, rows = [], []
+        for (kind, _), body in zip(commands, bodies):
+            if kind == "cdp":
+                found = cdp_neighbors(body)
+                log(f"CDP neighbors found for {ip}: {len(found)} (json)")
+                neighbors.extend(found)
+            elif kind == "lldp":
+                found = lldp_neighbors(body)
+                log(f"LLDP neighbors found for {ip}: {len(found)} (json)")
+                neighbors.extend(found)
+            else:
+                rows = arp_rows(body)
+        return neighbors, rows
+
+    def _restore(self, ip):
+        """(True, result) when the checkpoint already settled `ip`, else (False, None)."""
+        if self.checkpoint is None:
+            return False, None
+        if ip in self.checkpoint.devices:
+            info, neighbors = self.checkpoint.devices[ip]
+            log(f"Restored {ip} from checkpoint")
+            if info.get("alias_of"):
+                if self.identity is not None:
+                    self.identity.add_alias(ip, info["alias_of"])
+                return True, (info, neighbors)
+            if self.identity is not None:
+                self.identity.register(ip, self._identity_keys(ip, info))
+            if self.arp_index is not None:
+                self.arp_index.add(ip, info.get("arp_entries") or [])
+            self.discovered_devices[ip] = info
+            return True, (info, neighbors)
+        if ip in self.checkpoint.failed:
+            return True, None
+        return False, None
+
+    def _finish_device(self, ip, info, neighbors):
+        """Index, store and journal a collected device; returns (info, neighbors)."""
+        if self.arp_index is not None:
+            self.arp_index.add(ip, info["arp_entries"])
+        if self.arp_options is not None and self.arp_options.mode == "file":
+            # stream the table out now instead of keeping it until the end
+            self.arp_options.write(ip, info["arp_entries"])
+            info["arp_count"] = len(info["arp_entries"])
+            info["arp_entries"] = []
+        self.discovered_devices[ip] = info
+        if self.identity is not None:
+            self.identity.register(ip, self._identity_keys(ip, info))
+        if self.checkpoint is not None:
+            self.checkpoint.record_device(ip, info, neighbors)
+        return info, neighbors
+
+    def probe_channels(self, ssh, ip, want):
+        """How many session channels `ssh` may hold at once, at most `want`.
+
+        The interactive shell counts as one. The answer is cached per
+        platform family, so only the first device of a platform is probed.
+        """
+        known = self._cap(ip, "channels")
+        if known is not None:
+            return min(int(known), want)
+        transport = ssh.get_transport()
+        opened = []
+        try:
+            while len(opened) + 1 < want and not self.stopping.is_set():
+                try:
+                    opened.append(transport.open_session(timeout=5))
+                except Exception as e:
+                    log(f"{ip}: channel {len(opened) + 2} refused ({e})")
+                    break
+        finally:
+            for chan in opened:
+                chan.close()
+        limit = len(opened) + 1
+        self._set_cap(ip, "channels", limit)
+        return limit
+
+    def _start_parallel(self, ssh, ip, protocol):
+        """Start CDP/LLDP/ARP on exec channels next to the shell.
+
+        Returns a handle for _join_parallel, or None when the device (or the
+        job) does not allow more than the shell: post-auth steps only apply
+        to the shell, and NX-OS structured collection uses the shell itself.
+        """
+        if not self.channels or self.post_auth_steps or self.stopping.is_set():
+            return None
+        if self.nxos is not None and self._family(ip, {}) == "nxos":
+            return None
+        jobs = {}
+        if protocol in ['cdp', 'both'] and self._cap(ip, "cdp") is not False:
+            jobs["cdp"] = lambda ch: self.get_cdp_neighbors(ssh=ch, ip=ip)
+        if protocol in ['lldp', 'both'] and self._cap(ip, "lldp") is not False:
+            jobs["lldp"] = lambda ch: self.get_lldp_neighbors(ch, ip=ip)
+        if self.arp_options is None or self.arp_options.mode != "off":
+            jobs["arp"] = lambda ch: self.get_arp_detail(ssh=ch, ip=ip)
+        if not jobs:
+            return None
+        # probe up to the configured maximum so the cached limit holds for
+        # later jobs that collect more tables
+        limit = min(self.probe_channels(ssh, ip, int(self.channels)), len(jobs) + 1)
+        if limit < 2:
+            log(f"{ip}: single channel only, collecting on the shell")
+            return None
+
+        from concurrent.futures import ThreadPoolExecutor
+        slots = threading.BoundedSemaphore(limit - 1)
+
+        def run(job):
+            self._current_ip = ip
+            channel = _ExecChannel(ssh, slots)
+            result = job(channel)
+            return channel.refused, result
+
+        pool = ThreadPoolExecutor(max_workers=limit - 1)
+        futures = {name: pool.submit(run, job) for name, job in jobs.items()}
+        pool.shutdown(wait=False)
+        log(f"{ip}: collecting {', '.join(jobs)} on {limit - 1} extra channel(s)")
+        return ip, limit, futures
+
+    def _join_parallel(self, handle):
+        """{name: result} of the parallel collectors that got their channel."""
+        import paramiko
+
+        ip, limit, futures = handle
+        done = {}
+        refused = 0
+        for name, future in futures.items():
+            err, result = future.result()
+            if err is None:
+                done[name] = result
+                continue
+            # only a refused channel says something about the device's limit
+            if isinstance(err, paramiko.ChannelException) or "Resource shortage" in str(err):
+                refused += 1
+            log(f"{ip}: {name} channel failed ({err}), redoing it on the shell")
+        if refused:
+            self._set_cap(ip, "channels", max(1, limit - refused))
+        return done
+
+    def collect_batch(self, ips, protocol='cdp'):
+        """Collect several devices; [(ip, result)] in input order.
+
+        Sequential here; collectors that can poll devices concurrently
+        override it and raise `batch_size`.
+        """
+        return [(ip, self.collect_device(ip, protocol)) for ip in ips]
+
+    def collect_device(self, ip, protocol='cdp'):
+        """SSH into `ip` and collect (device_info, neighbors).
+
+        Returns None when SSH fails. The interactive shell is reused for every
+        command so we don't open extra channels on the device, unless
+        `channels` allows more: then CDP/LLDP/ARP run on exec channels of the
+        same transport while the shell reads hostname and inventory. When a
+        checkpoint is attached, devices already finished in an earlier run
+        are served from it without connecting.
+        """
+        handled, result = self._restore(ip)
+        if handled:
+            return result
+
+        self._current_ip = ip
+        ssh = self.ssh_connect(ip)
         if not ssh:
-            log(f"No SSH to {start_ip}, skipping discovery for this seed")
-            return []
+            if self.auth_limiter is not None and self.auth_limiter.schedule_retry(ip):
+                log(f"{ip} queued for another login attempt")
+                return None
+            # an aborted crawl (deadline, SIGTERM) leaves the IP pending for resume
+            if self.checkpoint is not None and not self.stopping.is_set():
+                self.checkpoint.record_failed(ip)
+            return None
+
+        if self.archive is not None and ip in self.neighbor_records:
+            self.archive.record_peer(ip, self.neighbor_records[ip])
+        if self.capabilities is not None:
+            self.capabilities.note_family(ip, platform_family(self.neighbor_records.get(ip, {}).get("platform", "")))
 
         # Gunakan invoke_shell agar bisa deteksi PID dari show inventory
+        connection = None
+        parallel = None
         try:
             connection = ssh.invoke_shell()
-            self.send_command(connection, "term length 0")
-            
+            shell_out = ""
+            if self._cap(ip, "term_length") is not False:
+                shell_out = self.send_command(connection, "term length 0")
+                self._set_cap(ip, "term_length", "Invalid input" not in shell_out)
+
             # Execute post-authentication steps (e.g., enable mode, additional passwords)
-            self.execute_post_auth_steps(connection)
-            
-            hostname = self.detect_hostname(connection=connection, ip=start_ip)
-            dtype = self.detect_device_type_from_inventory(connection)
-            device_info = {"ip": start_ip, "hostname": hostname, "device_type": dtype}
+            post_auth = self.execute_post_auth_steps(connection)
+
+            # Neighbor/ARP collectors on extra channels while the shell does the rest
+            parallel = self._start_parallel(ssh, ip, protocol)
+
+            hostname, dtype, facts = None, None, {}
+            if self.fast_facts:
+                if not shell_out:
+                    shell_out = self.send_command(connection, "")
+                hostname, dtype = self.infer_fast_facts(ip, shell_out)
+            if hostname is None:
+                hostname = self.detect_hostname(connection=connection, ip=ip)
+            if dtype is None:
+                dtype = self.detect_device_type_from_inventory(connection, ip=ip, facts=facts)
+            info = {"ip": ip, "hostname": hostname, "device_type": dtype, **facts}
+            if not post_auth["ok"]:
+                info["post_auth_error"] = f"step {post_auth['failedStep']}: {post_auth['error']}"
         except Exception:
             # Fallback: exec_command
-            hostname = self.detect_hostname(ssh=ssh, ip=start_ip)
-            base = self.get_device_info(ssh, start_ip)
-            base["hostname"] = hostname
-            device_info = base
-
-        # Get neighbors based on protocol (reuse interactive shell connection
-        # to avoid opening new channels)
-        neighbors = []
-        if protocol in ['cdp', 'both']:
-            cdp_neighbors = self.get_cdp_neighbors(connection=connection)
-            log(f"CDP neighbors found for {start_ip}: {len(cdp_neighbors)}")
-            neighbors.extend(cdp_neighbors)
-        
-        if protocol in ['lldp', 'both']:
-            lldp_neighbors = self.get_lldp_neighbors(ssh)
-            log(f"LLDP neighbors found for {start_ip}: {len(lldp_neighbors)}")
-            neighbors.extend(lldp_neighbors)
-        
-        log(f"Total neighbors found for {start_ip}: {len(neighbors)}")
+            connection = None
+            info = self.get_device_info(ssh, ip)
+            info["hostname"] = self.detect_hostname(ssh=ssh, ip=ip)
+        done = self._join_parallel(parallel) if parallel is not None else {}
+
+        # Same chassis as a device we already crawled, reached via another IP:
+        # stop here instead of collecting everything a second time
+        canonical = self.resolve_alias(ip, info)
+        if canonical is not None:
+            self.disconnect(ssh)
+            info["alias_of"] = canonical
+            if self.checkpoint is not None:
+                self.checkpoint.record_device(ip, info, [])
+            return info, []
+
+        structured = None
+        if self.nxos is not None and parallel is None and self._family(ip, info) == "nxos":
+            structured = self.collect_structured(ip, connection, protocol)
+
+        if structured is not None:
+            neighbors, rows = structured
+            log(f"Total neighbors found for {ip}: {len(neighbors)}")
+            info["arp_entries"] = self._arp_entries(rows)
+        else:
+            # Get neighbors based on protocol (reuse interactive shell connection
+            # to avoid opening new channels)
+            # (skip a protocol the capability cache knows is disabled here)
+            # (collectors that already ran on a parallel channel are taken from `done`)
+            neighbors = []
+            if "cdp" in done or (protocol in ['cdp', 'both'] and self._cap(ip, "cdp") is not False):
+                cdp_neighbors = done["cdp"] if "cdp" in done else self.get_cdp_neighbors(ssh=ssh, connection=connection, ip=ip)
+                log(f"CDP neighbors found for {ip}: {len(cdp_neighbors)}")
+                neighbors.extend(cdp_neighbors)
+
+            if "lldp" in done or (protocol in ['lldp', 'both'] and self._cap(ip, "lldp") is not False):
+                lldp_neighbors = done["lldp"] if "lldp" in done else self.get_lldp_neighbors(ssh, ip=ip)
+                log(f"LLDP neighbors found for {ip}: {len(lldp_neighbors)}")
+                neighbors.extend(lldp_neighbors)
+
+            log(f"Total neighbors found for {ip}: {len(neighbors)}")
+
+            info["arp_entries"] = done["arp"] if "arp" in done else self.get_arp_detail(ssh=ssh, connection=connection, ip=ip)
+        self.disconnect(ssh)
+        if self.stopping.is_set():
+            # session was cut by abort(): whatever was read is incomplete
+            return None
+        return self._finish_device(ip, info, neighbors)
+
+    # ----------------------------------------------------------------
+    #  FLOW 1  – immediate topology (no SSH to neighbours)
+    # ----------------------------------------------------------------
+    def build_flow1_topology(self, start_ip, protocol='cdp'):
+        if not self.can_crawl(start_ip):
+            log(f"Seed {start_ip} is owned by another shard, skipping")
+            return []
+        if self.resolve_alias(start_ip) is not None:
+            return []
+        result = self.collect_device(start_ip, protocol)
+        while result is None and self.auth_limiter is not None:
+            delay = self.auth_limiter.claim_retry(start_ip)
+            if delay is None or self.stopping.wait(delay):
+                break
+            result = self.collect_device(start_ip, protocol)
+        if result is None:
+            log(f"No SSH to {start_ip}, skipping discovery for this seed")
+            return []
+        device_info, neighbors = result
+        if device_info.get("alias_of"):
+            return []
 
         # Topologi dasar: device utama + setiap neighbor sebagai node placeholder
-        device_info["arp_entries"] = self.get_arp_detail(connection=connection)
         topology = [{"device": device_info, "neighbors": neighbors}]
 
         for n in neighbors:
@@ -500,6 +1025,7 @@ class NetworkTopologyDiscovery:
             nip = n.get("ip")
             if nip:
                 self.covered_seed_ips.add(nip)
+                self.neighbor_records.setdefault(nip, n)
             # tambahkan koneksi utama->neighbor (pakai identifier)
             self.connections.append({
                 "from": start_ip,
@@ -523,10 +1049,6 @@ class NetworkTopologyDiscovery:
                     },
                     "neighbors": []
                 })
-        try:
-            ssh.close()
-        except Exception:
-            pass
         return topology
 
     # ----------------------------------------------------------------
@@ -540,100 +1062,155 @@ class NetworkTopologyDiscovery:
 
         # ---- Flow 2 ----
         log("[Flow 2] Epidemic expansion (only if SSH works)")
-        queue = deque()
+        policy = self.crawl_policy
+        queue = Frontier(policy, classify=self._guess_type_from_platform)
         for d in topology:
             for n in d["neighbors"]:
                 if "ip" in n and n["ip"] not in self.visited_ips:
-                    queue.append(n["ip"])
-
-        while queue:
-            ip = queue.popleft()
-            if ip in self.visited_ips:
-                continue
-            ssh = self.ssh_connect(ip)
-            if not ssh:
-                continue
+                    self._enqueue(queue, n["ip"], 1, n)
 
-            log(f"SSH OK – expanding from {ip}")
-            self.visited_ips.add(ip)
-            # Create single interactive shell to reuse and detect PID type
-            try:
-                connection = ssh.invoke_shell()
-                self.send_command(connection, "term length 0")
-                hostname = self.detect_hostname(connection=connection, ip=ip)
-                dtype = self.detect_device_type_from_inventory(connection)
-                info = {"ip": ip, "hostname": hostname, "device_type": dtype}
-            except Exception:
-                base = self.get_device_info(ssh, ip)
-                base["hostname"] = self.detect_hostname(ssh=ssh, ip=ip)
-                info = base
-            
-            # Get neighbors based on protocol (reuse interactive shell)
-            neighbors = []
-            if protocol in ['cdp', 'both']:
-                cdp_neighbors = self.get_cdp_neighbors(connection=connection)
-                neighbors.extend(cdp_neighbors)
-            
-            if protocol in ['lldp', 'both']:
-                lldp_neighbors = self.get_lldp_neighbors(ssh)
-                neighbors.extend(lldp_neighbors)
-            
-            info["arp_entries"] = self.get_arp_detail(connection=connection)
-            # update atau tambah node untuk ip ini
-            found_idx = next((i for i, d in enumerate(topology) if d['device'].get('ip') == ip), None)
-            if found_idx is not None:
-                topology[found_idx] = {"device": info, "neighbors": neighbors}
-            else:
-                topology.append({"device": info, "neighbors": neighbors})
+        limiter = self.auth_limiter
+        while queue or (limiter is not None and limiter.next_retry_in() is not None):
+            if self.stopping.is_set():
+                log(f"[Flow 2] Stopped ({self.stop_reason}), returning partial topology")
+                break
+            limit = self.batch_size
+            if policy is not None:
+                self.stop_reason = policy.exhausted(len(self.discovered_devices))
+                if self.stop_reason:
+                    log(f"[Flow 2] Crawl budget exhausted ({self.stop_reason}), returning partial topology")
+                    break
+                limit = policy.allowance(len(self.discovered_devices), self.batch_size)
+            if limiter is not None:
+                # failed logins come back once their backoff expired
+                for ip in limiter.due_retries():
+                    queue.push(ip, queue.depth.get(ip, 1), self.neighbor_records.get(ip))
+                if not queue:
+                    wait = limiter.next_retry_in() or 0
+                    if policy is not None and policy.remaining_time() is not None:
+                        wait = min(wait, max(0.0, policy.remaining_time()))
+                    self.stopping.wait(wait)
+                    continue
+            batch = []
+            while queue and len(batch) < limit:
+                ip = queue.pop()
+                if ip is None:
+                    break
+                if ip in self.visited_ips or ip in batch:
+                    continue
+                if self.resolve_alias(ip) is not None:
+                    self.visited_ips.add(ip)
+                    continue
+                if not self.can_crawl(ip):
+                    # milik shard lain; tetap sebagai placeholder di topology ini
+                    self.visited_ips.add(ip)
+                    continue
+                batch.append(ip)
 
-            for n in neighbors:
-                nip = n.get("ip")
-                if not nip:
+            for ip, result in self.collect_batch(batch, protocol):
+                if result is None:
+                    if self.stopping.is_set():
+                        self.unexplored.add(ip)
                     continue
-                # simpan koneksi dari device saat ini ke neighbor
-                self.connections.append({
-                    "from": ip,
-                    "to": nip,
-                    "from_if": n.get("local_interface"),
-                    "to_if": n.get("port_id"),
-                    "from_hostname": info["hostname"],
-                    "to_hostname": n.get("hostname", "Unknown")
-                })
-                # tambahkan node placeholder untuk neighbor baru jika belum ada
-                if not any(d['device'].get('ip') == nip for d in topology):
-                    placeholder_type = self._guess_type_from_platform(n.get("platform", ""))
-                    topology.append({
-                        "device": {
-                            "ip": nip,
-                            "hostname": n.get("hostname", f"Unknown-{nip.split('.')[-1]}"),
-                            "device_type": placeholder_type
-                        },
-                        "neighbors": []
-                    })
-                # masukkan ke antrian untuk dicoba jumpshot (epidemic)
-                if nip not in self.visited_ips:
-                    queue.append(nip)
-            try:
-                ssh.close()
-            except Exception:
-                pass
+                self.visited_ips.add(ip)
+                info, neighbors = result
+                if info.get("alias_of"):
+                    continue
+                log(f"SSH OK – expanding from {ip}")
+                self._expand(topology, queue, ip, info, neighbors)
 
+        self.unexplored |= queue.pending() - self.visited_ips
+        if limiter is not None:
+            self.unexplored |= limiter.pending_retries() - self.visited_ips
         return topology
 
+    def _enqueue(self, queue, ip, depth, record):
+        """Queue `ip` for Flow 2 unless it is out of scope or beyond the policy's max depth."""
+        if self.scope is not None:
+            reason = self.out_of_scope.get(ip) or self.scope.reason(ip, record)
+            if reason:
+                if ip not in self.out_of_scope:
+                    log(f"{ip} out of scope ({reason}), kept as placeholder")
+                    self.out_of_scope[ip] = reason
+                return
+        if self.crawl_policy is not None and not self.crawl_policy.within_depth(depth):
+            self.unexplored.add(ip)
+            return
+        queue.push(ip, depth, record)
+
+    def _expand(self, topology, queue, ip, info, neighbors):
+        """Add a crawled device to `topology` and queue its unvisited neighbors."""
+        # update atau tambah node untuk ip ini
+        found_idx = next((i for i, d in enumerate(topology) if d['device'].get('ip') == ip), None)
+        if found_idx is not None:
+            topology[found_idx] = {"device": info, "neighbors": neighbors}
+        else:
+            topology.append({"device": info, "neighbors": neighbors})
+
+        for n in neighbors:
+            nip = n.get("ip")
+            if not nip:
+                continue
+            self.neighbor_records.setdefault(nip, n)
+            # simpan koneksi dari device saat ini ke neighbor
+            self.connections.append({
+                "from": ip,
+                "to": nip,
+                "from_if": n.get("local_interface"),
+                "to_if": n.get("port_id"),
+                "from_hostname": info["hostname"],
+                "to_hostname": n.get("hostname", "Unknown")
+            })
+            # tambahkan node placeholder untuk neighbor baru jika belum ada
+            if not any(d['device'].get('ip') == nip for d in topology):
+                placeholder_type = self._guess_type_from_platform(n.get("platform", ""))
+                topology.append({
+                    "device": {
+                        "ip": nip,
+                        "hostname": n.get("hostname", f"Unknown-{nip.split('.')[-1]}"),
+                        "device_type": placeholder_type
+                    },
+                    "neighbors": []
+                })
+            # masukkan ke antrian untuk dicoba jumpshot (epidemic)
+            if nip not in self.visited_ips:
+                self._enqueue(queue, nip, queue.depth.get(ip, 0) + 1, n)
+
     # ----------------------------------------------------------------
     #  TOP-LEVEL DRIVER
     # ----------------------------------------------------------------
-    def discover_all_topologies(self, seed_ips, protocol='cdp'):
+    def discover_all_topologies(self, seed_ips, protocol='cdp', deadline=None):
         """Discover one topology per seed IP (Flow 1 + optional Flow 2)
         
         Args:
             seed_ips: List of IP addresses to start discovery from
             protocol: 'cdp', 'lldp', or 'both' - which neighbor discovery protocol(s) to use
+            deadline: optional Unix time; the crawl is aborted then and the
+                topologies found so far are returned (stop_reason 'deadline')
         """
+        timer = None
+        if deadline is not None:
+            timer = threading.Timer(max(0.0, deadline - time()), self.abort, args=("deadline",))
+            timer.daemon = True
+            timer.start()
+        try:
+            return self._discover_seeds(seed_ips, protocol)
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def _discover_seeds(self, seed_ips, protocol):
+        if self.checkpoint is not None:
+            self.checkpoint.record_job(seed_ips, protocol)
         for ip in seed_ips:
             # Skip seed jika sudah tercakup sebagai neighbor dari seed sebelumnya
             if ip in self.covered_seed_ips:
-                print(f"Seed {ip} skipped (already covered by previous topology)")
+                log(f"Seed {ip} skipped (already covered by previous topology)")
+                continue
+            if self.crawl_policy is not None and not self.stop_reason:
+                self.stop_reason = self.crawl_policy.exhausted(len(self.discovered_devices))
+            if self.stop_reason:
+                log(f"Seed {ip} skipped (crawl stopped: {self.stop_reason})")
                 continue
             if ip not in self.visited_ips:
                 topo = self.epidemic_discovery(ip, protocol)
@@ -644,15 +1221,86 @@ class NetworkTopologyDiscovery:
     # ----------------------------------------------------------------
     #  HTML OUTPUT via TEMPLATE (separate frontend)
     # ----------------------------------------------------------------
-    def _build_topology_sections_html(self) -> str:
+    def _build_topology_sections_html(self, lod=None) -> str:
+        """One section per topology; with `lod` (graph_lod.LodOptions) large
+        topologies are drawn as clusters instead of one div per device."""
         sections = ""
         for i, topology in enumerate(self.topologies, 1):
-            positions = self.calculate_device_positions(topology)
+            nodes = [{
+                "id": d['device']['ip'],
+                "label": d['device'].get('hostname') or d['device']['ip'],
+                "mgmtIp": d['device'].get('display_ip', d['device']['ip']),
+                "type": d['device'].get('device_type') or 'router',
+                "neighbors": d.get('neighbors') or [],
+            } for d in topology]
+            current_nodes = {n['id'] for n in nodes}
+            links = [{"source": c['from'], "target": c['to']} for c in self.connections
+                     if c['from'] in current_nodes and c['to'] in current_nodes]
+            if lod is not None:
+                from graph_lod import cluster_graph
+                nodes, links, _ = cluster_graph(nodes, links, lod)
+            positions = self._circle_positions([n['id'] for n in nodes])
             sections += f"""
-    <div class=\"topology-container\">"""
+    <div class=\"topology-container\">
+        <div class=\"topology-title\">Topology {i}</div>
+        <div class=\"stats\">
+            <h3>📊 Topology Statistics</h3>
+            <div class=\"stats-grid\">
+                <div class=\"stat-item\">
+                    <div class=\"stat-value\">{len(topology)}</div>
+                    <div class=\"stat-label\">Total Devices</div>
+                </div>
+                <div class=\"stat-item\">
+                    <div class=\"stat-value\">{sum(l.get('count', 1) for l in links)}</div>
+                    <div class=\"stat-label\">Total Connections</div>
+                </div>
+            </div>
+        </div>
+        <div class=\"controls\">
+            <button class=\"control-btn\" onclick=\"resetView({i})\">🔄 Reset View</button>
+            <button class=\"control-btn\" onclick=\"toggleConnections({i})\">🔗 Toggle Connections</button>
+            <button class=\"control-btn\" onclick=\"exportTopology({i})\">📥 Export Data</button>
+            <button class=\"control-btn\" onclick=\"centerDevices({i})\">🎯 Center Devices</button>
+        </div>
+        <div class=\"canvas-container\">
+            <div class=\"network-canvas\" id=\"topology-{i}\">\n            <svg width=\"100%\" height=\"400\" style=\"position:absolute;top:0;left:0;z-index:1;\">"""
+
+            for link in links:
+                from_pos = positions.get(link['source'])
+                to_pos = positions.get(link['target'])
+                if from_pos and to_pos:
+                    sections += f"""
+                <line class=\"connection-line\" x1=\"{from_pos['x']}\" y1=\"{from_pos['y']}\" x2=\"{to_pos['x']}\" y2=\"{to_pos['y']}\"
+                      data-from=\"{link['source']}\" data-to=\"{link['target']}\" data-count=\"{link.get('count', 1)}\" />"""
+
+            sections += """
+            </svg>
+"""
+
+            for node in nodes:
+                pos = positions.get(node['id'], {'x': 100, 'y': 100})
+                cluster = node.get('cluster')
+                if cluster:
+                    # collapsed cluster: member list goes into the hover details only
+                    types = ', '.join(f"{count} {t}" for t, count in sorted(cluster['types'].items()))
+                    members = ', '.join(cluster['members'][:20]) + (' ...' if cluster['size'] > 20 else '')
+                    sections += f"""
+            <div class=\"device cluster\" data-ip=\"{node['id']}\" style=\"left: {pos['x']}px; top: {pos['y']}px;\">\n                <div class=\"device-hostname\">{node['label']}</div>\n                <div class=\"device-ip\">{types}</div>\n                <div class=\"device-type\">{cluster['kind']}</div>\n                <div class=\"device-details\">\n                    <strong>Devices:</strong> {cluster['size']}<br>\n                    <strong>Internal Links:</strong> {cluster['internalLinks']}<br>\n                    <strong>Members:</strong> {members}\n                </div>\n            </div>"""
+                    continue
+                neighbors = node['neighbors']
+                icon_path = self.get_device_icon(node['type'])
+                neighbor_details = [f"{n.get('hostname', 'Unknown')} ({n.get('ip', 'No IP')})" for n in neighbors]
+                sections += f"""
+            <div class=\"device\" data-ip=\"{node['id']}\" style=\"left: {pos['x']}px; top: {pos['y']}px;\">\n                <img src=\"{icon_path}\" alt=\"{node['type']}\" class=\"device-icon\">\n                <div class=\"device-hostname\">{node['label']}</div>\n                <div class=\"device-ip\">{node['mgmtIp']}</div>\n                <div class=\"device-type\">{node['type']}</div>\n                <div class=\"device-details\">\n                    <strong>Hostname:</strong> {node['label']}<br>\n                    <strong>IP Address:</strong> {node['mgmtIp']}<br>\n                    <strong>Device Type:</strong> {node['type'].title()}<br>\n                    <strong>Neighbors:</strong> {len(neighbors)}<br>\n                    <strong>Neighbor Details:</strong><br>\n                    {'<br>'.join(neighbor_details) if neighbor_details else 'None'}\n                </div>\n            </div>"""
+
+            sections += """
+            </div>
+        </div>
+    </div>
+"""
         return sections
 
-    def generate_html_from_template(self, template_path="templates/advanced_base.html", output_file="network_topology_advanced.html"):
+    def generate_html_from_template(self, template_path="templates/advanced_base.html", output_file="network_topology_advanced.html", lod=None):
         try:
             with open(template_path, 'r', encoding='utf-8') as f:
                 template = f.read()
@@ -660,7 +1308,7 @@ class NetworkTopologyDiscovery:
             print(f"Failed to read template {template_path}: {e}. Falling back to inline generation.")
             return self.generate_advanced_html(output_file)
 
-        sections_html = self._build_topology_sections_html()
+        sections_html = self._build_topology_sections_html(lod)
         html = template.replace("<!--TOPOLOGY_SECTIONS-->", sections_html)
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write(html)
@@ -670,22 +1318,25 @@ class NetworkTopologyDiscovery:
     #  DEVICE POSITIONING
     # ----------------------------------------------------------------
     def calculate_device_positions(self, topology):
+        return self._circle_positions([d['device']['ip'] for d in topology])
+
+    def _circle_positions(self, ids):
         positions = {}
         canvas_w, canvas_h, margin = 800, 400, 100
-        n = len(topology)
+        n = len(ids)
         if n == 1:
-            positions[topology[0]['device']['ip']] = {'x': canvas_w // 2, 'y': canvas_h // 2}
+            positions[ids[0]] = {'x': canvas_w // 2, 'y': canvas_h // 2}
         elif n == 2:
-            positions[topology[0]['device']['ip']] = {'x': canvas_w // 3, 'y': canvas_h // 2}
-            positions[topology[1]['device']['ip']] = {'x': 2 * canvas_w // 3, 'y': canvas_h // 2}
+            positions[ids[0]] = {'x': canvas_w // 3, 'y': canvas_h // 2}
+            positions[ids[1]] = {'x': 2 * canvas_w // 3, 'y': canvas_h // 2}
         else:
             cx, cy = canvas_w // 2, canvas_h // 2
             radius = min(canvas_w, canvas_h) // 3 - margin
-            for i, d in enumerate(topology):
+            for i, node_id in enumerate(ids):
                 angle = 2 * math.pi * i / n
                 x = cx + radius * math.cos(angle)
                 y = cy + radius * math.sin(angle)
-                positions[d['device']['ip']] = {'x': int(x), 'y': int(y)}
+                positions[node_id] = {'x': int(x), 'y': int(y)}
         return positions
 
 
@@ -0,0 +1,156 @@
+"""
+Structured NX-OS collectors
+
+Nexus switches can return CLI output as JSON, either on the SSH shell with
+the `| json` modifier or over NX-API (HTTP POST /ins). This module decodes
+that output and maps it onto the same records the text parsers in
+network_topology_testing.py produce:
+
+    neighbor: {hostname, ip, platform, local_interface, port_id,
+               chassis_id?, port_description?}
+    ARP row:  (ip, mac, iface, phys_iface)
+
+Decoding is strict: output cut short by the shell idle timeout or a dropped
+HTTP response fails to parse and raises StructuredOutputError, so the
+caller can fall back to the text parser instead of silently keeping a
+partial table.
+"""
+
+import base64
+import json
+import re
+
+_IPV4 = re.compile(r"^\d+\.\d+\.\d+\.\d+$")
+_ERROR_LINE = re.compile(r"^\s*% ?(.+)$", re.MULTILINE)
+
+
+class StructuredOutputError(ValueError):
+    """The device rejected the command or the JSON was truncated/malformed."""
+
+
+def decode_cli_json(text):
+    """Decode the JSON object in shell output (echoed command and prompt around it).
+
+    Empty output is an empty table on NX-OS and decodes to {}.
+    """
+    err = _ERROR_LINE.search(text or "")
+    start = (text or "").find("{")
+    if start < 0:
+        if err:
+            raise StructuredOutputError(err.group(1).strip())
+        return {}
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text, start)
+    except ValueError as e:
+        raise StructuredOutputError(f"truncated or malformed JSON output: {e}")
+    return data
+
+
+def _rows(data, table, row):
+    """Rows of a TABLE_x/ROW_x pair; NX-OS emits a bare dict for a single row."""
+    tables = (data or {}).get(table) or []
+    if isinstance(tables, dict):
+        tables = [tables]
+    out = []
+    for t in tables:
+        rows = t.get(row) or []
+        out.extend([rows] if isinstance(rows, dict) else rows)
+    return out
+
+
+def cdp_neighbors(data):
+    neighbors = []
+    for r in _rows(data, "TABLE_cdp_neighbor_detail_info", "ROW_cdp_neighbor_detail_info"):
+        n = {"hostname": r.get("device_id") or r.get("sysname")}
+        ip = r.get("v4mgmtaddr") or r.get("v4addr")
+        if ip and _IPV4.match(ip):
+            n["ip"] = ip
+        if r.get("platform_id"):
+            n["platform"] = r["platform_id"]
+        if r.get("intf_id"):
+            n["local_interface"] = r["intf_id"]
+        if r.get("port_id"):
+            n["port_id"] = r["port_id"]
+        neighbors.append(n)
+    return neighbors
+
+
+def lldp_neighbors(data):
+    neighbors = []
+    for r in _rows(data, "TABLE_nbor_detail", "ROW_nbor_detail"):
+        n = {"local_interface": r.get("l_port_id")}
+        for src, dst in (("chassis_id", "chassis_id"), ("port_id", "port_id"), ("port_desc", "port_description"),
+                         ("sys_name", "hostname"), ("sys_desc", "platform")):
+            if r.get(src):
+                n[dst] = r[src]
+        ip = r.get("mgmt_addr")
+        if ip and _IPV4.match(ip):
+            n["ip"] = ip
+        neighbors.append(n)
+    return neighbors
+
+
+def arp_rows(data):
+    """(ip, mac, iface, phys_iface) for every adjacency in every VRF."""
+    rows = []
+    for vrf in _rows(data, "TABLE_vrf", "ROW_vrf"):
+        for r in _rows(vrf, "TABLE_adj", "ROW_adj"):
+            ip = r.get("ip-addr-out")
+            if not ip:
+                continue
+            mac = r.get("mac")
+            if not mac or mac.upper() == "INCOMPLETE" or str(r.get("incomplete")).lower() == "true":
+                mac = None
+            rows.append((ip, mac, r.get("intf-out"), r.get("phy-intf") or r.get("intf-out")))
+    return rows
+
+
+class NxapiClient:
+    """Minimal NX-API (`cli_show`, JSON) client on top of urllib."""
+
+    def __init__(self, host, username, password, port=None, scheme="https", verify=False, timeout=30):
+        self.url = f"{scheme}://{host}:{port or (443 if scheme == 'https' else 80)}/ins"
+        self.auth = base64.b64encode(f"{username}:{password}".encode()).decode()
+        self.timeout = timeout
+        self.context = None
+        if scheme == "https" and not verify:
+            import ssl
+
+            self.context = ssl._create_unverified_context()
+
+    def show(self, commands):
+        """Run show commands in one request; returns one body dict per command."""
+        import urllib.error
+        import urllib.request
+
+        request = {"ins_api": {
+            "version": "1.0",
+            "type": "cli_show",
+            "chunk": "0",
+            "sid": "1",
+            "input": " ;".join(commands),
+            "output_format": "json",
+        }}
+        req = urllib.request.Request(self.url, data=json.dumps(request).encode(), method="POST", headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Basic {self.auth}",
+        })
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout, context=self.context) as resp:
+                raw = resp.read()
+        except (urllib.error.URLError, OSError) as e:
+            raise StructuredOutputError(f"NX-API request failed: {e}")
+        try:
+            outputs = json.loads(raw)["ins_api"]["outputs"]["output"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise StructuredOutputError(f"truncated or malformed NX-API response: {e}")
+        if isinstance(outputs, dict):
+            outputs = [outputs]
+        if len(outputs) != len(commands):
+            raise StructuredOutputError(f"NX-API returned {len(outputs)} outputs for {len(commands)} commands")
+        bodies = []
+        for command, out in zip(commands, outputs):
+            if str(out.get("code")) != "200":
+                raise StructuredOutputError(f"{command}: {out.get('msg')} ({out.get('code')})")
+            bodies.append(out.get("body") or {})
+        return bodies
@@ -0,0 +1,155 @@
+"""
+Worker result encoding
+
+By default the worker prints the graph as one JSON document, as before.
+With an `output` block in the job payload the caller negotiates something
+cheaper:
+
+    "output": {
+        "formats": ["msgpack", "cbor", "json"],   # preference order
+        "compress": ["zstd"],                     # optional, preference order
+        "fileThreshold": 8388608                  # bytes; 0 = always
+        "dir": "/tmp"                             # where result files go
+    }
+
+The worker picks the first format (and compression) it can produce here:
+
+    json      orjson when installed, else the stdlib encoder
+    msgpack   needs `msgpack`
+    cbor      needs `cbor2`
+    zstd      needs `zstandard`
+
+Anything other than plain JSON is framed so the reader can tell what it got:
+
+    CDPR1 {"format": "msgpack", "compression": "zstd", "length": N}\\n<N bytes>
+
+and results of at least `fileThreshold` bytes are written to a temp file
+instead; stdout then carries only
+
+    {"resultPath": "/tmp/cdp-result-xxxx.msgpack", "format": ..., "compression": ..., "length": N}
+
+The reader owns (and deletes) the file. `decode` accepts all three shapes.
+"""
+
+import importlib
+import json
+import os
+import tempfile
+
+MAGIC = b"CDPR1 "
+_PACKAGES = {"msgpack": "msgpack", "cbor": "cbor2"}
+_MODULES = {}   # optional codec packages, imported on first use (None = missing)
+
+
+def _optional(name):
+    if name not in _MODULES:
+        try:
+            _MODULES[name] = importlib.import_module(name)
+        except ImportError:
+            _MODULES[name] = None
+    return _MODULES[name]
+
+
+class ResultFormatError(ValueError):
+    pass
+
+
+def available_formats():
+    return [fmt for fmt, package in _PACKAGES.items() if _optional(package) is not None] + ["json"]
+
+
+def available_compression():
+    return ["zstd"] if _optional("zstandard") is not None else []
+
+
+def negotiate(opts):
+    """(format, compression) for an `output` block; ('json', None) without one."""
+    if not opts:
+        return "json", None
+    formats = available_formats()
+    fmt = next((f for f in opts.get("formats") or [opts.get("format", "json")] if f in formats), "json")
+    codecs = available_compression()
+    compression = next((c for c in opts.get("compress") or [] if c in codecs), None)
+    return fmt, compression
+
+
+def dumps(obj):
+    """Compact JSON bytes, orjson when available."""
+    orjson = _optional("orjson")
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    orjson = _optional("orjson")
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode(obj, fmt="json", compression=None):
+    if fmt == "msgpack":
+        body = _optional("msgpack").packb(obj, use_bin_type=True)
+    elif fmt == "cbor":
+        body = _optional("cbor2").dumps(obj)
+    else:
+        body = dumps(obj)
+    if compression == "zstd":
+        body = _optional("zstandard").ZstdCompressor(level=3).compress(body)
+    return body
+
+
+def decode_body(body, fmt="json", compression=None):
+    if compression == "zstd":
+        zstandard = _optional("zstandard")
+        if zstandard is None:
+            raise ResultFormatError("zstd result but zstandard is not installed")
+        body = zstandard.ZstdDecompressor().decompress(body)
+    elif compression:
+        raise ResultFormatError(f"unknown compression {compression!r}")
+    if fmt in ("msgpack", "cbor") and _optional(_PACKAGES[fmt]) is None:
+        raise ResultFormatError(f"{fmt} result but {_PACKAGES[fmt]} is not installed")
+    if fmt == "msgpack":
+        return _optional("msgpack").unpackb(body, raw=False)
+    if fmt == "cbor":
+        return _optional("cbor2").loads(body)
+    if fmt == "json":
+        return loads(body)
+    raise ResultFormatError(f"unknown format {fmt!r}")
+
+
+def write_result(obj, opts, stream):
+    """Encode `obj` as negotiated by `opts` and write it to binary `stream`."""
+    fmt, compression = negotiate(opts)
+    body = encode(obj, fmt, compression)
+    threshold = (opts or {}).get("fileThreshold")
+    if threshold is not None and len(body) >= int(threshold):
+        fd, path = tempfile.mkstemp(prefix="cdp-result-", suffix=f".{fmt}", dir=opts.get("dir"))
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        stream.write(dumps({"resultPath": path, "format": fmt, "compression": compression, "length": len(body)}))
+    elif fmt == "json" and compression is None:
+        stream.write(body + b"\n")
+    else:
+        stream.write(MAGIC + dumps({"format": fmt, "compression": compression, "length": len(body)}) + b"\n")
+        stream.write(body)
+    stream.flush()
+
+
+def decode(data, remove_file=True):
+    """Inverse of write_result for whatever a worker printed."""
+    if data.startswith(MAGIC):
+        header, _, body = data[len(MAGIC):].partition(b"\n")
+        meta = loads(header)
+        if len(body) != meta["length"]:
+            raise ResultFormatError(f"truncated result: {len(body)} of {meta['length']} bytes")
+        return decode_body(body, meta["format"], meta["compression"])
+    obj = loads(data)
+    if isinstance(obj, dict) and "resultPath" in obj and "nodes" not in obj:
+        with open(obj["resultPath"], "rb") as f:
+            body = f.read()
+        if remove_file:
+            os.unlink(obj["resultPath"])
+        return decode_body(body, obj["format"], obj["compression"])
+    return obj
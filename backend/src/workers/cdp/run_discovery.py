@@ -1,12 +1,39 @@
 import sys
 import json
+import signal
 import subprocess
 import os
+import time
 
 
-def run(seed_ips, username, password, protocol='cdp', post_auth_steps=None):
+# Payload keys owned by run(); anything else is forwarded to the worker as-is
+BASE_KEYS = ("seedIps", "username", "password", "protocol", "postAuthSteps")
+# Seconds a job may run when its payload has no "deadline" (Unix time)
+DEFAULT_TIMEOUT = 300
+# A worker still running this long after its deadline gets SIGTERM, and as
+# long again to flush its partial graph before it is killed
+TERM_GRACE = 20
+
+_worker = None  # running worker process, for SIGTERM forwarding
+
+
+def _forward_sigterm(signum, frame):
+    if _worker is not None and _worker.poll() is None:
+        _worker.terminate()
+
+
+def run(seed_ips, username, password, protocol='cdp', post_auth_steps=None, options=None):
+    import result_codec
+
+    return result_codec.decode(run_raw(seed_ips, username, password, protocol, post_auth_steps, options))
+
+
+def run_raw(seed_ips, username, password, protocol='cdp', post_auth_steps=None, options=None):
+    """Run the worker and return its stdout untouched (encoding negotiated via options["output"])."""
     if post_auth_steps is None:
         post_auth_steps = []
+    if options is None:
+        options = {}
     
     env = os.environ.copy()
     env["PYTHONUNBUFFERED"] = "1"
@@ -14,18 +41,36 @@ def run(seed_ips, username, password, protocol='cdp', post_auth_steps=None):
     env["CDP_USERNAME"] = username
     env["CDP_PASSWORD"] = password
 
+    # The worker stops itself at the deadline and prints what it has found
+    deadline = float(options.get("deadline") or time.time() + DEFAULT_TIMEOUT)
+
     # We call the worker script with python and pass seeds via stdin as JSON
+    global _worker
     script_path = os.path.join(os.path.dirname(__file__), "worker_entry.py")
-    proc = subprocess.run([sys.executable, script_path], input=json.dumps({
+    proc = _worker = subprocess.Popen([sys.executable, script_path], stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    job = json.dumps({
+        **options,
+        "deadline": deadline,
         "seedIps": seed_ips,
         "username": username,
         "password": password,
         "protocol": protocol,
         "postAuthSteps": post_auth_steps,
-    }).encode("utf-8"), stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, timeout=300)
-
-    out = proc.stdout.decode("utf-8").strip()
-    err = proc.stderr.decode("utf-8").strip()
+    }).encode("utf-8")
+    try:
+        out, err = proc.communicate(job, timeout=max(0.0, deadline - time.time()) + TERM_GRACE)
+    except subprocess.TimeoutExpired:
+        print(f"Worker still running {TERM_GRACE}s past its deadline, sending SIGTERM", file=sys.stderr, flush=True)
+        proc.terminate()
+        try:
+            out, err = proc.communicate(timeout=TERM_GRACE)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            out, err = proc.communicate()
+    finally:
+        _worker = None
+    err = err.decode("utf-8", errors="replace").strip()
 
     # Forward any stderr from the inner worker so callers (Node) can see
     # debug logs even when the worker succeeds.
@@ -33,21 +78,26 @@ def run(seed_ips, username, password, protocol='cdp', post_auth_steps=None):
         print(err, file=sys.stderr, flush=True)
 
     if proc.returncode != 0:
-        raise RuntimeError(f"Worker failed (code {proc.returncode}): {err or out}")
-    if not out:
+        raise RuntimeError(f"Worker failed (code {proc.returncode}): {err or out[:2000].decode('utf-8', errors='replace')}")
+    if not out.strip():
         raise RuntimeError(f"Worker produced no output. Stderr: {err}")
-    return json.loads(out)
+    return out
 
 
 if __name__ == "__main__":
+    # Node (or a shutdown) terminating us: let the worker flush its partial graph
+    signal.signal(signal.SIGTERM, _forward_sigterm)
     payload = json.loads(sys.stdin.read())
-    result = run(
+    result = run_raw(
         payload.get("seedIps", []),
         payload.get("username", ""),
         payload.get("password", ""),
         payload.get("protocol", "cdp"),
-        payload.get("postAuthSteps", [])
+        payload.get("postAuthSteps", []),
+        {k: v for k, v in payload.items() if k not in BASE_KEYS},
     )
-    print(json.dumps(result))
+    # the worker's bytes go out as-is: no decode/re-encode of the graph here
+    sys.stdout.buffer.write(result)
+    sys.stdout.buffer.flush()
 
 
@@ -0,0 +1,266 @@
+"""
+Sharded discovery coordinator
+
+Partitions the seed list by management subnet, runs one worker_entry.py
+process per shard and merges the partial {nodes, links} graphs into one.
+
+Shards share a SQLite claim table:
+  - a shard only dials IPs inside the subnets it owns, and claims each one
+    before connecting so a device is never crawled twice;
+  - neighbor IPs outside its subnets are offered to the table and kept as
+    placeholders. After every round the coordinator collects the offers that
+    nobody claimed and dispatches them as seeds of the next round.
+
+A job `deadline` is handed to every shard (each one stops itself and
+returns its partial graph); the coordinator starts no new round after it
+or after terminate() (SIGTERM), which forwards SIGTERM to running shards.
+"""
+
+import ipaddress
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import result_codec
+from network_topology_testing import log
+
+
+class ClaimTable:
+    """SQLite-backed claim/offer table shared by all shard processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS claims (ip TEXT PRIMARY KEY, shard TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS offers (ip TEXT PRIMARY KEY, shard TEXT NOT NULL)")
+
+    def claim(self, ip, shard_id) -> bool:
+        """Atomically claim `ip` for `shard_id`. True if this shard owns it."""
+        cur = self._db.execute("INSERT OR IGNORE INTO claims (ip, shard) VALUES (?, ?)", (ip, shard_id))
+        if cur.rowcount == 1:
+            return True
+        row = self._db.execute("SELECT shard FROM claims WHERE ip = ?", (ip,)).fetchone()
+        return row is not None and row[0] == shard_id
+
+    def offer(self, ip, shard_id):
+        """Publish a neighbor IP that the offering shard will not dial itself."""
+        self._db.execute("INSERT OR IGNORE INTO offers (ip, shard) VALUES (?, ?)", (ip, shard_id))
+
+    def pending(self):
+        """Offered IPs that no shard has claimed yet."""
+        rows = self._db.execute(
+            "SELECT ip FROM offers WHERE ip NOT IN (SELECT ip FROM claims) ORDER BY ip"
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def close(self):
+        try:
+            self._db.close()
+        except Exception:
+            pass
+
+
+class ShardClaim:
+    """`NetworkTopologyDiscovery.claim_ip` hook for one shard process."""
+
+    def __init__(self, table, shard_id, networks, seed_ips=None):
+        self.table = table
+        self.shard_id = shard_id
+        self.networks = [ipaddress.ip_network(n, strict=False) for n in networks]
+        self.seed_ips = set(seed_ips or [])
+
+    def owns(self, ip) -> bool:
+        if ip in self.seed_ips:
+            return True
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(addr in net for net in self.networks)
+
+    def __call__(self, ip) -> bool:
+        if not self.owns(ip):
+            self.table.offer(ip, self.shard_id)
+            return False
+        return self.table.claim(ip, self.shard_id)
+
+
+def _network_of(ip, prefix_len):
+    try:
+        return str(ipaddress.ip_network(f"{ip}/{prefix_len}", strict=False))
+    except ValueError:
+        return None
+
+
+def partition_seeds(seed_ips, prefix_len=24, shards=1):
+    """Group seeds by subnet and spread the groups over at most `shards` bins.
+
+    Returns a list of {"networks": [...], "seedIps": [...]} with the largest
+    subnets placed first on the least loaded bin.
+    """
+    groups = {}
+    for ip in seed_ips:
+        # seeds that are not IP addresses get a group of their own
+        net = _network_of(ip, prefix_len)
+        groups.setdefault((net, net or ip), []).append(ip)
+
+    bins = [{"networks": [], "seedIps": []} for _ in range(max(1, min(shards, len(groups))))]
+    for (net, _), ips in sorted(groups.items(), key=lambda kv: -len(kv[1])):
+        target = min(bins, key=lambda b: len(b["seedIps"]))
+        if net:
+            target["networks"].append(net)
+        target["seedIps"].extend(ips)
+    return [b for b in bins if b["seedIps"]]
+
+
+def merge_graphs(graphs):
+    """Merge partial {nodes, links} graphs; crawled nodes win over placeholders."""
+    nodes = {}
+    links = {}
+    arp_tables = {}
+    arp_index = None
+    stop_reason = None
+    for g in graphs:
+        stop_reason = stop_reason or g.get("stopReason")
+        for n in g.get("nodes", []):
+            cur = nodes.get(n["id"])
+            if cur is None or (cur.get("placeholder") and not n.get("placeholder")):
+                nodes[n["id"]] = n
+            elif cur.get("unexplored") and not n.get("unexplored"):
+                # another shard owned the IP and reached it
+                nodes[n["id"]] = n
+            if cur is not None and (cur.get("aliases") or n.get("aliases")):
+                nodes[n["id"]]["aliases"] = sorted(set(cur.get("aliases", [])) | set(n.get("aliases", [])))
+        for l in g.get("links", []):
+            links.setdefault(l["id"], l)
+        arp_tables.update(g.get("arpTables") or {})
+        if g.get("arpIndex"):
+            if arp_index is None:
+                arp_index = {"byIp": {}, "byMac": {}}
+            for ip, locs in g["arpIndex"].get("byIp", {}).items():
+                arp_index["byIp"].setdefault(ip, []).extend(locs)
+            for mac, ips in g["arpIndex"].get("byMac", {}).items():
+                arp_index["byMac"][mac] = sorted(set(arp_index["byMac"].get(mac, [])) | set(ips))
+    merged = {"nodes": list(nodes.values()), "links": list(links.values())}
+    if stop_reason:
+        merged["truncated"] = True
+        merged["stopReason"] = stop_reason
+    if arp_tables:
+        merged["arpTables"] = arp_tables
+    if arp_index is not None:
+        merged["arpIndex"] = arp_index
+    return merged
+
+
+_children = set()        # running shard processes
+_children_lock = threading.Lock()
+_stopping = threading.Event()
+
+
+def terminate():
+    """Stop the sharded crawl: no new rounds, running shards get SIGTERM and flush."""
+    _stopping.set()
+    with _children_lock:
+        for proc in _children:
+            try:
+                proc.terminate()
+            except OSError:
+                pass
+
+
+def _run_shard(script_path, payload, claim_path, shard_id, shard, count=1):
+    # shards answer the coordinator in plain JSON whatever the caller negotiated;
+    # analytics are computed once over the merged graph
+    job = {k: v for k, v in payload.items() if k not in ("shards", "output", "analytics")}
+    job["seedIps"] = shard["seedIps"]
+    job["shard"] = {
+        "id": shard_id,
+        "claimTable": claim_path,
+        "networks": shard["networks"],
+        "seedIps": shard["seedIps"],
+        "count": count,
+    }
+    if payload.get("checkpointPath"):
+        # one journal per shard; shard ids are stable for the same seed list
+        job["checkpointPath"] = f"{payload['checkpointPath']}.{shard_id}"
+    arp = payload.get("arp") or {}
+    if arp.get("mode") == "file" and arp.get("path"):
+        job["arp"] = {**arp, "path": f"{arp['path']}.{shard_id}"}
+    profile = payload.get("profile")
+    if profile:
+        # each shard profiles itself into its own report
+        profile = {"path": profile} if isinstance(profile, str) else profile
+        job["profile"] = {**profile, "path": f"{profile['path']}.{shard_id}"}
+    # stderr is inherited so shard logs stream straight to the caller
+    if _stopping.is_set():
+        return {"nodes": [], "links": []}
+    proc = subprocess.Popen([sys.executable, script_path], stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, env=os.environ.copy())
+    with _children_lock:
+        _children.add(proc)
+    try:
+        out, _ = proc.communicate(json.dumps(job).encode("utf-8"))
+    finally:
+        with _children_lock:
+            _children.discard(proc)
+    out = out.strip()
+    if proc.returncode != 0 or not out:
+        log(f"shard {shard_id} failed (code {proc.returncode})")
+        return {"nodes": [], "links": []}
+    return result_codec.loads(out)
+
+
+def run_sharded(payload):
+    """Run a sharded crawl for `payload` (same shape as worker_entry's job)."""
+    seeds = payload.get("seedIps", [])
+    workers = max(1, int(payload.get("shards") or os.cpu_count() or 1))
+    prefix_len = int(payload.get("shardPrefixLen", 24))
+    max_rounds = int(payload.get("shardMaxRounds", 8))
+    deadline = payload.get("deadline")
+    stop_reason = None
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker_entry.py")
+
+    if payload.get("archive"):
+        from transcript_archive import REPLAY_OPTIONS, TranscriptArchive
+        archive = TranscriptArchive(payload["archive"], mode="w")
+        archive.record_job(seeds, payload.get("protocol", "cdp"), {k: payload[k] for k in REPLAY_OPTIONS if k in payload})
+        archive.close()
+
+    graphs = []
+    with tempfile.TemporaryDirectory(prefix="cdp-shards-") as tmp:
+        table = ClaimTable(os.path.join(tmp, "claims.sqlite"))
+        try:
+            pending = list(seeds)
+            for rnd in range(max_rounds):
+                if not pending:
+                    break
+                if _stopping.is_set() or (deadline is not None and time.time() >= deadline):
+                    stop_reason = "terminated" if _stopping.is_set() else "deadline"
+                    log(f"shard_coordinator: stopped ({stop_reason}), {len(pending)} IPs left unexplored")
+                    break
+                shards = partition_seeds(pending, prefix_len, workers)
+                log(f"shard_coordinator: round {rnd + 1}, {len(pending)} seeds over {len(shards)} shards")
+                with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+                    futures = [
+                        pool.submit(_run_shard, script_path, payload, table.path, f"{rnd}.{k}", shard, len(shards))
+                        for k, shard in enumerate(shards)
+                    ]
+                    graphs.extend(f.result() for f in futures)
+                pending = table.pending()
+            if pending and stop_reason is None:
+                log(f"shard_coordinator: stopped after {max_rounds} rounds, {len(pending)} IPs left unexplored")
+        finally:
+            table.close()
+
+    merged = merge_graphs(graphs)
+    if stop_reason and not merged.get("truncated"):
+        merged["truncated"] = True
+        merged["stopReason"] = stop_reason
+    return merged
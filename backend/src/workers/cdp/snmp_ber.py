@@ -0,0 +1,192 @@
+"""
+Minimal SNMPv2c BER codec
+
+Just enough ASN.1 BER to build GET / GETNEXT / GETBULK requests and read
+their responses (and, for device_simulator.py, the reverse). Values are
+(tag, python value) pairs:
+
+    INTEGER, Counter32, Gauge32, TimeTicks, Counter64  -> int
+    OCTET STRING, IpAddress                            -> bytes
+    OBJECT IDENTIFIER                                  -> tuple of ints
+    NULL, noSuchObject, noSuchInstance, endOfMibView   -> None
+
+OIDs are tuples of ints throughout.
+"""
+
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OID = 0x06
+SEQUENCE = 0x30
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIMETICKS = 0x43
+COUNTER64 = 0x46
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+
+GET = 0xA0
+GET_NEXT = 0xA1
+RESPONSE = 0xA2
+GET_BULK = 0xA5
+
+VERSION_2C = 1
+
+_UNSIGNED = (COUNTER32, GAUGE32, TIMETICKS, COUNTER64)
+_EXCEPTIONS = (NO_SUCH_OBJECT, NO_SUCH_INSTANCE, END_OF_MIB_VIEW)
+
+
+class BerError(ValueError):
+    pass
+
+
+def parse_oid(text):
+    return tuple(int(p) for p in text.strip(".").split("."))
+
+
+def format_oid(oid):
+    return ".".join(str(p) for p in oid)
+
+
+# ---- encoding ----
+def _length(n):
+    if n < 0x80:
+        return bytes([n])
+    body = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return bytes([0x80 | len(body)]) + body
+
+
+def tlv(tag, body):
+    return bytes([tag]) + _length(len(body)) + body
+
+
+def _int_body(value, unsigned=False):
+    if unsigned:
+        return value.to_bytes(value.bit_length() // 8 + 1, "big")
+    size = max(1, (value + (value < 0)).bit_length() // 8 + 1)
+    return value.to_bytes(size, "big", signed=True)
+
+
+def _base128(n):
+    out = [n & 0x7F]
+    n >>= 7
+    while n:
+        out.append(0x80 | (n & 0x7F))
+        n >>= 7
+    return bytes(reversed(out))
+
+
+def _oid_body(oid):
+    if len(oid) < 2:
+        oid = tuple(oid) + (0,) * (2 - len(oid))
+    return _base128(oid[0] * 40 + oid[1]) + b"".join(_base128(p) for p in oid[2:])
+
+
+def encode_value(tag, value):
+    if tag == INTEGER:
+        return tlv(tag, _int_body(value))
+    if tag in _UNSIGNED:
+        return tlv(tag, _int_body(value, unsigned=True))
+    if tag in (OCTET_STRING, IP_ADDRESS):
+        return tlv(tag, value if isinstance(value, bytes) else str(value).encode())
+    if tag == OID:
+        return tlv(tag, _oid_body(value))
+    if tag in (NULL,) + _EXCEPTIONS:
+        return tlv(tag, b"")
+    raise BerError(f"cannot encode tag 0x{tag:02x}")
+
+
+def encode_message(community, pdu_type, request_id, varbinds, non_repeaters=0, max_repetitions=0,
+                   error_status=0, error_index=0):
+    """SNMPv2c message; `varbinds` is [(oid, (tag, value))] (value (NULL, None) for requests)."""
+    if pdu_type == GET_BULK:
+        error_status, error_index = non_repeaters, max_repetitions
+    vbs = b"".join(tlv(SEQUENCE, encode_value(OID, oid) + encode_value(*val)) for oid, val in varbinds)
+    pdu = tlv(pdu_type, encode_value(INTEGER, request_id) + encode_value(INTEGER, error_status)
+              + encode_value(INTEGER, error_index) + tlv(SEQUENCE, vbs))
+    return tlv(SEQUENCE, encode_value(INTEGER, VERSION_2C) + encode_value(OCTET_STRING, community) + pdu)
+
+
+# ---- decoding ----
+def _read(data, pos):
+    """(tag, body start, body end) of the TLV at `pos`."""
+    try:
+        tag = data[pos]
+        first = data[pos + 1]
+        pos += 2
+        if first & 0x80:
+            n = first & 0x7F
+            length = int.from_bytes(data[pos:pos + n], "big")
+            pos += n
+        else:
+            length = first
+    except IndexError:
+        raise BerError("truncated TLV header")
+    if pos + length > len(data):
+        raise BerError("truncated TLV body")
+    return tag, pos, pos + length
+
+
+def _decode_oid(body):
+    parts, n = [], 0
+    for b in body:
+        n = (n << 7) | (b & 0x7F)
+        if not b & 0x80:
+            parts.append(n)
+            n = 0
+    if not parts:
+        return ()
+    first = parts[0]
+    head = (min(first // 40, 2), first - 40 * min(first // 40, 2))
+    return head + tuple(parts[1:])
+
+
+def decode_value(tag, body):
+    if tag == INTEGER:
+        return int.from_bytes(body, "big", signed=True)
+    if tag in _UNSIGNED:
+        return int.from_bytes(body, "big")
+    if tag in (OCTET_STRING, IP_ADDRESS):
+        return bytes(body)
+    if tag == OID:
+        return _decode_oid(body)
+    return None
+
+
+def _children(data, start, end):
+    out = []
+    while start < end:
+        tag, s, e = _read(data, start)
+        out.append((tag, s, e))
+        start = e
+    return out
+
+
+def decode_message(data):
+    """Returns (community, pdu_type, request_id, error_status, error_index, varbinds).
+
+    For GETBULK requests error_status/error_index carry non-repeaters and
+    max-repetitions.
+    """
+    data = memoryview(data)
+    tag, s, e = _read(data, 0)
+    if tag != SEQUENCE:
+        raise BerError("not an SNMP message")
+    fields = _children(data, s, e)
+    if len(fields) != 3:
+        raise BerError("malformed SNMP message")
+    community = bytes(data[fields[1][1]:fields[1][2]])
+    pdu_type, ps, pe = fields[2]
+    pdu = _children(data, ps, pe)
+    if len(pdu) != 4:
+        raise BerError("malformed PDU")
+    request_id, error_status, error_index = (decode_value(INTEGER, data[s:e]) for _, s, e in pdu[:3])
+    varbinds = []
+    for _, vs, ve in _children(data, pdu[3][1], pdu[3][2]):
+        (otag, os_, oe), (vtag, vs2, ve2) = _children(data, vs, ve)
+        if otag != OID:
+            raise BerError("varbind without OID")
+        varbinds.append((_decode_oid(data[os_:oe]), (vtag, decode_value(vtag, data[vs2:ve2]))))
+    return community, pdu_type, request_id, error_status, error_index, varbinds
@@ -0,0 +1,380 @@
+"""
+SNMP bulk-walk collector
+
+Alternative to SSH screen-scraping: neighbors, chassis facts and ARP are
+read with SNMPv2c GETBULK from
+
+    CDP-MIB     cdpCacheTable          (1.3.6.1.4.1.9.9.23.1.2.1)
+    LLDP-MIB    lldpRemTable, lldpLocPortTable, lldpRemManAddrTable
+    ENTITY-MIB  entPhysicalClass / ModelName / SerialNum (chassis PID, SN)
+    IP-MIB      ipNetToMediaPhysAddress (ARP)
+    IF-MIB      ifName (local interface names)
+    SNMPv2-MIB  sysName, sysDescr
+
+SnmpEngine runs every walk of every device in the current batch
+concurrently over one UDP socket from a single thread, so a BFS level of
+N devices costs roughly one device's worth of round trips instead of N
+shell logins. SnmpTopologyDiscovery plugs it into the NetworkTopologyDiscovery
+crawl (collect_batch), producing the same device/neighbor records so
+worker_entry.build_graph is unchanged.
+
+Job payload: "protocol": "snmp" plus
+    "snmp": {"community": "public", "neighbors": "cdp"|"lldp"|"both",
+             "port": 161, "timeout": 2, "retries": 2, "maxRepetitions": 25,
+             "concurrency": 64}
+"""
+
+import itertools
+import random
+import selectors
+import socket
+import time
+from collections import deque
+
+from network_topology_testing import NetworkTopologyDiscovery, log
+from snmp_ber import (
+    END_OF_MIB_VIEW, GET_BULK, NULL, RESPONSE, BerError, decode_message, encode_message,
+)
+
+SYS_DESCR = (1, 3, 6, 1, 2, 1, 1, 1)
+SYS_NAME = (1, 3, 6, 1, 2, 1, 1, 5)
+IF_NAME = (1, 3, 6, 1, 2, 1, 31, 1, 1, 1, 1)
+ENT_CLASS = (1, 3, 6, 1, 2, 1, 47, 1, 1, 1, 1, 5)
+ENT_SERIAL = (1, 3, 6, 1, 2, 1, 47, 1, 1, 1, 1, 11)
+ENT_MODEL = (1, 3, 6, 1, 2, 1, 47, 1, 1, 1, 1, 13)
+CDP_CACHE = (1, 3, 6, 1, 4, 1, 9, 9, 23, 1, 2, 1, 1)
+LLDP_LOC_PORT_ID = (1, 0, 8802, 1, 1, 2, 1, 3, 7, 1, 3)
+LLDP_REM = (1, 0, 8802, 1, 1, 2, 1, 4, 1, 1)
+LLDP_REM_MAN_ADDR = (1, 0, 8802, 1, 1, 2, 1, 4, 2, 1, 3)
+ARP_PHYS = (1, 3, 6, 1, 2, 1, 4, 22, 1, 2)
+
+ENT_CHASSIS = 3
+
+
+class _Walk:
+    __slots__ = ("host", "root", "cursor", "rows", "tries", "request_id", "sent_at")
+
+    def __init__(self, host, root):
+        self.host = host
+        self.root = root
+        self.cursor = root
+        self.rows = []
+        self.tries = 0
+        self.request_id = None
+        self.sent_at = 0.0
+
+
+class SnmpEngine:
+    """Concurrent GETBULK subtree walks over a single non-blocking UDP socket."""
+
+    def __init__(self, community="public", port=161, timeout=2.0, retries=2, max_repetitions=25,
+                 max_inflight=64, per_host=4):
+        self.community = community.encode() if isinstance(community, str) else community
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.max_repetitions = max_repetitions
+        self.max_inflight = max_inflight
+        self.per_host = per_host
+        self._ids = itertools.count(random.randrange(1, 1 << 30))
+
+    def walk(self, jobs, stop=None):
+        """Walk every (host, root) in `jobs`.
+
+        Returns {(host, root): [(oid, (tag, value)), ...]}, or None for a walk
+        that got no answer after all retries. Setting the `stop` event ends
+        the walk early; unfinished walks are missing from the result.
+        """
+        pending = deque(_Walk(host, root) for host, root in jobs)
+        results = {}
+        inflight = {}
+        per_host = {}
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sel = selectors.DefaultSelector()
+        sel.register(sock, selectors.EVENT_READ)
+        try:
+            while (pending or inflight) and not (stop is not None and stop.is_set()):
+                # start queued walks while under the in-flight and per-host caps
+                for _ in range(len(pending)):
+                    if len(inflight) >= self.max_inflight:
+                        break
+                    w = pending.popleft()
+                    if per_host.get(w.host, 0) >= self.per_host:
+                        pending.append(w)
+                        continue
+                    per_host[w.host] = per_host.get(w.host, 0) + 1
+                    self._send(sock, w, inflight)
+
+                now = time.monotonic()
+                wait = min((w.sent_at + self.timeout for w in inflight.values()), default=now) - now
+                if sel.select(max(0.0, wait)):
+                    self._receive(sock, inflight, per_host, results)
+
+                now = time.monotonic()
+                for rid, w in list(inflight.items()):
+                    if now - w.sent_at < self.timeout:
+                        continue
+                    del inflight[rid]
+                    if w.tries <= self.retries:
+                        self._send(sock, w, inflight)
+                    else:
+                        per_host[w.host] -= 1
+                        results[(w.host, w.root)] = w.rows or None
+        finally:
+            sel.close()
+            sock.close()
+        return results
+
+    def _send(self, sock, w, inflight):
+        w.request_id = next(self._ids) & 0x7FFFFFFF
+        w.tries += 1
+        w.sent_at = time.monotonic()
+        inflight[w.request_id] = w
+        msg = encode_message(self.community, GET_BULK, w.request_id, [(w.cursor, (NULL, None))],
+                             0, self.max_repetitions)
+        try:
+            sock.sendto(msg, (w.host, self.port))
+        except OSError as e:
+            log(f"SNMP send to {w.host} failed: {e}")
+
+    def _receive(self, sock, inflight, per_host, results):
+        while True:
+            try:
+                data, addr = sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # ICMP port unreachable surfaces here on Linux; the timeout handles it
+                continue
+            try:
+                _, pdu_type, rid, error_status, _, varbinds = decode_message(data)
+            except BerError:
+                continue
+            w = inflight.get(rid)
+            if w is None or pdu_type != RESPONSE or addr[0] != w.host:
+                continue
+            del inflight[rid]
+            done = error_status != 0 or not varbinds
+            n = len(w.root)
+            for oid, value in varbinds:
+                if value[0] == END_OF_MIB_VIEW or oid[:n] != w.root or oid <= w.cursor:
+                    done = True
+                    break
+                w.rows.append((oid, value))
+                w.cursor = oid
+            if done:
+                per_host[w.host] -= 1
+                results[(w.host, w.root)] = w.rows
+            else:
+                w.tries = 0
+                self._send(sock, w, inflight)
+
+
+# ---- MIB row mapping ----
+def _text(value):
+    raw = value[1]
+    if isinstance(raw, bytes):
+        return raw.decode("utf-8", "replace").strip("\x00 ")
+    return "" if raw is None else str(raw)
+
+
+def _mac(raw):
+    h = raw.hex()
+    return f"{h[0:4]}.{h[4:8]}.{h[8:12]}"
+
+
+def _columns(rows, root):
+    """{column: {index tuple: value}} for a table walked from its entry OID."""
+    out = {}
+    n = len(root)
+    for oid, value in rows or []:
+        if len(oid) > n:
+            out.setdefault(oid[n], {})[oid[n + 1:]] = value
+    return out
+
+
+def _by_index(rows, root):
+    n = len(root)
+    return {oid[n:]: value for oid, value in rows or []}
+
+
+def parse_system(descr_rows, name_rows):
+    descr = next((_text(v) for _, v in descr_rows or []), "")
+    name = next((_text(v) for _, v in name_rows or []), "")
+    return name, descr
+
+
+def parse_chassis(class_rows, model_rows, serial_rows):
+    """(PID, serial) of the first chassis entity, (None, None) without ENTITY-MIB."""
+    classes = _by_index(class_rows, ENT_CLASS)
+    models = _by_index(model_rows, ENT_MODEL)
+    serials = _by_index(serial_rows, ENT_SERIAL)
+    chassis = sorted(i for i, v in classes.items() if v[1] == ENT_CHASSIS) or sorted(models)
+    for index in chassis:
+        model = _text(models.get(index, (None, None)))
+        if model:
+            return model, _text(serials.get(index, (None, None))) or None
+    return None, None
+
+
+def parse_if_names(rows):
+    return {index[0]: _text(v) for index, v in _by_index(rows, IF_NAME).items() if index}
+
+
+def parse_cdp(rows, if_names):
+    cols = _columns(rows, CDP_CACHE)
+    neighbors = []
+    for index, dev_id in sorted(cols.get(6, {}).items()):
+        n = {"hostname": _text(dev_id)}
+        addr = cols.get(4, {}).get(index, (None, None))[1]
+        if isinstance(addr, bytes) and len(addr) == 4:
+            n["ip"] = ".".join(str(b) for b in addr)
+        if index in cols.get(8, {}):
+            n["platform"] = _text(cols[8][index])
+        if index and index[0] in if_names:
+            n["local_interface"] = if_names[index[0]]
+        if index in cols.get(7, {}):
+            n["port_id"] = _text(cols[7][index])
+        neighbors.append(n)
+    return neighbors
+
+
+def parse_lldp(rem_rows, loc_rows, man_rows):
+    cols = _columns(rem_rows, LLDP_REM)
+    local_ports = {index[0]: _text(v) for index, v in _by_index(loc_rows, LLDP_LOC_PORT_ID).items() if index}
+    # lldpRemManAddrTable index: timeMark.localPort.remIndex.addrSubtype.addrLen.addr...
+    mgmt = {}
+    for index in _by_index(man_rows, LLDP_REM_MAN_ADDR):
+        if len(index) >= 9 and index[3] == 1 and index[4] == 4:
+            mgmt.setdefault(index[:3], ".".join(str(b) for b in index[5:9]))
+    neighbors = []
+    for index, sys_name in sorted(cols.get(9, {}).items()):
+        n = {}
+        if len(index) >= 2 and index[1] in local_ports:
+            n["local_interface"] = local_ports[index[1]]
+        chassis = cols.get(5, {}).get(index)
+        if chassis is not None:
+            raw = chassis[1]
+            subtype = cols.get(4, {}).get(index, (None, None))[1]
+            n["chassis_id"] = _mac(raw) if isinstance(raw, bytes) and len(raw) == 6 and subtype in (4, None) \
+                else _text(chassis)
+        for col, key in ((7, "port_id"), (8, "port_description"), (10, "platform")):
+            if index in cols.get(col, {}):
+                n[key] = _text(cols[col][index])
+        n["hostname"] = _text(sys_name)
+        if index in mgmt:
+            n["ip"] = mgmt[index]
+        neighbors.append(n)
+    return neighbors
+
+
+def parse_arp(rows, if_names):
+    out = []
+    for index, value in sorted(_by_index(rows, ARP_PHYS).items()):
+        if len(index) != 5:
+            continue
+        iface = if_names.get(index[0], str(index[0]))
+        raw = value[1]
+        mac = _mac(raw) if isinstance(raw, bytes) and len(raw) == 6 else None
+        out.append((".".join(str(p) for p in index[1:]), mac, iface, iface))
+    return out
+
+
+class SnmpTopologyDiscovery(NetworkTopologyDiscovery):
+    """NetworkTopologyDiscovery that polls devices over SNMP instead of SSH."""
+
+    def __init__(self, community="public", port=161, timeout=2.0, retries=2, max_repetitions=25,
+                 concurrency=64):
+        super().__init__(username="", password="")
+        self.engine = SnmpEngine(community, port=port, timeout=timeout, retries=retries,
+                                 max_repetitions=max_repetitions, max_inflight=concurrency)
+        self.batch_size = concurrency
+
+    @classmethod
+    def from_payload(cls, opts, community=None):
+        opts = opts or {}
+        return cls(
+            community=opts.get("community") or community or "public",
+            port=int(opts.get("port") or 161),
+            timeout=float(opts.get("timeout") or 2.0),
+            retries=int(opts.get("retries") if opts.get("retries") is not None else 2),
+            max_repetitions=int(opts.get("maxRepetitions") or 25),
+            concurrency=int(opts.get("concurrency") or 64),
+        )
+
+    def _roots(self, protocol):
+        roots = [SYS_NAME, SYS_DESCR, ENT_CLASS, ENT_MODEL, ENT_SERIAL, IF_NAME]
+        if protocol in ['cdp', 'both']:
+            roots.append(CDP_CACHE)
+        if protocol in ['lldp', 'both']:
+            roots += [LLDP_REM, LLDP_LOC_PORT_ID, LLDP_REM_MAN_ADDR]
+        if self.arp_options is None or self.arp_options.mode != "off":
+            roots.append(ARP_PHYS)
+        return roots
+
+    def collect_device(self, ip, protocol='cdp'):
+        return self.collect_batch([ip], protocol)[0][1]
+
+    def collect_batch(self, ips, protocol='cdp'):
+        results = {}
+        todo = []
+        for ip in ips:
+            handled, result = self._restore(ip)
+            if handled:
+                results[ip] = result
+            else:
+                todo.append(ip)
+
+        roots = self._roots(protocol)
+        started = time.monotonic()
+        walked = self.engine.walk([(ip, root) for ip in todo for root in roots], stop=self.stopping) if todo else {}
+        if todo:
+            log(f"SNMP polled {len(todo)} device(s) in {time.monotonic() - started:.2f}s")
+        if self.stopping.is_set():
+            # cut short by abort(): the unfinished devices are not failures
+            return [(ip, results.get(ip)) for ip in ips]
+
+        for ip in todo:
+            tables = {root: walked.get((ip, root)) for root in roots}
+            if tables[SYS_NAME] is None:
+                log(f"No SNMP response from {ip}")
+                if self.checkpoint is not None:
+                    self.checkpoint.record_failed(ip)
+                results[ip] = None
+                continue
+            results[ip] = self._device_from_tables(ip, tables, protocol)
+        return [(ip, results[ip]) for ip in ips]
+
+    def _device_from_tables(self, ip, tables, protocol):
+        name, descr = parse_system(tables[SYS_DESCR], tables[SYS_NAME])
+        pid, serial = parse_chassis(tables[ENT_CLASS], tables[ENT_MODEL], tables[ENT_SERIAL])
+        if_names = parse_if_names(tables[IF_NAME])
+        info = {
+            "ip": ip,
+            "hostname": self._short_name(name) or f"Router-{ip.split('.')[-1]}",
+            "device_type": self._classify_device_type(pid or descr),
+        }
+        if pid:
+            info["pid"] = pid
+        if serial:
+            info["serial"] = serial
+
+        canonical = self.resolve_alias(ip, info)
+        if canonical is not None:
+            info["alias_of"] = canonical
+            if self.checkpoint is not None:
+                self.checkpoint.record_device(ip, info, [])
+            return info, []
+
+        neighbors = []
+        if protocol in ['cdp', 'both']:
+            found = parse_cdp(tables.get(CDP_CACHE), if_names)
+            log(f"CDP neighbors found for {ip}: {len(found)} (snmp)")
+            neighbors.extend(found)
+        if protocol in ['lldp', 'both']:
+            found = parse_lldp(tables.get(LLDP_REM), tables.get(LLDP_LOC_PORT_ID), tables.get(LLDP_REM_MAN_ADDR))
+            log(f"LLDP neighbors found for {ip}: {len(found)} (snmp)")
+            neighbors.extend(found)
+        info["arp_entries"] = self._arp_entries(parse_arp(tables.get(ARP_PHYS), if_names))
+        return self._finish_device(ip, info, neighbors)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Cold-start budget for the worker entry points
+
+Imports each entry point in a fresh interpreter with `-X importtime` and
+reports the cumulative import time of the module (best of --repeat runs),
+its heaviest imports, and any heavy optional module it pulls in at import
+time. Exits non-zero when an entry point is over its budget or imports a
+module that must stay lazy, so start-up regressions fail CI like
+bench_discovery.py does for crawl speed.
+
+Sources are byte-compiled first (as in the image) unless --no-compile is
+given, so the numbers do not include compiling.
+
+Usage:
+    python startup_budget.py
+    python startup_budget.py --budget worker_entry=40 --top 10
+"""
+
+import argparse
+import compileall
+import json
+import os
+import re
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# entry point -> import budget in milliseconds
+BUDGETS_MS = {
+    "run_discovery": 40,
+    "worker_entry": 60,
+    "export_drawio": 30,
+    "transcript_archive": 60,
+    "shard_coordinator": 80,
+}
+# only the code paths that use these may import them
+LAZY_MODULES = ("paramiko", "cryptography", "drawio_network_plot", "orjson", "msgpack", "cbor2", "zstandard")
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(module, repeat=3):
+    """Best-of-`repeat` import profile of `module` in a fresh interpreter."""
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONPROFILEIMPORTTIME"}
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed: {proc.stderr.decode()[-2000:]}")
+        rows = []
+        for line in proc.stderr.decode().splitlines():
+            m = _LINE.match(line)
+            if m:
+                rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3))))
+        # children are printed before their parent: the module's own subtree
+        # runs from the previous top-level line to the module's line
+        end = next(i for i, (name, _, _, depth) in enumerate(rows) if name == module and depth == 1)
+        start = max([i + 1 for i in range(end) if rows[i][3] == 1] or [0])
+        total = rows[end][2]
+        if best is None or total < best["total_us"]:
+            best = {"total_us": total, "rows": rows[start:end]}
+    return best
+
+
+def check(module, budget_ms, repeat=3, top=5):
+    profile = measure(module, repeat)
+    imported = {name for name, _, _, _ in profile["rows"]}
+    lazy = sorted(m for m in LAZY_MODULES if m in imported)
+    heaviest = sorted(profile["rows"], key=lambda r: -r[2])
+    return {
+        "entryPoint": module,
+        "importMs": round(profile["total_us"] / 1000, 1),
+        "budgetMs": budget_ms,
+        # direct imports of the entry point, by cumulative time
+        "heaviest": [{"module": n, "ms": round(cum / 1000, 1)} for n, _, cum, depth in heaviest
+                     if depth == 3][:top],
+        "eagerHeavyModules": lazy,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import-time budgets of the worker entry points")
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=MS",
+                        help="override or add a budget, e.g. worker_entry=40")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--no-compile", action="store_true", help="measure without byte-compiling first")
+    args = parser.parse_args()
+
+    budgets = dict(BUDGETS_MS)
+    for item in args.budget:
+        module, _, ms = item.partition("=")
+        budgets[module] = float(ms)
+    if not args.no_compile:
+        compileall.compile_dir(HERE, maxlevels=0, quiet=1)
+
+    reports = [check(module, budget, args.repeat, args.top) for module, budget in budgets.items()]
+    print(json.dumps(reports, indent=2))
+
+    failures = []
+    for r in reports:
+        if r["importMs"] > r["budgetMs"]:
+            failures.append(f"{r['entryPoint']} imports in {r['importMs']} ms > {r['budgetMs']} ms")
+        if r["eagerHeavyModules"]:
+            failures.append(f"{r['entryPoint']} imports {', '.join(r['eagerHeavyModules'])} at start-up")
+    for f in failures:
+        sys.stderr.write(f"REGRESSION: {f}\n")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
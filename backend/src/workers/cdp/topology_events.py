@@ -0,0 +1,650 @@
+#!/usr/bin/env python3
+"""
+Event-driven topology updates
+
+Keeps a saved {nodes, links} graph current from neighbor and link events
+instead of periodic full crawls:
+
+    neighbor_add / neighbor_del     LLDP/CDP neighbor changes
+    link_up / link_down             interface state changes
+
+Events are read from Cisco syslog lines (%LINK-3-UPDOWN, %LINEPROTO-5-UPDOWN,
+%ETHPORT-5-IF_UP / IF_DOWN_*, %LLDP-5-NBRADD / NBRDEL and the CDP
+equivalents) or from telemetry JSON: one event per line in the shape of
+`items` below, or Telegraf's JSON serializer output (single metrics or
+{"metrics": [...]} batches; the metric name or path says lldp/cdp for
+neighbor changes, an oper state field makes it a link event).
+
+Every event is applied right away as a provisional change: links on a
+downed interface get "state": "down", deleted neighbors lose their link,
+new neighbors get a link (and a placeholder node) marked "pending". The
+crawled devices it touches are queued, and once no event arrived for
+`settle` seconds (or `maxDelay` after the first queued one) each of them is
+dialed once, Flow 1 only, and its links are replaced by what it reports
+now. Devices that cannot be reached keep the provisional state and are
+flagged "stale"; those left undialed by SIGTERM or the job deadline are only
+listed as unconfirmed. New neighbors stay placeholders until the next full
+crawl.
+
+Devices are named the way the network names them (syslog host, telemetry
+source): any node id, label (with or without domain), mgmtIp or alias
+matches. Interface names match in any abbreviation (Gi1/0/1 and
+GigabitEthernet1/0/1, Eth1/1 and Ethernet1/1).
+
+Worker payload (one batch; the result is the updated graph with a
+`lastUpdate` summary):
+    "events": {
+        "graph": {"nodes": [...], "links": [...]},
+        "lines": ["<189>Oct 19 10:00:01 sw1 %LINK-3-UPDOWN: Interface Gi1/0/1, changed state to down"],
+        "items": [{"kind": "neighbor_del", "device": "sw1", "interface": "Gi1/0/2", "neighbor": "ap-3"}],
+        "confirm": true               # false: apply without dialing
+    }
+plus the usual credentials and discovery options for the confirming dials.
+
+Usage:
+    python topology_events.py ingest graph.json --source /var/log/network.log --follow --job job.json
+    python topology_events.py ingest graph.json --source udp://0.0.0.0:5514 --settle 10
+    python topology_events.py replay events.log --to udp://127.0.0.1:5514 --speed 20
+    python topology_events.py replay events.log --speed 0 | python topology_events.py ingest graph.json --no-confirm
+"""
+
+import argparse
+import json
+import os
+import queue
+import re
+import signal
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from network_topology_testing import log
+
+KINDS = ("neighbor_add", "neighbor_del", "link_up", "link_down")
+
+_SYSLOG_HEAD = re.compile(
+    r"^(?:<\d+>)?(?:1\s+)?"
+    r"(?:(?P<ts>[A-Z][a-z]{2}\s+\d+\s+\d+:\d+:\d+|\d{4}-\d\d-\d\dT\S+)\s+)?"
+    r"(?P<host>[^\s:]+)\s"
+)
+_SYSLOG_MSG = re.compile(r"%(?P<facility>[A-Z0-9_]+)-\d-(?P<mnemonic>[A-Z0-9_]+):\s*(?P<text>.*)$")
+_IFNAME = r"([A-Za-z][\w/.:-]*\d)"
+_IPV4 = r"(\d{1,3}(?:\.\d{1,3}){3})"
+
+# telemetry / normalized JSON keys, first present one wins
+_FIELDS = {
+    "device": ("device", "source", "host", "hostname", "node_id_str", "agent_host"),
+    "interface": ("interface", "if_name", "ifName", "local_interface", "localPort", "port"),
+    "neighbor": ("neighbor", "sys_name", "sysName", "system_name", "device_id", "devId", "remote_system_name"),
+    "neighborIp": ("neighborIp", "mgmt_ip", "mgmtIp", "management_address", "remote_mgmt_ip"),
+    "neighborInterface": ("neighborInterface", "port_id", "portId", "remote_port", "remote_port_id"),
+    "state": ("state", "oper_st", "operSt", "oper_status", "operStatus"),
+}
+_UP = {"up", "1", "true"}
+_DOWN = {"down", "2", "false", "lower-layer-down", "lowerlayerdown", "link-down", "admin-down"}
+_REMOVED = {"delete", "deleted", "del", "remove", "removed", "expired", "aged"}
+
+
+def _event(kind, device, interface=None, ts=None, **extra):
+    event = {"kind": kind, "device": device, "interface": interface, "ts": ts}
+    event.update((k, v) for k, v in extra.items() if v)
+    return event
+
+
+def _ifkey(name):
+    """Abbreviation-independent interface key: GigabitEthernet1/0/1 -> gi1/0/1."""
+    if not name:
+        return None
+    m = re.match(r"^([A-Za-z-]+)\s*([\d/.:]+)$", str(name).strip())
+    if not m:
+        return str(name).strip().lower()
+    return m.group(1)[:2].lower() + m.group(2)
+
+
+def _syslog_time(stamp):
+    if not stamp:
+        return None
+    try:
+        if "T" in stamp:
+            return datetime.fromisoformat(stamp.replace("Z", "+00:00")).timestamp()
+        parsed = datetime.strptime(" ".join(stamp.split()), "%b %d %H:%M:%S")
+        return parsed.replace(year=datetime.now().year).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_syslog(line, device=None):
+    """Event of one Cisco syslog line, None when it is not a neighbor/link message."""
+    msg = _SYSLOG_MSG.search(line)
+    if not msg:
+        return None
+    head = _SYSLOG_HEAD.match(line)
+    host, ts = device, None
+    if head and head.start("host") < msg.start():
+        host, ts = head.group("host"), _syslog_time(head.group("ts"))
+    facility, mnemonic, text = msg.group("facility"), msg.group("mnemonic"), msg.group("text")
+
+    if facility in ("LINK", "LINEPROTO") and mnemonic == "UPDOWN":
+        m = re.search(r"Interface " + _IFNAME + r",? changed state to (administratively down|up|down)", text)
+        if m:
+            return _event("link_up" if m.group(2) == "up" else "link_down", host, m.group(1), ts)
+    elif facility == "ETHPORT" and mnemonic.startswith("IF_"):
+        m = re.search(r"Interface " + _IFNAME, text)
+        if m and (mnemonic == "IF_UP" or mnemonic.startswith("IF_DOWN")):
+            return _event("link_up" if mnemonic == "IF_UP" else "link_down", host, m.group(1), ts)
+    elif facility in ("CDP", "LLDP"):
+        if any(word in mnemonic for word in ("ADD", "NEW")):
+            kind = "neighbor_add"
+        elif any(word in mnemonic for word in ("DEL", "REMOV", "EXPIR", "AGED")):
+            kind = "neighbor_del"
+        else:
+            return None   # duplex/native VLAN mismatch and friends
+        local = re.search(r"\bon (?:[Ii]nterface |[Pp]ort )?" + _IFNAME, text) or \
+            re.search(r"(?:[Ii]nterface|[Ll]ocal [Pp]ort)\s*[:=]?\s*" + _IFNAME, text)
+        name = re.search(r"(?:[Ss]ystem [Nn]ame|[Dd]evice ?[Ii][Dd]|[Nn]eighbor(?: [Nn]ame)?)\s*[:=]\s*([^\s,;]+)", text)
+        port = re.search(r"[Pp]ort [Ii][Dd]\s*[:=]\s*([^\s,;]+)", text)
+        addr = re.search(r"(?:[Mm]gmt|[Mm]anagement)[\w ]*?[:=]\s*" + _IPV4, text) or re.search(_IPV4, text)
+        return _event(kind, host, local and local.group(1), ts, protocol=facility.lower(),
+                      neighbor=name and name.group(1), neighborIp=addr and addr.group(1),
+                      neighborInterface=port and port.group(1))
+    return None
+
+
+def _field(flat, key):
+    for name in _FIELDS[key]:
+        value = flat.get(name)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+def parse_json(obj):
+    """Events of one telemetry record: normalized event, Telegraf metric or batch."""
+    if isinstance(obj, list):
+        return [e for item in obj for e in parse_json(item)]
+    if not isinstance(obj, dict):
+        return []
+    if isinstance(obj.get("metrics"), list):
+        return parse_json(obj["metrics"])
+    flat = {**(obj.get("tags") or {}), **(obj.get("fields") or {}),
+            **{k: v for k, v in obj.items() if k not in ("tags", "fields")}}
+    ts = flat.get("ts") or flat.get("timestamp")
+    if isinstance(ts, (int, float)) and ts > 1e12:
+        ts = ts / 1e9 if ts > 1e17 else ts / 1e3   # Telegraf precision ns / ms
+    path = str(flat.get("path") or flat.get("encoding_path") or "")
+    interface = _field(flat, "interface")
+    if interface is None:
+        m = re.search(r"(?:if|phys|intf)-\[([^\]]+)\]", path)
+        interface = m and m.group(1)
+    extra = {k: _field(flat, k) for k in ("neighbor", "neighborIp", "neighborInterface")}
+
+    kind = str(flat.get("kind") or flat.get("event") or "")
+    if kind not in KINDS:
+        topic = f"{flat.get('name', '')} {path} {kind}".lower()
+        operation = str(flat.get("operation") or flat.get("op") or flat.get("status") or kind).lower()
+        state = (_field(flat, "state") or "").lower()
+        if "lldp" in topic or "cdp" in topic:
+            kind = "neighbor_del" if operation in _REMOVED or "del" in kind.lower() else "neighbor_add"
+            extra["protocol"] = "lldp" if "lldp" in topic else "cdp"
+        elif state in _UP:
+            kind = "link_up"
+        elif state in _DOWN:
+            kind = "link_down"
+        else:
+            return []
+    return [_event(kind, _field(flat, "device"), interface, ts, **extra)]
+
+
+def parse_line(line, device=None):
+    """Events of one input line: a JSON record or a syslog message."""
+    line = line.strip()
+    if not line:
+        return []
+    if line[0] in "{[":
+        try:
+            return parse_json(json.loads(line))
+        except ValueError:
+            pass
+    event = parse_syslog(line, device)
+    return [event] if event else []
+
+
+class GraphUpdater:
+    """A graph that events are applied to and dialed devices are merged into."""
+
+    def __init__(self, graph):
+        self.extra = {k: v for k, v in graph.items() if k not in ("nodes", "links", "analytics", "lastUpdate")}
+        self.nodes = {n["id"]: n for n in graph.get("nodes", [])}
+        self.links = {l["id"]: l for l in graph.get("links", [])}
+        self.names = {}
+        for node in self.nodes.values():
+            self._index(node)
+        self.counts = Counter()
+        self._orphans = set()   # placeholders that lost a link
+
+    def _index(self, node):
+        names = [node["id"], node.get("mgmtIp"), node.get("label")] + list(node.get("aliases") or [])
+        for name in names:
+            if name:
+                self.names.setdefault(str(name).lower(), node["id"])
+                self.names.setdefault(str(name).lower().split(".")[0], node["id"])
+
+    def resolve(self, name):
+        if not name:
+            return None
+        name = str(name).lower()
+        return self.names.get(name) or (None if re.match(_IPV4 + "$", name) else self.names.get(name.split(".")[0]))
+
+    def _crawled(self, node_id):
+        node = self.nodes.get(node_id)
+        return node is not None and not node.get("placeholder")
+
+    def _links_at(self, node_id, ifkey):
+        for link in self.links.values():
+            if link["source"] == node_id and _ifkey(link.get("srcIfName")) == ifkey:
+                yield link, link["target"]
+            elif link["target"] == node_id and _ifkey(link.get("dstIfName")) == ifkey:
+                yield link, link["source"]
+
+    def _links_between(self, a, b):
+        return [link for link in self.links.values() if {link["source"], link["target"]} == {a, b}]
+
+    def _remove(self, link):
+        del self.links[link["id"]]
+        self._orphans.update((link["source"], link["target"]))
+        self.counts["linksRemoved"] += 1
+
+    def apply(self, event):
+        """Apply one event provisionally; the crawled devices it touches, to confirm."""
+        dev = self.resolve(event.get("device"))
+        if dev is None:
+            log(f"topology_events: {event.get('kind')} from unknown device {event.get('device')!r}, ignored")
+            self.counts["ignored"] += 1
+            return set()
+        self.counts["applied"] += 1
+        kind, ifkey = event["kind"], _ifkey(event.get("interface"))
+        touched = {dev}
+        if kind in ("link_down", "link_up"):
+            for link, other in list(self._links_at(dev, ifkey)):
+                if kind == "link_down":
+                    link["state"] = "down"
+                else:
+                    link.pop("state", None)
+                touched.add(other)
+        elif kind == "neighbor_del":
+            nbr = self.resolve(event.get("neighborIp")) or self.resolve(event.get("neighbor"))
+            if ifkey:
+                gone = [link for link, other in self._links_at(dev, ifkey) if nbr is None or other == nbr]
+            else:
+                gone = self._links_between(dev, nbr) if nbr else []
+            for link in gone:
+                self._remove(link)
+                touched.update((link["source"], link["target"]))
+        elif kind == "neighbor_add":
+            nbr = self.resolve(event.get("neighborIp")) or self.resolve(event.get("neighbor"))
+            if nbr is None:
+                nbr = event.get("neighborIp") or event.get("neighbor")
+                if not nbr:
+                    return {dev} if self._crawled(dev) else set()
+                node = {"id": nbr, "label": event.get("neighbor") or nbr, "mgmtIp": event.get("neighborIp") or nbr,
+                        "type": "device", "arp": [], "placeholder": True}
+                self.nodes[nbr] = node
+                self._index(node)
+            existing = self._links_between(dev, nbr)
+            for link in existing:
+                link.pop("state", None)
+            if not existing and nbr != dev:
+                link_id = f"{dev}->{nbr}"
+                self.links[link_id] = {"id": link_id, "source": dev, "target": nbr,
+                                       "linkType": event.get("protocol") or "cdp",
+                                       "srcIfName": event.get("interface"),
+                                       "dstIfName": event.get("neighborInterface"), "pending": True}
+                self.counts["linksAdded"] += 1
+            touched.add(nbr)
+        return {n for n in touched if self._crawled(n)}
+
+    def merge(self, dialed, partial):
+        """Replace the links of every device of `dialed` that `partial` (a worker
+        graph of those dials) has crawled; the others are flagged stale unless
+        the dials were cut short (truncated), which says nothing about them."""
+        fresh = {n["id"]: n for n in partial.get("nodes", [])}
+        confirmed = {ip for ip in dialed if ip in fresh and not fresh[ip].get("placeholder")}
+        reported = [l for l in partial.get("links", []) if l["source"] in confirmed]
+        seen = {(l["source"], l["target"]) for l in reported}
+        for ip in confirmed:
+            node = self.nodes.setdefault(ip, {})
+            # keep layout and anything the UI stored on the node
+            node.update(fresh[ip])
+            node.pop("stale", None)
+        for ip in set(dialed) - confirmed:
+            if ip in self.nodes and not partial.get("truncated"):
+                self.nodes[ip]["stale"] = True
+        before = {l["id"]: l for l in self.links.values() if l["source"] in confirmed or l["target"] in confirmed}
+        after = {}
+        for link in before.values():
+            # a link reported by its other end survives if the dialed end still sees it
+            src, dst = link["source"], link["target"]
+            if src not in confirmed and (dst, src) in seen:
+                after[link["id"]] = link
+        for link in reported:
+            if link["target"] not in self.nodes and link["target"] in fresh:
+                self.nodes[link["target"]] = fresh[link["target"]]
+                self._index(fresh[link["target"]])
+            after[link["id"]] = {**before.get(link["id"], {}), **link}
+        for link_id, link in before.items():
+            del self.links[link_id]
+            if link_id not in after:
+                self._orphans.update((link["source"], link["target"]))
+        for link in after.values():
+            link.pop("state", None)
+            link.pop("pending", None)
+            self.links[link["id"]] = link
+        self.counts["linksAdded"] += len(after.keys() - before.keys())
+        self.counts["linksRemoved"] += len(before.keys() - after.keys())
+        return confirmed
+
+    def graph(self):
+        linked = {end for l in self.links.values() for end in (l["source"], l["target"])}
+        for node_id in self._orphans - linked:
+            if self.nodes.get(node_id, {}).get("placeholder"):
+                del self.nodes[node_id]
+        self._orphans.clear()
+        # analytics would describe the old topology, they are recomputed on demand
+        return {**self.extra, "nodes": list(self.nodes.values()), "links": list(self.links.values())}
+
+
+def dial_devices(payload, ips):
+    """Worker graph of a Flow 1 collection (no expansion) of `ips`."""
+    from worker_entry import build_graph, configure_discovery
+
+    discovery, protocol = configure_discovery(payload, payload.get("protocol", "cdp"))
+    # SIGTERM or the job deadline stop the dials; the graph then has stopReason
+    signal.signal(signal.SIGTERM, lambda signum, frame: discovery.abort("terminated"))
+    timer = None
+    if payload.get("deadline"):
+        timer = threading.Timer(max(0.0, float(payload["deadline"]) - time.time()), discovery.abort, args=("deadline",))
+        timer.daemon = True
+        timer.start()
+    topologies = []
+    try:
+        for ip in ips:
+            if discovery.stopping.is_set():
+                break
+            topology = discovery.build_flow1_topology(ip, protocol)
+            if topology:
+                topologies.append(topology)
+    finally:
+        if timer is not None:
+            timer.cancel()
+    if discovery.arp_options is not None:
+        discovery.arp_options.close()
+    if discovery.capabilities is not None:
+        discovery.capabilities.save()
+    return build_graph(discovery, topologies, protocol)
+
+
+class EventIngester:
+    """Applies events as they come and confirms the touched devices in batches.
+
+    `dial(ips)` returns a worker graph of those devices (None: never dial).
+    """
+
+    def __init__(self, updater, dial=None, settle=5.0, max_delay=30.0):
+        self.updater = updater
+        self.dial = dial
+        self.settle = settle
+        self.max_delay = max_delay
+        self.pending = set()
+        self.events = 0
+        self._first = None
+        self._last = None
+
+    def feed(self, events):
+        for event in events:
+            self.events += 1
+            touched = self.updater.apply(event)
+            now = time.monotonic()
+            self._last = now
+            if self._first is None:
+                self._first = now
+            self.pending |= touched
+
+    def due(self):
+        if self._first is None:
+            return False
+        now = time.monotonic()
+        return now - self._last >= self.settle or now - self._first >= self.max_delay
+
+    def flush(self):
+        """Dial the queued devices and return the summary of this batch."""
+        dialed = sorted(self.pending)
+        confirmed = set()
+        stop_reason = None
+        if self.dial is not None and dialed:
+            log(f"topology_events: confirming {len(dialed)} device(s): {', '.join(dialed)}")
+            partial = self.dial(dialed)
+            confirmed = self.updater.merge(dialed, partial)
+            stop_reason = partial.get("stopReason")
+        missed = sorted(set(dialed) - confirmed)
+        counts = self.updater.counts
+        summary = {
+            "ts": time.time(),
+            "events": self.events,
+            "applied": counts["applied"],
+            "ignored": counts["ignored"],
+            "linksAdded": counts["linksAdded"],
+            "linksRemoved": counts["linksRemoved"],
+            "confirmed": sorted(confirmed),
+            "unreachable": missed if self.dial is not None and not stop_reason else [],
+            "unconfirmed": missed if self.dial is None or stop_reason else [],
+        }
+        if stop_reason:
+            summary["stopReason"] = stop_reason
+        counts.clear()
+        self.pending.clear()
+        self.events = 0
+        self._first = self._last = None
+        return summary
+
+
+def apply_events(payload):
+    """Worker payload mode: apply one batch of events and return the updated graph."""
+    spec = payload["events"]
+    updater = GraphUpdater(spec.get("graph") or {"nodes": [], "links": []})
+    dial = (lambda ips: dial_devices(payload, ips)) if spec.get("confirm", True) else None
+    ingester = EventIngester(updater, dial)
+    ingester.feed([e for line in spec.get("lines") or [] for e in parse_line(line)])
+    ingester.feed(parse_json(spec.get("items") or []))
+    summary = ingester.flush()
+    graph = updater.graph()
+    graph["lastUpdate"] = summary
+    log(f"topology_events: {summary['applied']} event(s) applied, {summary['ignored']} ignored, "
+        f"{len(summary['confirmed'])} device(s) confirmed")
+    return graph
+
+
+# ---- sources ----
+def _read_file(path, follow, out, stop):
+    """Lines of `path` ('-': stdin); with `follow`, keep tailing it across rotation."""
+    if path == "-":
+        for line in sys.stdin:
+            out.put(line)
+        return
+    f = open(path, "r", encoding="utf-8", errors="replace")
+    try:
+        while not stop.is_set():
+            line = f.readline()
+            if line:
+                out.put(line)
+                continue
+            if not follow:
+                return
+            try:
+                rotated = os.stat(path).st_ino != os.fstat(f.fileno()).st_ino
+                truncated = os.path.getsize(path) < f.tell()
+            except OSError:
+                rotated, truncated = False, False
+            if rotated:
+                f.close()
+                f = open(path, "r", encoding="utf-8", errors="replace")
+            elif truncated:
+                f.seek(0)
+            else:
+                stop.wait(0.5)
+    finally:
+        f.close()
+
+
+def _read_udp(address, out, stop):
+    """Syslog/JSON datagrams on udp://host:port, one or more lines each."""
+    host, _, port = address.rpartition(":")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host or "0.0.0.0", int(port)))
+    sock.settimeout(0.5)
+    log(f"topology_events: listening on udp {host or '0.0.0.0'}:{port}")
+    try:
+        while not stop.is_set():
+            try:
+                data, _ = sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            for line in data.decode("utf-8", "replace").splitlines():
+                out.put(line)
+    finally:
+        sock.close()
+
+
+def _start_source(source, follow, stop):
+    lines = queue.Queue()
+
+    def run():
+        try:
+            if source.startswith("udp://"):
+                _read_udp(source[len("udp://"):], lines, stop)
+            else:
+                _read_file(source, follow, lines, stop)
+        finally:
+            lines.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+    return lines
+
+
+def _write_graph(path, graph):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(graph, f)
+    os.replace(tmp, path)
+
+
+def ingest(args):
+    with open(args.graph, "r", encoding="utf-8") as f:
+        updater = GraphUpdater(json.load(f))
+    job = {}
+    if args.job:
+        with open(args.job, "r", encoding="utf-8") as f:
+            job = json.load(f)
+    dial = None if args.no_confirm else (lambda ips: dial_devices(job, ips))
+    ingester = EventIngester(updater, dial, settle=args.settle, max_delay=args.max_delay)
+    out_path = args.out or args.graph
+    stop = threading.Event()
+    lines = _start_source(args.source, args.follow, stop)
+
+    def flush():
+        summary = ingester.flush()
+        graph = updater.graph()
+        graph["lastUpdate"] = summary
+        _write_graph(out_path, graph)
+        print(json.dumps(summary), flush=True)
+
+    try:
+        while True:
+            try:
+                line = lines.get(timeout=0.5)
+            except queue.Empty:
+                line = ""
+            if line is None:
+                break
+            if line:
+                ingester.feed(parse_line(line, args.device))
+            if ingester.due():
+                flush()
+        if ingester.events:
+            flush()
+    except KeyboardInterrupt:
+        if ingester.events:
+            flush()
+    finally:
+        stop.set()
+
+
+def _line_time(line):
+    line = line.strip()
+    if line[:1] == "{":
+        try:
+            events = parse_json(json.loads(line))
+        except ValueError:
+            return None
+        try:
+            return float(events[0]["ts"])
+        except (IndexError, TypeError, ValueError):
+            return None
+    head = _SYSLOG_HEAD.match(line)
+    return _syslog_time(head.group("ts")) if head else None
+
+
+def replay(args):
+    """Send a recorded event file with its original spacing (divided by --speed)."""
+    sock = None
+    if args.to:
+        host, _, port = args.to[len("udp://"):].rpartition(":")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        target = (host or "127.0.0.1", int(port))
+    sent = 0
+    previous = None
+    with open(args.events, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            ts = _line_time(line)
+            if args.speed > 0 and ts is not None and previous is not None and ts > previous:
+                time.sleep(min(ts - previous, args.max_gap) / args.speed)
+            previous = ts if ts is not None else previous
+            if sock is not None:
+                sock.sendto(line.rstrip("\n").encode("utf-8"), target)
+            else:
+                sys.stdout.write(line if line.endswith("\n") else line + "\n")
+                sys.stdout.flush()
+            sent += 1
+    log(f"topology_events: replayed {sent} line(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply neighbor/link events to a discovery graph")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("ingest", help="apply events to a graph file, confirming by dialing")
+    p.add_argument("graph", help="graph JSON file, rewritten after every batch")
+    p.add_argument("--source", default="-", help="event file, - for stdin, or udp://host:port")
+    p.add_argument("--follow", action="store_true", help="keep tailing the source file")
+    p.add_argument("--device", help="device of syslog lines that carry no host")
+    p.add_argument("--job", help="JSON job options (credentials, protocol, sshPort, ...) for the dials")
+    p.add_argument("--settle", type=float, default=5.0, help="quiet seconds before confirming")
+    p.add_argument("--max-delay", type=float, default=30.0, help="confirm at the latest this long after an event")
+    p.add_argument("--no-confirm", action="store_true", help="apply events without dialing")
+    p.add_argument("--out", help="write the graph here instead of over the input")
+    p.set_defaults(func=ingest)
+    p = sub.add_parser("replay", help="replay a recorded event file")
+    p.add_argument("events")
+    p.add_argument("--to", help="udp://host:port of an ingester (default: stdout)")
+    p.add_argument("--speed", type=float, default=1.0, help="time compression, 0 = no delays")
+    p.add_argument("--max-gap", type=float, default=60.0, help="longest pause between two lines, seconds")
+    p.set_defaults(func=replay)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Raw transcript archive and offline re-parse
+
+With `"archive": "<dir>"` in the job payload every CLI command the crawler
+sends (interactive shell or exec channel) is stored with its raw output:
+
+    <dir>/objects/ab/cdef...   zlib-compressed output, named by the sha256
+                               of the raw text (identical outputs stored once)
+    <dir>/manifest.jsonl       {"t": "job", "seedIps", "protocol", "options"}
+                               {"t": "cmd", "ip", "command", "sha256", "ts"}
+                               {"t": "peer", "ip", "record"}
+
+`"replay": {"archive": "<dir>", "workers": 8}` rebuilds {nodes, links}
+from an archive with the current parsers and no SSH: every archived device
+is parsed in a process pool (ReplayDiscovery answers commands from the
+archive, unknown ones with an `Invalid input` error just like a device
+that lacks them), then Flow 1/Flow 2 are re-run over the parsed results to
+assemble the graph in the original order. The CDP/LLDP record that led the
+crawler to a device is archived as its "peer" record, so pool workers see
+the same neighbor data as the live crawl (fastFacts types, NX-OS family).
+With resolveAliases, aliases are resolved in that final pass.
+Devices that could not be reached during the recorded crawl stay
+unreachable.
+
+SNMP and NX-API collections are not CLI transcripts and are not archived.
+
+Usage (re-parse outside the worker):
+    python transcript_archive.py <archive-dir> [--workers 8]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+from network_topology_testing import NetworkTopologyDiscovery, log
+
+INVALID = "% Invalid input detected at '^' marker."
+# payload keys that change which commands are sent or how output is parsed
+REPLAY_OPTIONS = ("fastFacts", "nxos", "arp", "scope", "resolveAliases")
+
+
+class TranscriptArchive:
+    def __init__(self, path, mode="r"):
+        self.path = path
+        self.mode = mode
+        self.job = {}
+        self.commands = {}   # ip -> {command: sha256}, last recording wins
+        self.peers = {}      # ip -> neighbor record the device was reached through
+        self._fd = None
+        if mode == "w":
+            os.makedirs(os.path.join(path, "objects"), exist_ok=True)
+            # O_APPEND: shard processes share one manifest, each line is one write()
+            self._fd = os.open(os.path.join(path, "manifest.jsonl"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        else:
+            self._load()
+
+    def _load(self):
+        with open(os.path.join(self.path, "manifest.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of an interrupted crawl
+                if rec.get("t") == "job":
+                    self.job = rec
+                elif rec.get("t") == "cmd":
+                    self.commands.setdefault(rec["ip"], {})[rec["command"]] = rec["sha256"]
+                elif rec.get("t") == "peer":
+                    self.peers.setdefault(rec["ip"], rec["record"])
+
+    def _object_path(self, digest):
+        return os.path.join(self.path, "objects", digest[:2], digest[2:])
+
+    def record_job(self, seed_ips, protocol, options=None):
+        self._write({"t": "job", "seedIps": list(seed_ips), "protocol": protocol, "options": options or {}})
+
+    def record_peer(self, ip, record):
+        self._write({"t": "peer", "ip": ip, "record": record})
+
+    def record(self, ip, command, output):
+        raw = (output or "").encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        obj = self._object_path(digest)
+        if not os.path.exists(obj):
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            # per thread too: parallel channel collectors of one device record concurrently
+            tmp = f"{obj}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(zlib.compress(raw, 6))
+            os.replace(tmp, obj)
+        self._write({"t": "cmd", "ip": ip, "command": command, "sha256": digest, "ts": round(time.time(), 3)})
+
+    def _write(self, rec):
+        os.write(self._fd, (json.dumps(rec) + "\n").encode("utf-8"))
+
+    def read(self, digest):
+        with open(self._object_path(digest), "rb") as f:
+            return zlib.decompress(f.read()).decode("utf-8")
+
+    def output(self, ip, command):
+        digest = self.commands.get(ip, {}).get(command)
+        return None if digest is None else self.read(digest)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+# ---- offline replay ----
+class _ReplayChannel:
+    def __init__(self, ip):
+        self.ip = ip
+
+    def recv_ready(self):
+        return False
+
+    def recv(self, n):
+        return b""
+
+    def send(self, data):
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class _ReplayStream:
+    def __init__(self, text):
+        self.text = text
+
+    def read(self):
+        return self.text.encode("utf-8")
+
+
+class _ReplaySSH:
+    def __init__(self, discovery, ip):
+        self.discovery = discovery
+        self.ip = ip
+
+    def invoke_shell(self):
+        return _ReplayChannel(self.ip)
+
+    def exec_command(self, command):
+        return None, _ReplayStream(self.discovery.replay_output(self.ip, command)), None
+
+    def close(self):
+        pass
+
+
+class ReplayDiscovery(NetworkTopologyDiscovery):
+    """NetworkTopologyDiscovery that reads device output from an archive.
+
+    With `parsed` ({ip: (info, neighbors)} from the process pool) devices are
+    taken from it instead of being parsed again.
+    """
+
+    def __init__(self, archive, parsed=None):
+        super().__init__("", "")
+        self.archive = None          # never re-record while replaying
+        self.source = archive
+        self.parsed = parsed
+
+    def replay_output(self, ip, command):
+        out = self.source.output(ip, command)
+        return INVALID if out is None else out
+
+    def ssh_connect(self, ip):
+        if ip not in self.source.commands:
+            log(f"SSH failed to {ip}: not in archive")
+            return None
+        return _ReplaySSH(self, ip)
+
+    def send_command(self, connection, command):
+        return self.replay_output(connection.ip, command)
+
+    def expect(self, connection, pattern, timeout=10):
+        return True, ""
+
+    def collect_device(self, ip, protocol='cdp'):
+        if self.parsed is None:
+            return super().collect_device(ip, protocol)
+        result = self.parsed.get(ip)
+        if result is None:
+            return None
+        info, neighbors = result
+        # same alias check as the live crawl, in crawl order (pool workers
+        # parse every device in isolation and never resolve aliases)
+        canonical = self.resolve_alias(ip, info)
+        if canonical is not None:
+            return {**info, "alias_of": canonical}, []
+        return self._finish_device(ip, info, neighbors)
+
+
+def _configure(discovery, options):
+    from arp_table import ArpOptions
+    discovery.fast_facts = bool(options.get("fastFacts"))
+    nxos = options.get("nxos")
+    if nxos and nxos.get("mode", "json") == "json":
+        discovery.nxos = nxos
+    discovery.arp_options = ArpOptions.from_payload(options.get("arp"))
+    if options.get("scope"):
+        from crawl_scope import CrawlScope
+        discovery.scope = CrawlScope.from_payload(options["scope"])
+    if discovery.arp_options is not None and discovery.arp_options.mode == "file":
+        # re-parse returns the tables inline instead of rewriting the recorded file
+        discovery.arp_options = ArpOptions.from_payload({**options["arp"], "mode": "inline"})
+
+
+def _parse_chunk(args):
+    """Process-pool task: parse devices of one chunk from the archive."""
+    path, ips, protocol, options = args
+    archive = TranscriptArchive(path)
+    discovery = ReplayDiscovery(archive)
+    _configure(discovery, options)
+    # what the live crawl knew about each device before dialing it
+    discovery.neighbor_records.update(archive.peers)
+    out = {}
+    for ip in ips:
+        result = discovery.collect_device(ip, protocol)
+        if result is not None:
+            out[ip] = result
+    return out
+
+
+def reparse(path, workers=None, protocol=None):
+    """Rebuild the worker graph from archive `path` without SSH."""
+    from worker_entry import build_graph
+
+    archive = TranscriptArchive(path)
+    job = archive.job
+    protocol = protocol or job.get("protocol", "cdp")
+    options = job.get("options") or {}
+    ips = sorted(archive.commands)
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    started = time.monotonic()
+
+    parsed = {}
+    chunk = max(1, len(ips) // (workers * 4) or 1)
+    tasks = [(path, ips[i:i + chunk], protocol, options) for i in range(0, len(ips), chunk)]
+    if workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            parsed.update(_parse_chunk(task))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(_parse_chunk, tasks):
+                parsed.update(part)
+    log(f"Re-parsed {len(parsed)} of {len(ips)} archived devices in {time.monotonic() - started:.2f}s")
+
+    discovery = ReplayDiscovery(archive, parsed)
+    _configure(discovery, options)
+    if options.get("resolveAliases"):
+        from device_identity import IdentityResolver
+        discovery.identity = IdentityResolver()
+    topologies = discovery.discover_all_topologies(job.get("seedIps", []), protocol)
+    return build_graph(discovery, topologies, protocol)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild a discovery graph from a transcript archive")
+    parser.add_argument("archive")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+    print(json.dumps(reparse(args.archive, args.workers)))
+
+
+if __name__ == "__main__":
+    main()
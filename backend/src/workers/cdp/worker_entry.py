@@ -1,50 +1,64 @@
 import sys
 import json
 import os
-import paramiko
-import sys
+import signal
 
 # Import the discovery class from the colocated file
 from network_topology_testing import NetworkTopologyDiscovery
+from arp_table import ArpOptions, ArpTable
+import result_codec
 
 
-def main():
-    raw = sys.stdin.read()
-    try:
-      payload = json.loads(raw)
-    except Exception as e:
-      print(f"worker_entry: failed to parse stdin: {e}; raw=<{raw[:200]}>", file=sys.stderr, flush=True)
-      raise
-    seeds = payload.get("seedIps", [])
-    username = payload.get("username") or os.environ.get("CDP_USERNAME") or "cisco"
-    password = payload.get("password") or os.environ.get("CDP_PASSWORD") or "cisco"
-    protocol = payload.get("protocol", "cdp")  # default to CDP for backward compatibility
-    post_auth_steps = payload.get("postAuthSteps", [])  # list of {type: 'command'|'password', value: string}
-
-    print(f"worker_entry: received seeds={seeds}, protocol={protocol}, postAuthSteps={len(post_auth_steps)}", file=sys.stderr, flush=True)
-
-    discovery = NetworkTopologyDiscovery(username, password, post_auth_steps=post_auth_steps)
-    topologies = discovery.discover_all_topologies(seeds, protocol)
-
-    # Convert to simple nodes/links
+def build_graph(discovery, topologies, protocol):
+    """Convert discovered topologies + connections to simple nodes/links."""
     nodes_map = {}
     nodes = []
+    arp_tables = {}
+    arp_mode = discovery.arp_options.mode if discovery.arp_options is not None else "inline"
     for topo in topologies:
         for entry in topo:
             dev = entry.get("device", {})
             ip = dev.get("ip")
             if not ip:
                 continue
+            arp = dev.get("arp_entries")
+            if arp is None:
+                # an empty ArpTable is falsy but must keep its columnar shape
+                arp = []
+            if isinstance(arp, ArpTable):
+                if arp_mode == "columnar":
+                    arp = arp.to_json()
+                elif arp_mode == "separate":
+                    arp_tables[ip] = arp.to_json()
+                    arp = []
+                else:
+                    arp = list(arp.rows())
             node = {
                 "id": ip,
                 "label": dev.get("hostname") or ip,
                 "mgmtIp": ip,
                 "type": dev.get("device_type") or "device",
-                "arp": dev.get("arp_entries") or [],
+                "arp": arp,
+                "placeholder": ip not in discovery.discovered_devices,
             }
+            if "arp_count" in dev:
+                node["arpCount"] = dev["arp_count"]
+            if dev.get("post_auth_error"):
+                node["postAuthError"] = dev["post_auth_error"]
+            if dev.get("pid"):
+                node["model"] = dev["pid"]
+            if dev.get("serial"):
+                node["serial"] = dev["serial"]
+            if ip in discovery.unexplored and node["placeholder"]:
+                node["unexplored"] = True
+            if ip in discovery.out_of_scope and node["placeholder"]:
+                node["outOfScope"] = True
             if ip not in nodes_map:
-                nodes_map[ip] = True
+                nodes_map[ip] = len(nodes)
                 nodes.append(node)
+            elif nodes[nodes_map[ip]]["placeholder"] and not node["placeholder"]:
+                # device was crawled under another seed's topology
+                nodes[nodes_map[ip]] = node
 
     # Build links with appropriate linkType based on protocol used
     links = []
@@ -64,11 +78,185 @@ def main():
                 "srcIfName": c.get("from_if"),
                 "dstIfName": c.get("to_if"),
             })
+    if discovery.identity is not None and discovery.identity.aliases:
+        nodes, links = merge_aliases(discovery.identity, nodes, links)
 
-    print(json.dumps({"nodes": nodes, "links": links}), flush=True)
+    graph = {"nodes": nodes, "links": links}
+    if discovery.stop_reason:
+        # budget ran out: partial graph, `unexplored` nodes were never dialed
+        graph["truncated"] = True
+        graph["stopReason"] = discovery.stop_reason
+    if arp_tables:
+        graph["arpTables"] = arp_tables
+    if discovery.arp_index is not None:
+        graph["arpIndex"] = discovery.arp_index.to_json()
+    return graph
 
 
-if __name__ == "__main__":
-    main()
+def merge_aliases(identity, nodes, links):
+    """Fold alias IPs into their canonical node and re-point links at it."""
+    canon = identity.canonical
+    merged_nodes = []
+    for node in nodes:
+        if canon(node["id"]) != node["id"]:
+            continue
+        if node["id"] in identity.aliases:
+            node["aliases"] = list(identity.aliases[node["id"]])
+        merged_nodes.append(node)
+    merged_links = {}
+    for link in links:
+        src, dst = canon(link["source"]), canon(link["target"])
+        if src == dst:
+            continue
+        link_id = f"{src}->{dst}"
+        merged_links.setdefault(link_id, {**link, "id": link_id, "source": src, "target": dst})
+    return merged_nodes, list(merged_links.values())
 
 
+def main():
+    raw = sys.stdin.read()
+    try:
+      payload = json.loads(raw)
+    except Exception as e:
+      print(f"worker_entry: failed to parse stdin: {e}; raw=<{raw[:200]}>", file=sys.stderr, flush=True)
+      raise
+
+    # Opt-in profiling: report goes to its own file, stdout stays the graph JSON
+    profiler = None
+    if payload.get("profile"):
+        from worker_profiler import WorkerProfiler
+        profiler = WorkerProfiler.from_payload(payload["profile"]).start()
+    try:
+        graph = run_job(payload)
+        if payload.get("analytics"):
+            from graph_analytics import analyze
+            opts = payload["analytics"] if isinstance(payload["analytics"], dict) else {}
+            graph["analytics"] = analyze(graph, int(opts.get("top", 10)))
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    result_codec.write_result(graph, payload.get("output"), sys.stdout.buffer)
+
+
+def _profile_snapshot(payload, label):
+    if payload.get("profile"):
+        from worker_profiler import snapshot
+        snapshot(label)
+
+
+def configure_discovery(payload, protocol, shard=None):
+    """(discovery, neighbor protocol) set up from the job `payload` options."""
+    username = payload.get("username") or os.environ.get("CDP_USERNAME") or "cisco"
+    password = payload.get("password") or os.environ.get("CDP_PASSWORD") or "cisco"
+    post_auth_steps = payload.get("postAuthSteps", [])
+    if protocol == "snmp":
+        # SNMP collector: `snmp.neighbors` picks the neighbor MIB(s), the
+        # credential group's password doubles as community if none is given
+        from snmp_collector import SnmpTopologyDiscovery
+        snmp = payload.get("snmp") or {}
+        discovery = SnmpTopologyDiscovery.from_payload(snmp, community=payload.get("password"))
+        protocol = snmp.get("neighbors", "cdp")
+    else:
+        discovery = NetworkTopologyDiscovery(username, password, post_auth_steps=post_auth_steps)
+    if payload.get("scope"):
+        from crawl_scope import CrawlScope
+        discovery.scope = CrawlScope.from_payload(payload["scope"])
+    if payload.get("crawl"):
+        from crawl_scheduler import CrawlPolicy
+        discovery.crawl_policy = CrawlPolicy.from_payload(payload["crawl"])
+    discovery.ssh_port = int(payload.get("sshPort") or 22)
+    if payload.get("auth"):
+        from auth_limiter import AuthLimiter
+        # sibling shards share the AAA servers: each takes its slice of the global rate
+        discovery.auth_limiter = AuthLimiter.from_payload(payload["auth"], shards=(shard or {}).get("count", 1))
+    discovery.fast_facts = bool(payload.get("fastFacts"))
+    if payload.get("channels"):
+        # {"max": N}: CDP/LLDP/ARP on up to N-1 exec channels beside the shell
+        channels = payload["channels"] if isinstance(payload["channels"], dict) else {}
+        discovery.channels = int(channels.get("max", 4))
+    nxos = payload.get("nxos")
+    if nxos and nxos.get("mode", "json") != "off":
+        discovery.nxos = nxos
+    if payload.get("resolveAliases"):
+        from device_identity import IdentityResolver
+        discovery.identity = IdentityResolver()
+    cache_path = payload.get("capabilityCache") or os.environ.get("CDP_CAPABILITY_CACHE")
+    if cache_path:
+        from capability_cache import CapabilityCache
+        discovery.capabilities = CapabilityCache(cache_path)
+    discovery.arp_options = ArpOptions.from_payload(payload.get("arp"))
+    if payload.get("arpIndex"):
+        from arp_index import ArpIndex
+        discovery.arp_index = ArpIndex()
+    return discovery, protocol
+
+
+def run_job(payload):
+    """Run one discovery job and return its {nodes, links} graph."""
+    seeds = payload.get("seedIps", [])
+    protocol = payload.get("protocol", "cdp")  # default to CDP for backward compatibility
+    post_auth_steps = payload.get("postAuthSteps", [])  # list of {type: 'command'|'password', value: string}
+    shard = payload.get("shard")  # set by shard_coordinator for shard processes
+    checkpoint_path = payload.get("checkpointPath")
+    resume = bool(payload.get("resume"))
+
+    print(f"worker_entry: received seeds={seeds}, protocol={protocol}, postAuthSteps={len(post_auth_steps)}", file=sys.stderr, flush=True)
+
+    # Offline mode: rebuild the graph from a transcript archive, no SSH
+    if payload.get("replay"):
+        from transcript_archive import reparse
+        replay = payload["replay"]
+        return reparse(replay["archive"], replay.get("workers"), payload.get("protocol"))
+
+    # Event mode: apply neighbor/link events to a saved graph, re-dial only the devices they touch
+    if payload.get("events"):
+        from topology_events import apply_events
+        return apply_events(payload)
+
+    # Coordinator mode: split seeds by subnet over several worker processes
+    if shard is None and int(payload.get("shards") or 1) > 1:
+        from shard_coordinator import run_sharded, terminate
+        signal.signal(signal.SIGTERM, lambda signum, frame: terminate())
+        return run_sharded(payload)
+
+    checkpoint = None
+    if checkpoint_path:
+        from crawl_checkpoint import CrawlCheckpoint
+        checkpoint = CrawlCheckpoint(checkpoint_path, resume=resume)
+        # resume entry point: seeds/protocol come from the journal if omitted
+        if resume and checkpoint.job:
+            seeds = seeds or checkpoint.job.get("seedIps", [])
+            protocol = payload.get("protocol") or checkpoint.job.get("protocol", "cdp")
+
+    discovery, protocol = configure_discovery(payload, protocol, shard)
+    discovery.checkpoint = checkpoint
+    # SIGTERM (supervisor timeout, shutdown): stop crawling and still print the partial graph
+    signal.signal(signal.SIGTERM, lambda signum, frame: discovery.abort("terminated"))
+    if shard:
+        from shard_coordinator import ClaimTable, ShardClaim
+        discovery.claim_ip = ShardClaim(ClaimTable(shard["claimTable"]), shard["id"],
+                                        shard.get("networks", []), shard.get("seedIps", seeds))
+    if payload.get("archive"):
+        from transcript_archive import REPLAY_OPTIONS, TranscriptArchive
+        discovery.archive = TranscriptArchive(payload["archive"], mode="w")
+        if not shard:
+            # a sharded crawl's job record is written once by the coordinator
+            discovery.archive.record_job(seeds, protocol, {k: payload[k] for k in REPLAY_OPTIONS if k in payload})
+    topologies = discovery.discover_all_topologies(seeds, protocol, deadline=payload.get("deadline"))
+    _profile_snapshot(payload, "crawl")
+    if discovery.archive is not None:
+        discovery.archive.close()
+    if checkpoint is not None:
+        checkpoint.close()
+    if discovery.arp_options is not None:
+        discovery.arp_options.close()
+    if discovery.capabilities is not None:
+        discovery.capabilities.save()
+
+    graph = build_graph(discovery, topologies, protocol)
+    _profile_snapshot(payload, "assemble")
+    return graph
+
+
+if __name__ == "__main__":
+    main()
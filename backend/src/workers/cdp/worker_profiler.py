@@ -0,0 +1,239 @@
+"""
+Opt-in worker profiling
+
+`"profile": "/tmp/discovery-prof.json"` (or {"path", "interval", "top",
+"tracemalloc"}) in the job payload runs the job under:
+
+    a sampling profiler   a background thread reads sys._current_frames()
+                          every `interval` seconds (default 10 ms), so cost
+                          does not grow with call count and sleeping/blocked
+                          time shows up (wall clock, not CPU)
+    tracemalloc           (default on) top allocators per phase at the
+                          end of the crawl and after the graph is assembled
+
+Samples and allocations are attributed to a phase by the innermost known
+function on the stack:
+
+    connect    ssh_connect
+    collect    send_command, expect, _run, SNMP/NX-API requests
+    parse      get_cdp_neighbors, get_lldp_neighbors, get_arp_detail, ...
+    assemble   build_graph, merge_graphs, merge_aliases
+
+Everything goes to the given path as JSON (per-function cumulative/self
+seconds, per-phase seconds, collapsed stacks, allocators) plus
+`<path>.folded` in flamegraph.pl / speedscope "collapsed" format. stdout
+is not touched.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+PHASE_MARKERS = {
+    "ssh_connect": "connect",
+    "send_command": "collect",
+    "expect": "collect",
+    "_run": "collect",
+    "walk": "collect",
+    "show": "collect",
+    "get_cdp_neighbors": "parse",
+    "get_lldp_neighbors": "parse",
+    "get_arp_detail": "parse",
+    "_arp_entries": "parse",
+    "detect_hostname": "parse",
+    "detect_device_type_from_inventory": "parse",
+    "infer_fast_facts": "parse",
+    "collect_structured": "parse",
+    "_device_from_tables": "parse",
+    "build_graph": "assemble",
+    "merge_graphs": "assemble",
+    "merge_aliases": "assemble",
+}
+
+_active = None
+
+
+def snapshot(label):
+    """Record a tracemalloc snapshot on the active profiler (no-op otherwise)."""
+    if _active is not None:
+        _active.snapshot(label)
+
+
+def _phase(names):
+    """Phase of a stack given innermost-first function names."""
+    for name in names:
+        phase = PHASE_MARKERS.get(name)
+        if phase:
+            return phase
+    return "other"
+
+
+class WorkerProfiler:
+    def __init__(self, path, interval=0.01, top=30, trace_memory=True):
+        self.path = path
+        self.interval = interval
+        self.top = top
+        self.trace_memory = trace_memory
+        self.stacks = {}       # collapsed stack -> samples
+        self.self_samples = {}
+        self.cum_samples = {}
+        self.phase_samples = {}
+        self.samples = 0
+        self.memory = {}       # label -> {phase: [allocators]}
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = 0.0
+
+    @classmethod
+    def from_payload(cls, opts):
+        if isinstance(opts, str):
+            opts = {"path": opts}
+        return cls(
+            path=opts["path"],
+            interval=float(opts.get("interval") or 0.01),
+            top=int(opts.get("top") or 30),
+            trace_memory=bool(opts.get("tracemalloc", True)),
+        )
+
+    def start(self):
+        global _active
+        _active = self
+        if self.trace_memory:
+            tracemalloc.start(25)
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._sample_loop, name="worker-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update({t.ident: t.name for t in threading.enumerate()})
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                funcs = []
+                while frame is not None:
+                    code = frame.f_code
+                    funcs.append((code.co_name, f"{os.path.basename(code.co_filename)}:{code.co_name}"))
+                    frame = frame.f_back
+                self._add(names.get(ident, str(ident)), funcs)
+
+    def _add(self, thread_name, funcs):
+        self.samples += 1
+        labels = [label for _, label in funcs]
+        key = ";".join([thread_name] + labels[::-1])
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+        if labels:
+            self.self_samples[labels[0]] = self.self_samples.get(labels[0], 0) + 1
+        for label in set(labels):
+            self.cum_samples[label] = self.cum_samples.get(label, 0) + 1
+        if thread_name == "MainThread":
+            phase = _phase([name for name, _ in funcs])
+            self.phase_samples[phase] = self.phase_samples.get(phase, 0) + 1
+
+    def snapshot(self, label):
+        if not self.trace_memory or not tracemalloc.is_tracing():
+            return
+        by_phase = {}
+        snap = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),    # the profiler's own bookkeeping
+        ])
+        for stat in snap.statistics("traceback"):
+            frames = list(stat.traceback)[::-1]   # innermost first
+            names = [_function_at(f.filename, f.lineno) for f in frames]
+            phase = _phase(names)
+            where = f"{os.path.basename(frames[0].filename)}:{frames[0].lineno}" if frames else "?"
+            slot = by_phase.setdefault(phase, {})
+            size, count = slot.get(where, (0, 0))
+            slot[where] = (size + stat.size, count + stat.count)
+        self.memory[label] = {
+            phase: [{"where": w, "bytes": s, "count": c}
+                    for w, (s, c) in sorted(allocs.items(), key=lambda kv: -kv[1][0])[:self.top]]
+            for phase, allocs in by_phase.items()
+        }
+
+    def stop(self):
+        """Stop sampling and write the report; never raises into the worker."""
+        global _active
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        wall = time.monotonic() - self._started
+        try:
+            report = self.report(wall)
+            if self.trace_memory and tracemalloc.is_tracing():
+                report["memory"]["peakBytes"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=1)
+            with open(f"{self.path}.folded", "w", encoding="utf-8") as f:
+                for stack, count in sorted(self.stacks.items()):
+                    f.write(f"{stack} {count}\n")
+            print(f"worker_profiler: wrote {self.path} ({self.samples} samples)", file=sys.stderr, flush=True)
+        except Exception as e:
+            print(f"worker_profiler: failed to write report: {e}", file=sys.stderr, flush=True)
+        finally:
+            _active = None
+
+    def report(self, wall):
+        dt = self.interval
+
+        def top(counter):
+            return sorted(counter.items(), key=lambda kv: -kv[1])[:self.top]
+
+        return {
+            "wallSeconds": round(wall, 3),
+            "interval": dt,
+            "samples": self.samples,
+            "phases": {p: round(n * dt, 3) for p, n in top(self.phase_samples)},
+            "functions": [
+                {"function": f, "cumulative": round(n * dt, 3), "self": round(self.self_samples.get(f, 0) * dt, 3)}
+                for f, n in top(self.cum_samples)
+            ],
+            "collapsed": self.stacks,
+            "memory": {"snapshots": self.memory},
+        }
+
+
+_FUNC_CACHE = {}
+
+
+def _function_at(filename, lineno):
+    """Name of the last `def` at or above filename:lineno (tracemalloc only keeps line numbers)."""
+    key = (filename, lineno)
+    if key not in _FUNC_CACHE:
+        _FUNC_CACHE[key] = _scan_function(filename, lineno)
+    return _FUNC_CACHE[key]
+
+
+_DEFS = {}
+
+
+def _scan_function(filename, lineno):
+    defs = _DEFS.get(filename)
+    if defs is None:
+        defs = []
+        try:
+            with open(filename, "r", encoding="utf-8", errors="replace") as f:
+                for i, line in enumerate(f, 1):
+                    stripped = line.lstrip()
+                    if stripped.startswith("def ") or stripped.startswith("async def "):
+                        name = stripped.split("def ", 1)[1].split("(", 1)[0].strip()
+                        defs.append((i, name))
+        except OSError:
+            pass
+        _DEFS[filename] = defs
+    best = ""
+    for start, name in defs:
+        if start > lineno:
+            break
+        best = name
+    return best